@@ -11,9 +11,12 @@ urlpatterns = patterns('turnos.views',
     (r'^reservar/$', 'reservar'),
     (r'^json/afiliado/(?P<parametro>(id|numero|dni))/(?P<valor>\w+)/$', 'getAfiliado'),
     (r'^json/afiliado/id/(?P<afiliado_id>\w+)/telefono/$', 'getTelefono'),
+    (r'^json/afiliados/sugerir/$', 'sugerir_afiliados'),
+    (r'^json/presentismo/$', 'presentismo_afiliados'),
     (r'^json/presentismo/(?P<afiliado_id>\w+)/$', 'verificarPresentismo'),
     (r'^json/especialistas/especialidad/(?P<especialidad_id>\d+)/$', 'getEspecialistas'),
     (r'^json/turnos/(?P<especialista_id>\d+)/$', 'getDiaTurnos'),
+    (r'^json/turnos/especialidad/(?P<especialidad_id>\d+)/proximos/$', 'get_proximos_turnos'),
     (r'^json/turnos/(?P<especialista_id>\d+)/(?P<year>\d{4})/(?P<month>\d{1,2})/(?P<day>\d{1,2})/$', 'getTurnosDisponibles'),
     (r'^json/turnos/afiliado/(?P<afiliado_id>\d+)/$', 'get_turnos_afiliado'),
     (r'^json/turnos/afiliado/today/(?P<afiliado_id>\d+)/$', 'get_turnos_afiliado',{'today':True}),
@@ -27,8 +30,10 @@ urlpatterns = patterns('turnos.views',
     (r'^cancelar/$', 'cancelar_reserva'),
     (r'^cancelar/(?P<lr_id>\d+)/$', 'cancelar_reserva'),
     (r'^cancelar/turnos/$', 'cancelar_turnos'),
+    (r'^cancelar/turnos/rango/$', 'cancelar_turnos_rango'),
     (r'^especialista/registrar/$', 'registrar_especialista'),
     (r'^buscar/$', 'consultar_reservas'),
+    (r'^buscar/exportar/(?P<formato>(csv|json))/$', 'exportar_reservas'),
     (r'^editar/(?P<lr_id>\d+)/$', 'modificar_reserva'),
     (r'^admin/', include(admin.site.urls)),
 )
@@ -9,25 +9,37 @@ from django.db.models import Q
 from django.conf import settings
 
 import logging
-from models import EspecialistaEspecialidad, HistorialTurno, Afiliado, LineaDeReserva, Turno, Disponibilidad, Reserva, Settings
+from models import EspecialistaEspecialidad, HistorialTurno, Afiliado, LineaDeReserva, Turno, Disponibilidad, Reserva
+from negocio.configuracion import configuracion
+from negocio.generador import GeneradorTurnos
+from negocio.managers import TurnoManager, AfiliadoManager
+from negocio import excepciones
+from negocio import proyecciones
+from negocio import directorio
+from negocio.fechas import filtro_dia
+from negocio.calendario import Calendario
+from negocio.indice import indice
+from negocio.cache_afiliados import cache_afiliados
+from negocio.faltas import faltas
+from negocio.busqueda import BuscadorTurnos
+from signals import turnos_modificados
 logger = logging.getLogger(__name__)
 
 class Bussiness():
     """Esta clase encapsula toda la logica de negocios del sistema de turnos"""
     def __init__(self):
-        self.AUSENTES_CANTIDAD = int(self.__getSetting('ausente_meses', 3))
-        self.AUSENTES_MESES = int(self.__getSetting('ausente_meses', 6))
-        self.MINUTOS = int(self.__getSetting('minutos_entre_turnos', 15))
-        self.DIAS = int(self.__getSetting('cantidad_dias_crear_turnos', 7))
-        self.MAX_SOBRETURNOS = int(self.__getSetting('max_sobreturnos', 3))
-    
-    def __getSetting(self, key, default_value=None):
-        'Obtiene un parametro de configuracion (key) y se puede setear un valor por defecto.'
-        setting = Settings.objects.filter(key=key)
-        return setting[0].value if setting else default_value
+        self.AUSENTES_CANTIDAD = configuracion.get_int('ausente_meses', 3)
+        self.AUSENTES_MESES = configuracion.get_int('ausente_meses', 6)
+        self.MINUTOS = configuracion.get_int('minutos_entre_turnos', 15)
+        self.DIAS = configuracion.get_int('cantidad_dias_crear_turnos', 7)
+        self.MAX_SOBRETURNOS = configuracion.get_int('max_sobreturnos', 3)
 
     def getAfiliados(self, parametro, valor):
-        # Buscar en la base de datos local
+        'Busca afiliados por id, numero o dni. Las busquedas se guardan en negocio.cache_afiliados'
+        return cache_afiliados.buscar(parametro, valor, self.__buscarAfiliados)
+
+    def __buscarAfiliados(self, parametro, valor):
+        'Busca afiliados en el sistema externo y si no los encuentra en la base de datos local.'
         logger.debug("Buscando afiliado %s %s" % (parametro, valor))
         data = self.__busquedaExternaAfiliados(parametro, valor)
         if not data:
@@ -45,19 +57,50 @@ class Bussiness():
         return data;
     
     def __busquedaExternaAfiliados(self, parametro, valor):
-        'Busca afiliados en sistema externo.'
-        # TODO: Consultar en sistema externo
-        return None
+        '''Busca afiliados en sistema externo (ver negocio.directorio). Devuelve None si no
+        se pudo consultar. Los afiliados encontrados se guardan en la base local, para
+        asignarles su id y para encontrarlos cuando no se pueda consultar el sistema externo'''
+        if parametro not in ('numero', 'dni'):
+            # el sistema externo no conoce los ids locales
+            return None
+        data = directorio.obtener().buscar(parametro, valor)
+        if data:
+            AfiliadoManager().guardar_afiliados(data)
+        return data
         
     def getTurnosDisponibles(self, especialista_id, fecha):
         'Obtiene los turnos disponibles de un especialista.'
         # FIXME: Si no hay turnos para un dia determinado tira una excepcion xq quiere crear sobreturnos
-        disponibles = self.__buscarTurnosDisponibles(especialista_id, fecha)
+        indexado = indice.dia(especialista_id, fecha)
+        if indexado is None:
+            # el dia no se pudo indexar, se consulta la base de datos
+            dia = Calendario().dia(especialista_id, fecha)
+            disponibles = list()
+            if dia is None or dia['disponibles']:
+                disponibles = self.__buscarTurnosDisponibles(especialista_id, fecha)
+            hay_sobreturnos = dia and dia['sobreturnos']
+        else:
+            ids = indexado.libres()
+            # el indice de este proceso puede no tener los cambios hechos por
+            # otros procesos: la consulta descarta los turnos ya reservados
+            disponibles = list(Turno.objects.filter(id__in=ids, estado=Turno.DISPONIBLE)
+                               .order_by('fecha').values()) if ids else list()
+            hay_sobreturnos = indexado.hay_sobreturnos()
         logger.debug("Turnos disponibles para el dia %s: %s" % (fecha, disponibles))
-        if not disponibles and not self.__haySobreturnos(especialista_id, fecha):
+        if not disponibles and not hay_sobreturnos:
             disponibles = self.__crearSobreturnos(especialista_id, fecha)
         return disponibles
 
+    def get_proximos_turnos(self, especialidad_id, cantidad=10, dias=None,
+                            hora_desde=None, hora_hasta=None):
+        """Obtiene los primeros turnos disponibles de todos los especialistas de una
+        especialidad, opcionalmente solo los de algunos dias de la semana (0 lunes ...
+        6 domingo) o de una franja horaria"""
+        logger.debug("Buscando proximos turnos especialidad:%s dias:%s horario:%s-%s" %
+                     (especialidad_id, dias, hora_desde, hora_hasta))
+        return BuscadorTurnos().proximos(especialidad_id, cantidad, dias=dias,
+                                         hora_desde=hora_desde, hora_hasta=hora_hasta)
+
     def __buscarTurnosDisponibles(self, especialista_id, fecha):
         'Busca los turnos disponibles de un especialista.'
         logger.debug("Obteniendo turnos disponibles especialista_id:%s fecha:%s" % (especialista_id, fecha))
@@ -65,14 +108,6 @@ class Bussiness():
         queryset = Turno.objects.filter(**filtro)
         return [item for item in queryset.values()]
     
-    def __haySobreturnos(self, especialista, fecha):
-        'Verifica si hay sobreturnos en un dia para un especialista.'
-        filtro = self.__getFiltroFecha(especialista, fecha)
-        filtro['sobreturno'] = True
-        del filtro['estado']
-        query = Turno.objects.filter(**filtro).only("id")
-        return query.exists()
-    
     def __crearSobreturnos(self, especialista_id, fecha):
         'Crea sobreturnos para un especialista en un dia determinado.'
         logger.info("Creando sobreturnos para el ee:%s dia:%s" % (especialista_id, fecha))
@@ -95,28 +130,21 @@ class Bussiness():
         'Devuelve una lista de dias y el estado (Completo, Sobreturno).'
         logger.debug("Obteniendo dias de turnos para el especialista_id:%s " % especialista)
         data = list()
-        queryset = Turno.objects.filter(ee__especialista__id=especialista,
-                                        fecha__gte=timezone.now()).datetimes('fecha', 'day')[:self.DIAS * 2]
-        for fecha in queryset:
+        for dia in Calendario().dias(especialista, self.DIAS * 2):
+            fecha = dia['fecha']
             estado = None
-            if self.__isCancelado(especialista, fecha):
+            if dia['cancelados']:
                 estado = 'X'
-            elif self.__isCompleto(especialista, fecha):
-                if self.__haySobreturnos(especialista, fecha):
+            elif not dia['disponibles']:
+                if dia['sobreturnos']:
                     estado = 'C'
                 else: 
                     self.__crearSobreturnos(especialista, fecha)
                     estado = 'S'
-            elif self.__haySobreturnos(especialista, fecha):
+            elif dia['sobreturnos']:
                 estado = 'S'
             data.append({'fecha':fecha, 'estado':estado})
         return data
-    def __isCompleto(self, especialista, fecha):
-        """ Verifica si el dia esta completo para el especialista,
-        es decir que no haya turnos disponibles para ese dia."""
-        filtro = self.__getFiltroFecha(especialista, fecha)
-        query = Turno.objects.filter(**filtro).only("id")
-        return not query.exists()
     def __isCancelado(self, especialista, fecha):
         """ Verifica si los turnos del dia fueron cancelados 
         el especialista."""
@@ -128,11 +156,9 @@ class Bussiness():
         """Devuelve un filtro para buscar los turnos disponibles del especialista 
         en una fecha determinada."""
         filtro = {'ee__especialista__id':especialista_id,
-                  'fecha__day':fecha.day,
-                  'fecha__month':fecha.month,
-                  'fecha__year':fecha.year,
                   'estado':Turno.DISPONIBLE,
                   }
+        filtro.update(filtro_dia('fecha', fecha))
         return filtro
     
     @transaction.atomic
@@ -145,12 +171,14 @@ class Bussiness():
         if turnos:
             reserva = self.__crearReserva(afiliado, telefono)
             logger.info("Reserva id:%s" % reserva.id)
-            for turno_id in turnos:
-                turno = self.__reservarTurno(reserva, turno_id, empleado);
-                lr = LineaDeReserva.objects.create(turno=turno,
-                                                   reserva=reserva,
-                                                   estado=Turno.RESERVADO)
-                logger.debug("Linea de reserva id:%s" % lr.id)
+            turnos = self.__validar_reserva(turnos)
+            self.__reservarTurnos(reserva, turnos, empleado)
+            self.__ocuparTurnos(turnos)
+            LineaDeReserva.objects.bulk_create([LineaDeReserva(turno=turno,
+                                                               reserva=reserva,
+                                                               estado=Turno.RESERVADO)
+                                                for turno in turnos])
+            logger.debug("Lineas de reserva creadas: %s" % len(turnos))
             return reserva
         else:
             logger.warning("La lista de turnos a reservar esta vacia")
@@ -166,47 +194,63 @@ class Bussiness():
         reserva.save()
         return reserva
     
-    def __reservarTurno(self, reserva, turno_id, empleado):
-        'Asocia una reserva con sus correspondientes turnos.'
-        logger.info("Reservando turno %s" % turno_id)
-        turno = self.__validar_reserva(turno_id)
-        historial = HistorialTurno.objects.create(estadoAnterior=turno.estado,
-                                   estadoNuevo=Turno.RESERVADO,
-                                   turno=turno,
-                                   empleado=empleado,
-                                   descripcion="ID de reserva %s" % reserva.id)
-        turno.estado = Turno.RESERVADO
-        turno.save()
-        logger.debug("Modificacion de turno: %s" % historial)
-        return turno
+    def __reservarTurnos(self, reserva, turnos, empleado):
+        'Registra en el historial la reserva de los turnos.'
+        logger.info("Reservando turnos %s" % [turno.id for turno in turnos])
+        HistorialTurno.objects.bulk_create([HistorialTurno(estadoAnterior=turno.estado,
+                                                           estadoNuevo=Turno.RESERVADO,
+                                                           turno=turno,
+                                                           empleado=empleado,
+                                                           descripcion="ID de reserva %s" % reserva.id)
+                                            for turno in turnos])
+    
+    def __ocuparTurnos(self, turnos):
+        'Reserva los turnos solo si siguen disponibles (UPDATE condicional).'
+        try:
+            TurnoManager().ocupar_turnos(turnos)
+        except excepciones.TurnoReservadoException:
+            e = TurnoReservadoException("Algun turno de %s ya se encuentra reservado" %
+                                        [turno.id for turno in turnos])
+            self.__lanzar(e)
     
-    def __validar_reserva(self, turno_id):
-        'Valida que la reserva sea valida.'
-        if not Turno.objects.filter(id=turno_id).exists():
-            e = TurnoNotExistsException("Turno ID '%s' inexistente" % turno_id)
+    def __validar_reserva(self, turnos_id):
+        '''Valida que la reserva sea valida. Lee todos los turnos con una
+        consulta y los devuelve en el orden pedido.'''
+        turnos_id = [int(turno_id) for turno_id in turnos_id]
+        encontrados = Turno.objects.in_bulk(turnos_id)
+        inexistentes = [turno_id for turno_id in turnos_id if turno_id not in encontrados]
+        if inexistentes:
+            e = TurnoNotExistsException("Turno ID %s inexistente" % inexistentes)
             self.__lanzar(e)
-        turno = Turno.objects.get(id=turno_id)
-        if turno.estado == Turno.RESERVADO:
-            e = TurnoReservadoException("Turno ID '%s' ya se encuentra reservado" % turno_id)
+        turnos = [encontrados[turno_id] for turno_id in turnos_id]
+        reservados = [turno.id for turno in turnos if turno.estado == Turno.RESERVADO]
+        if reservados:
+            e = TurnoReservadoException("Turno ID %s ya se encuentra reservado" % reservados)
             self.__lanzar(e)
-        if turno.fecha < (timezone.now() - timedelta(minutes=self.MINUTOS)) and settings.DEBUG:
+        limite = timezone.now() - timedelta(minutes=self.MINUTOS)
+        if any(turno.fecha < limite for turno in turnos) and settings.DEBUG:
             e = ReservaTurnoException("No se pueden reservar turnos anteriores a la fecha actual")
             self.__lanzar(e)
-        return turno
+        return turnos
     
     def contarFaltas(self, afiliado_id):
         'Devuelve la cantidad de faltas que posee el afiliado a turnos anteriores.'
         fecha = timezone.now() + relativedelta(months=-self.AUSENTES_MESES)
-        queryset = LineaDeReserva.objects.filter(reserva__fecha__gte=fecha,
-                                                 reserva__afiliado__id=afiliado_id,
-                                                 estado=Turno.AUSENTE)
-        return queryset.count()
+        # se cuentan en el registro de faltas (ver negocio.faltas)
+        return faltas.contar(afiliado_id, fecha)
     def presentismoOK(self, afiliado_id):
         """ Verifica si un afiliado se ausenta concurrentemente a los turnos"""
         faltas = self.contarFaltas(afiliado_id);
         logger.debug("Cantidad de faltas del afiliado %s: %s, Presentismo_ok %s" % 
                      (afiliado_id, faltas, faltas <= self.AUSENTES_CANTIDAD))
         return faltas <= self.AUSENTES_CANTIDAD
+    def presentismo_afiliados(self, afiliados_id):
+        """Verifica el presentismo de varios afiliados con una sola consulta agrupada.
+        Devuelve un diccionario {afiliado_id: presentismo_ok}"""
+        fecha = timezone.now() + relativedelta(months=-self.AUSENTES_MESES)
+        cantidades = faltas.contar_afiliados(afiliados_id, fecha)
+        return dict((afiliado_id, cantidades.get(afiliado_id, 0) <= self.AUSENTES_CANTIDAD)
+                    for afiliado_id in afiliados_id)
     def __lanzar(self, e):
         """Lanza una excepcion y loguea la misma"""
         logger.error("%s - message:'%s' more_info:'%s' prev:'%s'" % 
@@ -215,13 +259,12 @@ class Bussiness():
     def crear_turnos(self, dias=None):
         'Crea turnos en la cantidad de dias determinado.'
         cantidad = 0
-        for ee in EspecialistaEspecialidad.objects.all():
+        for ee in EspecialistaEspecialidad.objects.select_related('especialista'):
             creados = self.crear_turnos_del_especialista(ee, dias)
             cantidad += len(creados)
         return cantidad
     def crear_turnos_del_especialista(self, especialista_especialidad,
-                                      cantidad_dias=None,
-                                      a_partir_de=timezone.now()):
+                                      cantidad_dias=None):
         """Crea turnos para un especialista y una especialidad a partir del dia especificado"""
         from dateutil import rrule
         cantidad_dias = self.DIAS if cantidad_dias == None else cantidad_dias
@@ -236,13 +279,14 @@ class Bussiness():
                           cantidad_dias,
                           desde,
                           hasta))
-            for disp in Disponibilidad.objects.filter(ee=especialista_especialidad):
+            for disp in (Disponibilidad.objects.filter(ee=especialista_especialidad)
+                         .select_related('ee__especialista', 'consultorio')):
                 disponibilidades[int(disp.dia)] = disp
             
             for day in rrule.rrule(rrule.DAILY, dtstart=desde, until=hasta):
                 if day.weekday() in disponibilidades.keys():
                     turnos += self.__crear_turnos_del_dia(disponibilidades[day.weekday()], day)
-            return self.__guardarTurnos(especialista_especialidad, turnos, a_partir_de) if turnos else []
+            return self.__guardarTurnos(especialista_especialidad, turnos) if turnos else []
     def __crear_turnos_del_dia(self, disponibilidad, dia):
         """Crea turnos para una disponibilidad de un especialista en un dia determinado"""
         logger.debug("Creando turnos para el dia <%s> para el especialista <%s:%s>" % 
@@ -269,17 +313,13 @@ class Bussiness():
         if days_ahead < 0:  # El dia ya paso en esta semana
             days_ahead += 7
         return desde + timedelta(days=days_ahead)
-    @transaction.commit_on_success()
-    def __guardarTurnos(self, ee, turnos, a_partir_de):
+    @transaction.atomic
+    def __guardarTurnos(self, ee, turnos):
         """Guarda los turnos creados en la base de datos cuidando que no se guarden repetidos"""
-        # Hago este lio para evitar el mensaje de warning por ser un datetime sin timezone
-        fecha = datetime.combine(a_partir_de, datetime.min.time().replace(tzinfo=timezone.utc))
-        existentes = Turno.objects.filter(ee=ee, fecha__gte=fecha)
-        lista = filter(lambda turno: turno not in existentes, turnos)
-        # XXX: Lo hago asi, para obtener los ID de turnos, es necesario para crear los historiales
-        if lista:
-            for turno in lista:
-                turno.save()
+        # Los repetidos se detectan por clave (fecha, ee, sobreturno) contra los existentes,
+        # leidos con una unica consulta, y los nuevos se insertan en lotes con su id asignado
+        # (necesario para crear los historiales)
+        lista = GeneradorTurnos().guardar(turnos)
         logger.debug("Guardando %s turnos del especialista <%s>" % (len(lista), ee))
         self.__crear_historial_turnos(lista)
         return lista
@@ -315,18 +355,9 @@ class Bussiness():
         filtro = {'estado':Turno.RESERVADO,
                 'reserva__afiliado__id':afiliado_id}
         if dia:
-            day_min = datetime.combine(dia, time.min)
-            day_max = datetime.combine(dia, time.max)
-            filtro['turno__fecha__range'] = (day_min, day_max)
-        lineas = LineaDeReserva.objects.filter(**filtro)
-        data = list()
-        for linea in lineas:
-            data.append({'id' : linea.id,
-                        'fecha_reserva':linea.reserva.fecha,
-                        'fecha_turno':linea.turno.fecha,
-                        'especialidad':linea.turno.ee.especialidad.descripcion,
-                        'especialista':linea.turno.ee.especialista.full_name(),
-                        'consultorio': linea.turno.consultorio.numero if linea.turno.consultorio else None})
+            filtro.update(filtro_dia('turno__fecha', dia))
+        # una sola consulta con los JOIN, sin instanciar las lineas
+        data = proyecciones.turnos_reservados(LineaDeReserva.objects.filter(**filtro))
         logger.debug("Turnos reservados del afiliado %s: %s" % (afiliado_id, data))
         return data
     @transaction.atomic
@@ -386,12 +417,13 @@ class Bussiness():
             self.__lanzar(e)
         return linea_reserva
     def get_reserva_especialista(self, ee, dia):
-        """Obtiene las lineas de reservas de un especialista para una fecha particular"""
-        return LineaDeReserva.objects.filter(turno__fecha__day=dia.day,
-                                      turno__fecha__month=dia.month,
-                                      turno__fecha__year=dia.year,
-                                      turno__ee=ee,
-                                      turno__estado=Turno.RESERVADO,)
+        """Obtiene las reservas de un especialista para una fecha particular, ordenadas por horario.
+        Devuelve una lista de diccionarios (ver proyecciones.reservas_especialista) leida con una
+        sola consulta"""
+        lineas = LineaDeReserva.objects.filter(turno__ee=ee,
+                                               turno__estado=Turno.RESERVADO,
+                                               **filtro_dia('turno__fecha', dia))
+        return proyecciones.reservas_especialista(lineas.order_by('turno__fecha'))
         
     @transaction.commit_on_success()
     def cancelar_turnos(self, ee, dia, empleado=None):
@@ -400,21 +432,22 @@ class Bussiness():
         logger.info('Cancelando los turnos del especialista %s en el dia %s' % (ee, dia))
         self.__validar_cancelacion_turno(ee, dia)
         turnos = Turno.objects.filter(
-                   Q(fecha__day=dia.day),
-                   Q(fecha__month=dia.month),
-                   Q(fecha__year=dia.year),
                    Q(ee=ee),
-                   Q(estado=Turno.RESERVADO) | Q(estado=Turno.DISPONIBLE))
+                   Q(estado=Turno.RESERVADO) | Q(estado=Turno.DISPONIBLE),
+                   **filtro_dia('fecha', dia))
         lineas = LineaDeReserva.objects.filter(turno__in=turnos)
-        reservas = [lr.reserva for lr in lineas]
-        for turno in turnos:
-            HistorialTurno.objects.create(estadoAnterior=turno.estado,
-                                          estadoNuevo=Turno.CANCELADO,
-                                          descripcion="Se cancelaron todos los turnos del dia",
-                                          turno=turno,
-                                          empleado=empleado)
-        reservas_canceladas = lineas.update(estado=Turno.CANCELADO)
+        reservas = [lr.reserva for lr in lineas.select_related('reserva__afiliado')]
+        # update() descarta los turnos leidos, los recuerdo para el resumen
+        afectados = list(turnos)
+        HistorialTurno.objects.bulk_create([HistorialTurno(estadoAnterior=turno.estado,
+                                                           estadoNuevo=Turno.CANCELADO,
+                                                           descripcion="Se cancelaron todos los turnos del dia",
+                                                           turno=turno,
+                                                           empleado=empleado)
+                                            for turno in afectados])
+        reservas_canceladas = faltas.actualizar_lineas(lineas, Turno.CANCELADO)
         cancelados = turnos.update(estado=Turno.CANCELADO)
+        turnos_modificados.send(sender=Turno, turnos=afectados)
         logger.info('Se cancelaron %s turnos' % cancelados)
         logger.info('Se cancelaron %s reservas' % reservas_canceladas)
         return reservas
@@ -438,16 +471,14 @@ class Bussiness():
         if afiliado is not None and afiliado:
             filtro['reserva__afiliado__id'] = afiliado.id
         if fecha_turno is not None and fecha_turno:
-            filtro['turno__fecha__day'] = fecha_turno.day
-            filtro['turno__fecha__month'] = fecha_turno.month
-            filtro['turno__fecha__year'] = fecha_turno.year
+            filtro.update(filtro_dia('turno__fecha', fecha_turno))
         if fecha_reserva is not None and fecha_reserva:
-            filtro['reserva__fecha__day'] = fecha_reserva.day
-            filtro['reserva__fecha__month'] = fecha_reserva.month
-            filtro['reserva__fecha__year'] = fecha_reserva.year
+            filtro.update(filtro_dia('reserva__fecha', fecha_reserva))
         if estado is not None and estado:
             filtro['estado'] = estado
-        return LineaDeReserva.objects.filter(**filtro).order_by('-turno__fecha', '-reserva__fecha')
+        return (LineaDeReserva.objects.filter(**filtro)
+                .select_related('turno__ee__especialidad', 'turno__ee__especialista', 'reserva__afiliado')
+                .order_by('-turno__fecha', '-reserva__fecha', '-id'))
     @transaction.commit_on_success()
     def modificar_linea_reserva(self, lr, turno=None, telefono=None, empleado=None):
         logger.info("Modificando reserva. lr=%s turno=%s telefono=%s empleado=%s" % 
@@ -1,5 +1,11 @@
 # coding=utf-8
+import operator
+
+from django.core import signing
+from django.db.models import Q
 from django.template.response import TemplateResponse
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
 
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
 
@@ -9,13 +15,22 @@ class Paginar(object):
     declarar 'object_list' que contendra una lista de los elementos y el decorador 
     genera en el contexto las variables 'paginator' que contiene las paginas y 'queries'
     que es la url actual de la vista sin el atributo 'page' para que pueda ser usado en los 
-    botones anterior, siguiente, etc."""
+    botones anterior, siguiente, etc.
+    
+    Si se indica un orden (ver Paginar.por_cursor) 'object_list' debe ser un queryset y
+    se pagina por cursor: 'object_list' y 'paginator' son una PaginaCursor y 'queries'
+    es la url sin el atributo 'cursor'. La cantidad total de elementos solo se consulta
+    con contar=True o si la url tiene el atributo 'contar' (por ejemplo ?contar=1)."""
     def __init__(self, view,
                  per_page='per_page',
                  page='page',
                  object_list='object_list',
                  paginator='paginator',
-                 queries='queries'):
+                 queries='queries',
+                 orden=None,
+                 cursor='cursor',
+                 contar=False,
+                 cuenta='contar'):
         self.DEFAULT_PER_PAGE=10
         self.view = view
         self.per_page = per_page
@@ -23,6 +38,21 @@ class Paginar(object):
         self.object_list = object_list
         self.page = page
         self.queries = queries
+        self.orden = orden
+        self.cursor = cursor
+        self.contar = contar
+        self.cuenta = cuenta
+
+    @classmethod
+    def por_cursor(cls, *orden, **kwargs):
+        """Devuelve un decorador que pagina por cursor (keyset) segun los campos de orden,
+        que deben identificar a cada elemento (por ejemplo terminar en 'id') y no ser nulos.
+        Se evita el COUNT(*) y el OFFSET de Paginator: cada pagina es una consulta que
+        continua desde el ultimo elemento de la anterior. Con contar=True (o el atributo
+        'contar' en la url) la pagina informa la cantidad total de elementos."""
+        def decorador(view):
+            return cls(view, orden=orden, **kwargs)
+        return decorador
 
     def __call__(self, request, *args, **kwargs):
         # comportamiento previo a la ejecución de view
@@ -32,8 +62,12 @@ class Paginar(object):
         # comportamiento posterior a la ejecución de view
         context = response.context_data
         object_lists = context.get(self.object_list)
-        if object_lists:
+        # no se evalua la lista: puede ser un queryset con muchos elementos
+        if object_lists is not None:
             per_page = request.GET.get(self.per_page, self.DEFAULT_PER_PAGE)
+            if self.orden:
+                self.__paginar_cursor(request, context, object_lists, per_page)
+                return response
             page = context[self.page] = request.GET.get(self.page)
             paginator = context[self.paginator] = Paginator(object_lists, per_page)
             try:
@@ -49,3 +83,106 @@ class Paginar(object):
                 del queries_without_page[self.page]
             context[self.queries] = queries_without_page
         return response
+
+    def __paginar_cursor(self, request, context, queryset, per_page):
+        """Pagina por cursor. Un cursor invalido se trata como la primera pagina."""
+        try:
+            per_page = max(1, int(per_page))
+        except ValueError:
+            per_page = self.DEFAULT_PER_PAGE
+        contar = self.contar or bool(request.GET.get(self.cuenta))
+        pagina = PaginaCursor(queryset, self.orden, per_page,
+                              request.GET.get(self.cursor), contar)
+        context[self.object_list] = context[self.paginator] = pagina
+        queries_without_cursor = request.GET.copy()
+        if queries_without_cursor.has_key(self.cursor):
+            del queries_without_cursor[self.cursor]
+        context[self.queries] = queries_without_cursor
+
+class PaginaCursor(object):
+    """Pagina de un queryset leida con un predicado de busqueda sobre los campos de orden
+    (keyset) en lugar de OFFSET: el costo de una pagina no depende de su profundidad.
+    
+    Los cursores 'anterior' y 'siguiente' son cadenas firmadas (django.core.signing) con
+    los valores de orden del primer o ultimo elemento de la pagina, para usar en la url.
+    'count' solo consulta la cantidad total de elementos si se usa."""
+    SALT = 'turnos.decorators.PaginaCursor'
+    def __init__(self, queryset, orden, per_page, cursor=None, contar=False):
+        self.queryset = queryset
+        self.orden = orden
+        self.contar = contar
+        atras, valores = self.__decodificar(cursor)
+        orden_consulta = [invertir(campo) for campo in orden] if atras else list(orden)
+        pagina = queryset.order_by(*orden_consulta)
+        if valores is not None:
+            pagina = pagina.filter(seek(orden_consulta, valores))
+        # un elemento de mas indica si hay otra pagina en el mismo sentido
+        self.object_list = list(pagina[:per_page + 1])
+        hay_mas = len(self.object_list) > per_page
+        del self.object_list[per_page:]
+        if atras:
+            self.object_list.reverse()
+            self.has_previous, self.has_next = hay_mas, True
+        else:
+            self.has_previous, self.has_next = valores is not None, hay_mas
+        self.anterior = self.siguiente = None
+        if self.object_list:
+            if self.has_previous:
+                self.anterior = self.__codificar(True, self.object_list[0])
+            if self.has_next:
+                self.siguiente = self.__codificar(False, self.object_list[-1])
+
+    @cached_property
+    def count(self):
+        return self.queryset.count()
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def __codificar(self, atras, elemento):
+        'Arma el cursor con los valores de orden de un elemento'
+        valores = []
+        for campo in self.orden:
+            valor = reduce(getattr, campo.lstrip('-').split('__'), elemento)
+            valores.append(['d', valor.isoformat()] if hasattr(valor, 'isoformat')
+                           else ['v', valor])
+        return signing.dumps([atras, valores], salt=self.SALT)
+
+    def __decodificar(self, cursor):
+        'Devuelve (atras, valores) de un cursor o (False, None) si no es valido'
+        if not cursor:
+            return False, None
+        try:
+            atras, valores = signing.loads(cursor, salt=self.SALT)
+        except (signing.BadSignature, ValueError, TypeError):
+            return False, None
+        if len(valores) != len(self.orden):
+            return False, None
+        return atras, [parse_datetime(valor) if tipo == 'd' else valor
+                       for tipo, valor in valores]
+
+def invertir(campo):
+    'Invierte el sentido de un campo de orden'
+    return campo[1:] if campo.startswith('-') else '-' + campo
+
+def seek(orden, valores):
+    """Predicado de los elementos posteriores a valores segun el orden:
+    (a > x) OR (a = x AND b > y) OR ... con < para los campos descendentes. Se agrega
+    a >= x (o a <= x) para que la base pueda recorrer el indice del primer campo desde x."""
+    condiciones = []
+    iguales = {}
+    for campo, valor in zip(orden, valores):
+        nombre = campo.lstrip('-')
+        condicion = dict(iguales)
+        condicion['%s__%s' % (nombre, 'lt' if campo.startswith('-') else 'gt')] = valor
+        condiciones.append(Q(**condicion))
+        iguales[nombre] = valor
+    primero = orden[0]
+    limite = {'%s__%s' % (primero.lstrip('-'), 'lte' if primero.startswith('-') else 'gte'): valores[0]}
+    return Q(**limite) & reduce(operator.or_, condiciones)
@@ -0,0 +1,144 @@
+# coding=utf-8
+'''
+Directorio de afiliados falso que corre en el mismo proceso, para pruebas y
+mediciones de negocio.directorio.ClienteHTTP sin el sistema de la obra social
+Created on 18/10/2026
+
+@author: romeroy
+'''
+from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+from SocketServer import ThreadingMixIn
+import json
+import threading
+import time
+import urlparse
+
+#===============================================================================
+# ServidorDirectorioFalso
+#===============================================================================
+class ServidorDirectorioFalso(object):
+    '''
+    Servidor HTTP en un hilo propio que responde las consultas del directorio
+    de afiliados (GET <url>?numero=<valor> o ?dni=<valor>) con los afiliados
+    indicados. Mantiene las conexiones abiertas (HTTP/1.1) como el directorio
+    real. Se usa como context manager:
+
+        with ServidorDirectorioFalso(afiliados) as servidor:
+            cliente = ClienteHTTP(servidor.url)
+
+    Atributos
+    -----------------
+    afiliados -- Lista de diccionarios con los campos de cada afiliado
+    demora -- Segundos que espera antes de responder cada consulta
+    estado -- Codigo HTTP a responder en lugar de buscar (None para buscar)
+    descartar -- Cantidad de consultas siguientes en las que se cierra la
+                 conexion sin responder (despues de la demora)
+    consultas -- Cantidad de consultas recibidas
+    conexiones -- Cantidad de conexiones TCP aceptadas
+    '''
+    #===========================================================================
+    # __init__
+    #===========================================================================
+    def __init__(self, afiliados=(), demora=0, estado=None):
+        'Constructor'
+        self.afiliados = list(afiliados)
+        self.demora = demora
+        self.estado = estado
+        self.descartar = 0
+        self.consultas = 0
+        self.conexiones = 0
+        self.url = None
+        self.__lock = threading.Lock()
+        self.__servidor = None
+
+    #===========================================================================
+    # iniciar
+    #===========================================================================
+    def iniciar(self):
+        'Empieza a escuchar en un puerto libre de 127.0.0.1'
+        self.__servidor = _Servidor(('127.0.0.1', 0), _Manejador)
+        self.__servidor.directorio = self
+        hilo = threading.Thread(target=self.__servidor.serve_forever,
+                                kwargs={'poll_interval': 0.05})
+        hilo.daemon = True
+        hilo.start()
+        self.url = 'http://127.0.0.1:%s/afiliados/' % self.__servidor.server_port
+        return self
+
+    #===========================================================================
+    # detener
+    #===========================================================================
+    def detener(self):
+        'Deja de escuchar'
+        self.__servidor.shutdown()
+        self.__servidor.server_close()
+
+    def __enter__(self):
+        return self.iniciar()
+
+    def __exit__(self, *args):
+        self.detener()
+
+    #===========================================================================
+    # responder
+    #===========================================================================
+    def responder(self, consulta):
+        '''Devuelve (estado, cuerpo) de la respuesta a una consulta
+        (diccionario de parametros de la url), o None para cerrar la
+        conexion sin responder'''
+        with self.__lock:
+            self.consultas += 1
+            descartar = self.descartar > 0
+            if descartar:
+                self.descartar -= 1
+        if self.demora:
+            time.sleep(self.demora)
+        if descartar:
+            return None
+        if self.estado is not None:
+            return self.estado, ''
+        encontrados = [afiliado for afiliado in self.afiliados
+                       if all(unicode(afiliado.get(parametro)) in valores
+                              for parametro, valores in consulta.items())]
+        if not encontrados:
+            return 404, ''
+        return 200, json.dumps(encontrados)
+
+    #===========================================================================
+    # conectado
+    #===========================================================================
+    def conectado(self):
+        'Cuenta una conexion aceptada'
+        with self.__lock:
+            self.conexiones += 1
+
+class _Servidor(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # el cliente cerro la conexion por timeout antes de la respuesta
+        pass
+
+class _Manejador(BaseHTTPRequestHandler):
+    'Atiende las consultas de una conexion'
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        BaseHTTPRequestHandler.setup(self)
+        self.server.directorio.conectado()
+
+    def do_GET(self):
+        consulta = urlparse.parse_qs(urlparse.urlsplit(self.path).query)
+        respuesta = self.server.directorio.responder(consulta)
+        if respuesta is None:
+            self.close_connection = 1
+            return
+        estado, cuerpo = respuesta
+        self.send_response(estado)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(cuerpo)))
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def log_message(self, *args):
+        pass
@@ -0,0 +1,107 @@
+# coding=utf-8
+'''
+Exportacion de la consulta de reservas en CSV o JSON delimitado por lineas.
+Las filas se generan de a lotes para usarlas en un StreamingHttpResponse:
+la memoria usada depende del tamaño del lote y no de la cantidad de filas.
+Created on 18/10/2026
+
+@author: romeroy
+'''
+import csv
+
+from django.utils import timezone
+
+from decorators import seek
+from serializacion import dumps
+from turnos.negocio.proyecciones import CAMPOS_RESERVA_EXPORTADA, \
+    COLUMNAS_RESERVA_EXPORTADA, reserva_exportada
+
+# orden de la consulta de reservas (ver Bussiness.consultar_reservas)
+ORDEN_RESERVAS = ('-turno__fecha', '-reserva__fecha', '-id')
+# cantidad de filas leidas por consulta
+TAMANO_LOTE = 500
+
+#===============================================================================
+# recorrer
+#===============================================================================
+def recorrer(queryset, orden, campos, tamano=TAMANO_LOTE):
+    '''
+    Genera los values() de campos de todos los elementos del queryset en el
+    orden indicado, leyendo de a tamano filas por consulta.
+
+    Cada lote continua desde los valores de orden de la ultima fila del lote
+    anterior (keyset) en lugar de usar OFFSET, y se lee con iterator() para
+    no guardar el lote en la cache del queryset. Se lee asi porque el
+    backend de sqlite no lee el cursor de a partes y iterator() sobre toda
+    la consulta cargaria todas las filas en memoria.
+
+    Parametros
+    ------------------
+    @param orden: Campos de orden. Deben identificar a cada elemento
+    @param campos: Campos a leer. Se agregan los de orden que falten
+    @param tamano: Cantidad de filas por consulta
+    '''
+    nombres = [campo.lstrip('-') for campo in orden]
+    campos = list(campos) + [nombre for nombre in nombres if nombre not in campos]
+    queryset = queryset.order_by(*orden)
+    lote = queryset
+    while True:
+        ultima = None
+        leidas = 0
+        for ultima in lote.values(*campos)[:tamano].iterator():
+            leidas += 1
+            yield ultima
+        if leidas < tamano:
+            return
+        lote = queryset.filter(seek(orden, [ultima[nombre] for nombre in nombres]))
+
+#===============================================================================
+# reservas_csv
+#===============================================================================
+class Eco(object):
+    'Archivo que devuelve lo que se escribe en el, para usar con csv.writer'
+    def write(self, valor):
+        return valor
+
+def reservas_csv(lineas, tamano=TAMANO_LOTE):
+    '''
+    Genera las lineas CSV (codificadas en utf-8) de un queryset de
+    LineaDeReserva, empezando por la cabecera con los nombres de columna.
+    '''
+    writer = csv.writer(Eco())
+    yield writer.writerow(COLUMNAS_RESERVA_EXPORTADA)
+    for fila in recorrer(lineas, ORDEN_RESERVAS, CAMPOS_RESERVA_EXPORTADA, tamano):
+        reserva = reserva_exportada(fila)
+        yield writer.writerow([valor_csv(reserva[columna])
+                               for columna in COLUMNAS_RESERVA_EXPORTADA])
+
+def valor_csv(valor):
+    'Convierte un valor a la cadena utf-8 que escribe csv.writer'
+    if valor is None:
+        return ''
+    if hasattr(valor, 'isoformat'):
+        return fecha_local(valor)
+    if isinstance(valor, unicode):
+        return valor.encode('utf-8')
+    return valor
+
+#===============================================================================
+# reservas_ndjson
+#===============================================================================
+def reservas_ndjson(lineas, tamano=TAMANO_LOTE):
+    '''
+    Genera un objeto JSON por linea (JSON delimitado por lineas) con las
+    columnas de cada LineaDeReserva del queryset.
+    '''
+    for fila in recorrer(lineas, ORDEN_RESERVAS, CAMPOS_RESERVA_EXPORTADA, tamano):
+        reserva = reserva_exportada(fila)
+        for columna in ('fecha_turno', 'fecha_reserva'):
+            reserva[columna] = fecha_local(reserva[columna])
+        yield dumps(reserva) + '\n'
+
+#===============================================================================
+# fecha_local
+#===============================================================================
+def fecha_local(fecha):
+    'Fecha en formato ISO 8601 en la zona horaria actual'
+    return timezone.localtime(fecha).isoformat()
@@ -135,6 +135,74 @@ class CancelarTurnoForm(forms.Form):
     especialista = forms.ModelChoiceField(queryset=Especialista.objects.all(),
                                           widget=forms.Select(attrs={'disabled':'disabled'}))
     fecha = forms.IntegerField(widget=forms.Select(attrs={'disabled':'disabled'}))
+#===============================================================================
+# CancelarTurnosRangoForm
+#===============================================================================
+class CancelarTurnosRangoForm(forms.Form):
+    '''Cancelacion de los turnos de un especialista entre dos fechas'''
+    especialidad = forms.ModelChoiceField(queryset=Especialidad.objects.all())
+    especialista = forms.ModelChoiceField(queryset=Especialista.objects.all())
+    desde = forms.DateField()
+    hasta = forms.DateField()
+    #===========================================================================
+    # clean
+    #===========================================================================
+    def clean(self):
+        '''Valida el rango de fechas y agrega 'ee' a los datos validos'''
+        cleaned_data = super(CancelarTurnosRangoForm, self).clean()
+        desde, hasta = cleaned_data.get('desde'), cleaned_data.get('hasta')
+        if desde and hasta and desde > hasta:
+            raise forms.ValidationError(u"La fecha desde debe ser anterior a la fecha hasta")
+        if cleaned_data.get('especialidad') and cleaned_data.get('especialista'):
+            ee = (EspecialistaEspecialidad.objects
+                  .filter(especialidad=cleaned_data['especialidad'],
+                          especialista=cleaned_data['especialista']).first())
+            if ee is None:
+                raise forms.ValidationError(u'La combinacion de especialidad y especialista no coincide')
+            cleaned_data['ee'] = ee
+        return cleaned_data
+#===============================================================================
+# ProximosTurnosForm
+#===============================================================================
+class ProximosTurnosForm(forms.Form):
+    '''Parametros de la busqueda de los proximos turnos de una especialidad'''
+    MAXIMO = 100
+    cantidad = forms.IntegerField(min_value=1, max_value=MAXIMO, required=False)
+    dias = forms.TypedMultipleChoiceField(choices=Disponibilidad.DIA,
+                                          coerce=int, required=False)
+    desde = forms.TimeField(required=False)
+    hasta = forms.TimeField(required=False)
+    #===========================================================================
+    # clean_cantidad
+    #===========================================================================
+    def clean_cantidad(self):
+        return self.cleaned_data['cantidad'] or 10
+class PresentismoForm(forms.Form):
+    '''Afiliados cuyo presentismo se verifica en lote, separados por coma'''
+    MAXIMO = 500
+    afiliados = forms.RegexField(regex=r'^\d+(,\d+)*$')
+    #===========================================================================
+    # clean_afiliados
+    #===========================================================================
+    def clean_afiliados(self):
+        afiliados = sorted(set(int(afiliado_id) for afiliado_id
+                               in self.cleaned_data['afiliados'].split(',')))
+        if len(afiliados) > self.MAXIMO:
+            raise forms.ValidationError("Se pueden consultar hasta %s afiliados"
+                                        % self.MAXIMO, code='max_value')
+        return afiliados
+class SugerirAfiliadosForm(forms.Form):
+    '''Texto a medio escribir de la busqueda de afiliados (numero, dni,
+    apellido o "apellido, nombre")'''
+    CANTIDAD = 10
+    MAXIMO = 50
+    texto = forms.CharField(min_length=2, max_length=100)
+    cantidad = forms.IntegerField(required=False, min_value=1, max_value=MAXIMO)
+    #===========================================================================
+    # clean_cantidad
+    #===========================================================================
+    def clean_cantidad(self):
+        return self.cleaned_data['cantidad'] or self.CANTIDAD
 class RegistarEspecialistaForm(forms.Form):
     error_messages = {
         'duplicate_dni': "Ya existe un especialista registrado con ese DNI",
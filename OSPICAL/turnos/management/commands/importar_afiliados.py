@@ -0,0 +1,231 @@
+# coding=utf-8
+'''
+Comando que importa el padron de afiliados de la obra social a la tabla
+Afiliado, que se usa cuando no responde el directorio externo
+Created on 18/10/2026
+
+@author: romeroy
+'''
+import codecs
+import csv
+import logging
+from optparse import make_option
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+
+from turnos.models import Afiliado
+from turnos.negocio.cache_afiliados import cache_afiliados
+from turnos.negocio.managers import AfiliadoManager
+
+logger = logging.getLogger(__name__)
+
+# columnas del padron
+COLUMNAS = ('numero', 'dni', 'nombre', 'apellido')
+
+#===============================================================================
+# Command
+#===============================================================================
+class Command(BaseCommand):
+    '''
+    Lee el padron fila por fila y guarda los afiliados por lotes con
+    AfiliadoManager.importar_afiliados: se agregan los numeros nuevos y se
+    actualizan los que cambiaron. La memoria usada depende del tamano del
+    lote y no del tamano del padron.
+
+    El padron puede ser un CSV con cabecera (numero, dni, nombre y
+    apellido) o un archivo de ancho fijo con las columnas indicadas en
+    --columnas. Las filas invalidas se informan y se omiten.
+
+    Varios afiliados pueden compartir el DNI (por ejemplo un afiliado con
+    mas de un numero): se importan todos y al final se informa cuantos DNI
+    estan repetidos, ya que la busqueda por DNI de esos afiliados necesita
+    el numero.
+    '''
+    args = '<archivo>'
+    help = "Importa el padron de afiliados desde un archivo CSV o de ancho fijo"
+    option_list = BaseCommand.option_list + (
+        make_option('--formato',
+                    choices=('csv', 'fijo'),
+                    default='csv',
+                    help='Formato del archivo: csv (por defecto) o fijo'),
+        make_option('--columnas',
+                    default='numero:13,dni:10,apellido:50,nombre:50',
+                    help='Columnas del formato fijo y su ancho, en orden'),
+        make_option('--delimitador',
+                    default=',',
+                    help='Separador de columnas del formato csv'),
+        make_option('--encoding',
+                    default='utf-8',
+                    help='Codificacion del archivo'),
+        make_option('--lote',
+                    type='int',
+                    default=500,
+                    help='Cantidad de filas guardadas por transaccion'),
+        make_option('--progreso',
+                    type='int',
+                    default=10000,
+                    help='Cada cuantas filas se informa el avance'),
+    )
+    # cantidad de filas invalidas que se detallan
+    ERRORES_DETALLADOS = 20
+
+    #===========================================================================
+    # handle
+    #===========================================================================
+    def handle(self, *args, **options):
+        if len(args) != 1:
+            raise CommandError("Indique el archivo del padron")
+        try:
+            codecs.lookup(options['encoding'])
+        except LookupError:
+            raise CommandError("Codificacion desconocida: %s" % options['encoding'])
+        manager = AfiliadoManager()
+        self.filas = self.nuevos = self.modificados = self.errores = 0
+        self.inicio = time.time()
+        lote = []
+        with open(args[0], 'rb') as archivo:
+            if options['formato'] == 'csv':
+                filas = self.leer_csv(archivo, options)
+            else:
+                filas = self.leer_fijo(archivo, options)
+            for linea, fila in filas:
+                self.filas += 1
+                afiliado = self.validar(linea, fila)
+                if afiliado is not None:
+                    lote.append(afiliado)
+                if len(lote) >= options['lote']:
+                    self.guardar(manager, lote)
+                    lote = []
+                if self.filas % options['progreso'] == 0:
+                    self.stdout.write("%s filas procesadas (%.0f filas/s)" %
+                                      (self.filas, self.velocidad()))
+        if lote:
+            self.guardar(manager, lote)
+        # los cambios hechos por lotes no pasan por turnos.signals
+        cache_afiliados.limpiar()
+        self.informar()
+
+    #===========================================================================
+    # leer_csv
+    #===========================================================================
+    def leer_csv(self, archivo, options):
+        'Genera (numero de linea, diccionario de columnas) de un CSV con cabecera'
+        lector = csv.reader(archivo, delimiter=options['delimitador'])
+        try:
+            cabecera = [self.decodificar(nombre, options).strip().lower()
+                        for nombre in next(lector)]
+        except StopIteration:
+            return
+        faltantes = [columna for columna in COLUMNAS if columna not in cabecera]
+        if faltantes:
+            raise CommandError("Faltan las columnas %s en la cabecera" %
+                               ", ".join(faltantes))
+        for valores in lector:
+            yield lector.line_num, dict(
+                        (nombre, self.decodificar(valor, options))
+                        for nombre, valor in zip(cabecera, valores))
+
+    #===========================================================================
+    # leer_fijo
+    #===========================================================================
+    def leer_fijo(self, archivo, options):
+        'Genera (numero de linea, diccionario de columnas) de un archivo de ancho fijo'
+        try:
+            columnas = [(nombre.strip(), int(ancho)) for nombre, ancho
+                        in (columna.split(':')
+                            for columna in options['columnas'].split(','))]
+        except ValueError:
+            raise CommandError("Columnas invalidas: %s" % options['columnas'])
+        faltantes = [columna for columna in COLUMNAS
+                     if columna not in dict(columnas)]
+        if faltantes:
+            raise CommandError("Faltan las columnas %s" % ", ".join(faltantes))
+        for linea, texto in enumerate(archivo, 1):
+            texto = self.decodificar(texto, options).rstrip('\r\n')
+            if not texto.strip():
+                continue
+            fila = {}
+            inicio = 0
+            for nombre, ancho in columnas:
+                fila[nombre] = texto[inicio:inicio + ancho]
+                inicio += ancho
+            yield linea, fila
+
+    #===========================================================================
+    # validar
+    #===========================================================================
+    def validar(self, linea, fila):
+        '''Devuelve el afiliado de una fila del padron, o None si la fila es
+        invalida'''
+        afiliado = dict((columna, (fila.get(columna) or u'').strip())
+                        for columna in COLUMNAS)
+        error = None
+        for columna in COLUMNAS:
+            maximo = Afiliado._meta.get_field(columna).max_length
+            if not afiliado[columna]:
+                error = u"falta %s" % columna
+            elif maximo and len(afiliado[columna]) > maximo:
+                error = u"%s supera los %s caracteres" % (columna, maximo)
+            if error:
+                break
+        if error is None:
+            try:
+                afiliado['dni'] = int(afiliado['dni'])
+            except ValueError:
+                error = u"dni invalido: %s" % afiliado['dni']
+        if error is None:
+            return afiliado
+        self.errores += 1
+        if self.errores <= self.ERRORES_DETALLADOS:
+            self.stderr.write(u"Linea %s: %s" % (linea, error))
+        return None
+
+    #===========================================================================
+    # guardar
+    #===========================================================================
+    def guardar(self, manager, lote):
+        'Guarda un lote de afiliados'
+        nuevos, modificados = manager.importar_afiliados(lote)
+        self.nuevos += nuevos
+        self.modificados += modificados
+
+    #===========================================================================
+    # informar
+    #===========================================================================
+    def informar(self):
+        'Informa el resultado de la importacion'
+        segundos = time.time() - self.inicio
+        self.stdout.write("Filas: %s" % self.filas)
+        self.stdout.write("Afiliados nuevos: %s" % self.nuevos)
+        self.stdout.write("Afiliados modificados: %s" % self.modificados)
+        self.stdout.write("Filas invalidas: %s" % self.errores)
+        self.stdout.write("Tiempo: %.1f s (%.0f filas/s)" %
+                          (segundos, self.velocidad()))
+        repetidos = (Afiliado.objects.values('dni')
+                     .annotate(cantidad=Count('id')).filter(cantidad__gt=1)
+                     .count())
+        self.stdout.write("DNI compartidos por mas de un afiliado: %s" % repetidos)
+        logger.info("Padron importado: %s filas, %s nuevos, %s modificados, "
+                    "%s invalidas en %.1f s" % (self.filas, self.nuevos,
+                                                self.modificados, self.errores,
+                                                segundos))
+
+    #===========================================================================
+    # velocidad
+    #===========================================================================
+    def velocidad(self):
+        'Filas procesadas por segundo desde el inicio'
+        return self.filas / max(time.time() - self.inicio, 1e-6)
+
+    #===========================================================================
+    # decodificar
+    #===========================================================================
+    def decodificar(self, valor, options):
+        'Decodifica un valor leido del archivo'
+        try:
+            return valor.decode(options['encoding'])
+        except UnicodeDecodeError:
+            raise CommandError("El archivo no esta codificado en %s" %
+                               options['encoding'])
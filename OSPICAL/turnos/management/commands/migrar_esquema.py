@@ -0,0 +1,175 @@
+# coding=utf-8
+'''
+Comando que actualiza el esquema de una base de datos existente con las
+restricciones e indices definidos en los modelos (syncdb solo los crea
+junto con las tablas nuevas)
+Created on 18/10/2026
+
+@author: romeroy
+'''
+import logging
+
+from django.core.management.base import BaseCommand
+from django.core.management.color import no_style
+from django.db import connection, transaction, DatabaseError
+from django.db.models import Count, Min
+
+from turnos.models import Turno, EspecialistaEspecialidad, LineaDeReserva, \
+    HistorialTurno, Disponibilidad, Reserva, Afiliado
+from turnos.negocio.faltas import faltas
+from turnos.negocio.resumen import resumen
+
+logger = logging.getLogger(__name__)
+
+#===============================================================================
+# Command
+#===============================================================================
+class Command(BaseCommand):
+    '''
+    Elimina los registros duplicados que impiden crear las restricciones
+    unique_together, crea los indices faltantes y genera el resumen diario
+    de turnos (negocio.resumen) y el registro de faltas (negocio.faltas).
+    Puede ejecutarse mas de una vez: los indices
+    existentes se informan y se ignoran.
+    '''
+    help = ("Elimina turnos duplicados y crea las restricciones e indices "
+            "definidos en los modelos")
+    # modelos cuyos indices (index_together / db_index) se crean
+    MODELOS = (EspecialistaEspecialidad, Turno, LineaDeReserva, Reserva,
+               Afiliado)
+
+    #===========================================================================
+    # handle
+    #===========================================================================
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self.stdout.write("Especialistas duplicados eliminados: %s" %
+                              self.deduplicar_especialistas())
+            self.stdout.write("Turnos duplicados eliminados: %s" %
+                              self.deduplicar_turnos())
+        for modelo in self.MODELOS:
+            for sql in self.sentencias(modelo):
+                self.ejecutar(sql)
+        # el resumen y las faltas empiezan vacios en una base existente, y
+        # deduplicar_especialistas mueve turnos con update() (sin señales)
+        self.stdout.write("Dias resumidos: %s" % resumen.reconstruir())
+        self.stdout.write("Faltas registradas: %s" % faltas.reconstruir())
+
+    #===========================================================================
+    # deduplicar_especialistas
+    #===========================================================================
+    def deduplicar_especialistas(self):
+        '''
+        Unifica las combinaciones especialista/especialidad repetidas en la
+        de menor id, reasignandole sus disponibilidades y turnos.
+        '''
+        eliminados = 0
+        repetidos = (EspecialistaEspecialidad.objects
+                     .values('especialista', 'especialidad')
+                     .annotate(cantidad=Count('id'), primero=Min('id'))
+                     .filter(cantidad__gt=1))
+        for grupo in repetidos:
+            duplicados = (EspecialistaEspecialidad.objects
+                          .filter(especialista=grupo['especialista'],
+                                  especialidad=grupo['especialidad'])
+                          .exclude(id=grupo['primero']))
+            Disponibilidad.objects.filter(ee__in=duplicados).update(
+                                                        ee=grupo['primero'])
+            Turno.objects.filter(ee__in=duplicados).update(ee=grupo['primero'])
+            eliminados += duplicados.count()
+            duplicados.delete()
+        return eliminados
+
+    #===========================================================================
+    # deduplicar_turnos
+    #===========================================================================
+    def deduplicar_turnos(self):
+        '''
+        Deja un unico turno por (fecha, ee, sobreturno). Se conserva el primer
+        turno que no este disponible (para no perder reservas) o el de menor
+        id; las lineas de reserva e historiales de los demas se le reasignan.
+        '''
+        eliminados = 0
+        repetidos = (Turno.objects.values('fecha', 'ee', 'sobreturno')
+                     .annotate(cantidad=Count('id')).filter(cantidad__gt=1))
+        for grupo in repetidos:
+            turnos = list(Turno.objects.filter(fecha=grupo['fecha'],
+                                               ee=grupo['ee'],
+                                               sobreturno=grupo['sobreturno'])
+                          .order_by('id'))
+            ocupados = [t for t in turnos if t.estado != Turno.DISPONIBLE]
+            conservado = ocupados[0] if ocupados else turnos[0]
+            duplicados = [t.id for t in turnos if t.id != conservado.id]
+            logger.info("Unificando turnos %s en el turno %s" %
+                        (duplicados, conservado.id))
+            LineaDeReserva.objects.filter(turno__in=duplicados).update(
+                                                            turno=conservado)
+            HistorialTurno.objects.filter(turno__in=duplicados).update(
+                                                            turno=conservado)
+            Turno.objects.filter(id__in=duplicados).delete()
+            eliminados += len(duplicados)
+        return eliminados
+
+    #===========================================================================
+    # sentencias
+    #===========================================================================
+    def sentencias(self, modelo):
+        '''
+        Devuelve las sentencias CREATE INDEX del modelo: una por cada
+        unique_together que no tenga ya un indice unico con las mismas
+        columnas (por ejemplo en una tabla creada por syncdb) y las que
+        genera syncdb para index_together y db_index (con los mismos
+        nombres).
+        '''
+        qn = connection.ops.quote_name
+        tabla = modelo._meta.db_table
+        unicos = self.indices_unicos(tabla)
+        sentencias = []
+        for campos in modelo._meta.unique_together:
+            columnas = [modelo._meta.get_field(campo).column
+                        for campo in campos]
+            if frozenset(columnas) in unicos:
+                continue
+            nombre = "%s_%s_uniq" % (tabla, "_".join(campos))
+            sentencias.append("CREATE UNIQUE INDEX %s ON %s (%s);" %
+                              (qn(nombre), qn(tabla),
+                               ", ".join(qn(c) for c in columnas)))
+        sentencias += connection.creation.sql_indexes_for_model(modelo,
+                                                                no_style())
+        return sentencias
+
+    #===========================================================================
+    # indices_unicos
+    #===========================================================================
+    def indices_unicos(self, tabla):
+        '''
+        Devuelve los conjuntos (frozenset) de columnas de los indices unicos
+        de la tabla. Solo se consultan en sqlite: en otras bases devuelve un
+        conjunto vacio y los indices existentes se omiten al ejecutarlos.
+        '''
+        unicos = set()
+        if connection.vendor != 'sqlite':
+            return unicos
+        qn = connection.ops.quote_name
+        cursor = connection.cursor()
+        cursor.execute("PRAGMA index_list(%s)" % qn(tabla))
+        # filas (seq, nombre, unico, ...)
+        for indice in cursor.fetchall():
+            if not indice[2]:
+                continue
+            cursor.execute("PRAGMA index_info(%s)" % qn(indice[1]))
+            # filas (seqno, cid, columna)
+            unicos.add(frozenset(fila[2] for fila in cursor.fetchall()))
+        return unicos
+
+    #===========================================================================
+    # ejecutar
+    #===========================================================================
+    def ejecutar(self, sql):
+        'Ejecuta una sentencia, ignorandola si el indice ya existe'
+        try:
+            with transaction.atomic():
+                connection.cursor().execute(sql)
+            self.stdout.write("OK: %s" % sql)
+        except DatabaseError as e:
+            self.stdout.write("Omitido (%s): %s" % (e, sql))
@@ -0,0 +1,46 @@
+# coding=utf-8
+'''
+Comando que reconstruye o verifica el resumen diario de turnos
+(modelo DiaDisponibilidad)
+Created on 18/10/2026
+
+@author: romeroy
+'''
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+
+from turnos.negocio.resumen import resumen
+
+#===============================================================================
+# Command
+#===============================================================================
+class Command(BaseCommand):
+    '''
+    Sin opciones vuelve a generar la tabla DiaDisponibilidad a partir de los
+    turnos. Con --verificar solo la compara con los turnos y falla si hay
+    diferencias.
+    '''
+    help = "Reconstruye el resumen diario de turnos de los especialistas"
+    option_list = BaseCommand.option_list + (
+        make_option('--verificar',
+                    action='store_true',
+                    dest='verificar',
+                    default=False,
+                    help='Compara el resumen con los turnos sin modificarlo'),
+    )
+
+    #===========================================================================
+    # handle
+    #===========================================================================
+    def handle(self, *args, **options):
+        if not options['verificar']:
+            self.stdout.write("Dias generados: %s" % resumen.reconstruir())
+            return
+        diferencias = resumen.verificar()
+        for ee_id, dia in diferencias:
+            self.stdout.write("Diferencia en ee %s dia %s" % (ee_id, dia))
+        if diferencias:
+            raise CommandError("El resumen tiene %s dias desactualizados"
+                               % len(diferencias))
+        self.stdout.write("El resumen esta actualizado")
@@ -0,0 +1,46 @@
+# coding=utf-8
+'''
+Comando que reconstruye o verifica el registro de faltas de los afiliados
+(modelo Falta)
+Created on 18/10/2026
+
+@author: romeroy
+'''
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+
+from turnos.negocio.faltas import faltas
+
+#===============================================================================
+# Command
+#===============================================================================
+class Command(BaseCommand):
+    '''
+    Sin opciones vuelve a generar la tabla Falta a partir de las lineas de
+    reserva con estado AUSENTE. Con --verificar solo la compara con las
+    lineas de reserva y falla si hay diferencias.
+    '''
+    help = "Reconstruye el registro de faltas de los afiliados"
+    option_list = BaseCommand.option_list + (
+        make_option('--verificar',
+                    action='store_true',
+                    dest='verificar',
+                    default=False,
+                    help='Compara el registro con las lineas de reserva sin modificarlo'),
+    )
+
+    #===========================================================================
+    # handle
+    #===========================================================================
+    def handle(self, *args, **options):
+        if not options['verificar']:
+            self.stdout.write("Faltas generadas: %s" % faltas.reconstruir())
+            return
+        diferencias = faltas.verificar()
+        for afiliado_id in diferencias:
+            self.stdout.write("Diferencia en afiliado %s" % afiliado_id)
+        if diferencias:
+            raise CommandError("El registro tiene %s afiliados desactualizados"
+                               % len(diferencias))
+        self.stdout.write("El registro de faltas esta actualizado")
@@ -4,13 +4,16 @@ from django.contrib.auth.models import User
 
 class Afiliado(models.Model):
     numero = models.CharField(max_length=13, unique=True)
-    dni = models.IntegerField()
+    dni = models.IntegerField(db_index=True)
     nombre = models.CharField(max_length=50)
     apellido = models.CharField(max_length=50)
     def __str__(self):
         return u"%s" % model_to_dict(self)
     def full_name(self):
         return u"%s, %s" % (self.apellido, self.nombre)
+    class Meta:
+        # busqueda por prefijo del apellido (y del nombre) ordenada
+        index_together = [["apellido", "nombre"]]
 
 class Especialidad(models.Model):
     descripcion = models.CharField(max_length=50)
@@ -35,7 +38,8 @@ class Empleado (models.Model):
         return "%s" % model_to_dict(self)
 
 class Reserva(models.Model):
-    fecha = models.DateTimeField(auto_now_add=True)
+    # indice para paginar la consulta de reservas por fecha
+    fecha = models.DateTimeField(auto_now_add=True, db_index=True)
     telefono = models.CharField(max_length=20)
     afiliado = models.ForeignKey(Afiliado)
     def __str__(self):
@@ -53,13 +57,14 @@ class Especialista(models.Model):
     def __unicode__(self):
         return u'%s' % self.full_name()
 class EspecialistaEspecialidad(models.Model):
-    unique_together = ("especialista", "especialidad")
     especialista = models.ForeignKey(Especialista)
     especialidad = models.ForeignKey(Especialidad)
     frecuencia_turnos = models.SmallIntegerField(default=15)
     fechaBaja = models.DateField(null=True)
     def __str__(self):
         return "%s" % model_to_dict(self)
+    class Meta:
+        unique_together = ("especialista", "especialidad")
 
 class Disponibilidad(models.Model):
     # Constantes ~
@@ -89,7 +94,6 @@ class Disponibilidad(models.Model):
         return "%s" % model_to_dict(self)
 
 class Turno (models.Model):
-    unique_together = ("fecha", "ee", "sobreturno")
     # Constantes ~
     DISPONIBLE = 'D'
     RESERVADO = 'R'
@@ -117,6 +121,9 @@ class Turno (models.Model):
                 self.sobreturno == other.sobreturno and 
                 self.ee == other.ee)
     class Meta:
+        unique_together = ("fecha", "ee", "sobreturno")
+        # turnos de un especialista en un rango de fechas (y estado)
+        index_together = [["ee", "fecha", "estado"]]
         permissions = (
             # Permission identifier     human-readable permission name
             ("crear_turnos",                  "Crear turnos"),
@@ -124,12 +131,44 @@ class Turno (models.Model):
             ("cancelar_turnos",               "Cancelar turnos"),
         )
         
+class DiaDisponibilidad(models.Model):
+    """Resumen de los turnos de un especialista en un dia. Se mantiene
+    actualizado desde negocio.resumen cada vez que cambian sus turnos"""
+    ee = models.ForeignKey(EspecialistaEspecialidad)
+    fecha = models.DateField()
+    disponibles = models.IntegerField(default=0)
+    reservados = models.IntegerField(default=0)
+    cancelados = models.IntegerField(default=0)
+    sobreturnos = models.IntegerField(default=0)
+    # fecha y hora del ultimo turno del dia
+    ultimo_turno = models.DateTimeField()
+    def __str__(self):
+        return "%s" % model_to_dict(self)
+    class Meta:
+        unique_together = ("ee", "fecha")
+
 class LineaDeReserva (models.Model):
     estado = models.CharField(max_length=1, choices=Turno.ESTADO)
     reserva = models.ForeignKey(Reserva)
     turno = models.ForeignKey(Turno)
     def __str__(self):
         return "%s" % model_to_dict(self)
+    class Meta:
+        # lineas de una reserva en un estado determinado
+        index_together = [["reserva", "estado"]]
+class Falta(models.Model):
+    """Registro de las lineas de reserva con estado AUSENTE, con el afiliado y
+    la fecha de su reserva. Se mantiene actualizado desde negocio.faltas cada
+    vez que cambia el estado de una linea"""
+    linea = models.OneToOneField(LineaDeReserva)
+    afiliado = models.ForeignKey(Afiliado)
+    # fecha de la reserva de la linea
+    fecha = models.DateTimeField()
+    def __str__(self):
+        return "%s" % model_to_dict(self)
+    class Meta:
+        # faltas de un afiliado desde una fecha
+        index_together = [["afiliado", "fecha"]]
 class HistorialTurno(models.Model):
     fecha = models.DateTimeField(auto_now_add=True)
     estadoAnterior = models.CharField(max_length=1, null=True, choices=Turno.ESTADO)
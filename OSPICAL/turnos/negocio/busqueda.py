@@ -0,0 +1,121 @@
+# coding=utf-8
+'''
+Busqueda de los proximos turnos disponibles de una especialidad
+Created on 18/10/2026
+
+@author: romeroy
+'''
+from datetime import timedelta
+import heapq
+from itertools import islice
+import logging
+
+from django.db.models import Q
+from django.utils import timezone
+
+from turnos.models import Turno, EspecialistaEspecialidad
+from fechas import extra_horario
+
+logger = logging.getLogger(__name__)
+
+#===============================================================================
+# BuscadorTurnos
+#===============================================================================
+class BuscadorTurnos(object):
+    '''
+    Busca los primeros turnos disponibles de todos los especialistas de una
+    especialidad.
+
+    Los turnos de cada especialista se leen ordenados por fecha en paginas
+    de TAMANO_PAGINA turnos (cada pagina es una consulta que recorre el
+    indice (ee, fecha, estado)) y se combinan con heapq.merge, por lo que
+    solo se leen las paginas necesarias para completar la cantidad pedida.
+    Los filtros por dia de la semana y franja horaria se resuelven en la
+    base de datos y la busqueda termina HORIZONTE dias despues de la fecha
+    inicial, asi que un especialista sin turnos en la franja pedida cuesta
+    una consulta.
+    '''
+    TAMANO_PAGINA = 50
+    HORIZONTE = 60
+    #===========================================================================
+    # proximos
+    #===========================================================================
+    def proximos(self, especialidad_id, cantidad, dias=None, hora_desde=None,
+                 hora_hasta=None, desde=None, hasta=None):
+        '''
+        Devuelve los primeros turnos disponibles de la especialidad.
+
+        Parametros
+        ------------------
+        @param especialidad_id: Id de la especialidad
+        @param cantidad: Cantidad maxima de turnos devueltos
+        @param dias: Lista de dias de la semana (0 lunes ... 6 domingo) o None
+        @param hora_desde: time desde la cual buscar en cada dia o None
+        @param hora_hasta: time hasta la cual (exclusive) buscar o None
+        @param desde: datetime a partir del cual buscar (por defecto ahora)
+        @param hasta: datetime hasta el cual (exclusive) buscar (por defecto
+                      HORIZONTE dias despues de desde)
+
+        Retorna
+        -----------
+        @return: Lista ordenada por fecha de diccionarios con las claves id,
+                 fecha, sobreturno, consultorio, ee_id, especialista_id y
+                 especialista
+        '''
+        desde = desde or timezone.now()
+        hasta = hasta or desde + timedelta(days=self.HORIZONTE)
+        ees = dict((ee.id, ee) for ee in (EspecialistaEspecialidad.objects
+                                          .filter(especialidad__id=especialidad_id)
+                                          .select_related('especialista')))
+        filtro = Q()
+        if dias:
+            # fecha__week_day: 1 domingo ... 7 sabado
+            for dia in dias:
+                filtro |= Q(fecha__week_day=(int(dia) + 1) % 7 + 1)
+        horario = extra_horario(Turno, 'fecha', hora_desde, hora_hasta)
+        turnos = heapq.merge(*[self.__turnos_del_ee(ee_id, desde, hasta, filtro,
+                                                    horario)
+                               for ee_id in ees])
+        data = list()
+        for fecha, turno_id, turno in islice(turnos, cantidad):
+            especialista = ees[turno['ee']].especialista
+            data.append({'id': turno_id,
+                         'fecha': fecha,
+                         'sobreturno': turno['sobreturno'],
+                         'consultorio': turno['consultorio__numero'],
+                         'ee_id': turno['ee'],
+                         'especialista_id': especialista.id,
+                         'especialista': especialista.full_name()})
+        logger.debug("Proximos turnos de la especialidad %s: %s" %
+                     (especialidad_id, data))
+        return data
+
+    #===========================================================================
+    # __turnos_del_ee
+    #===========================================================================
+    def __turnos_del_ee(self, ee_id, desde, hasta, filtro, horario):
+        '''
+        Generador de los turnos disponibles de un especialista ordenados por
+        fecha. Lee paginas de TAMANO_PAGINA turnos continuando desde el
+        ultimo (fecha, id) leido.
+
+        Retorna
+        -----------
+        @return: Tuplas (fecha, id, turno)
+        '''
+        siguientes = Q(fecha__gte=desde)
+        while True:
+            pagina = list(Turno.objects
+                          .filter(siguientes, filtro, ee__id=ee_id,
+                                  estado=Turno.DISPONIBLE, fecha__lt=hasta)
+                          .extra(**horario)
+                          .order_by('fecha', 'id')
+                          .values('id', 'fecha', 'sobreturno', 'ee',
+                                  'consultorio__numero')[:self.TAMANO_PAGINA])
+            for turno in pagina:
+                yield (turno['fecha'], turno['id'], turno)
+            if len(pagina) < self.TAMANO_PAGINA:
+                return
+            ultimo = pagina[-1]
+            siguientes = (Q(fecha__gt=ultimo['fecha']) |
+                          Q(fecha=ultimo['fecha'], id__gt=ultimo['id']))
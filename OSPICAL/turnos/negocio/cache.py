@@ -0,0 +1,131 @@
+# coding=utf-8
+'''
+Cache en memoria con desalojo LRU, limite de memoria y vencimiento
+Created on 18/10/2026
+
+@author: romeroy
+'''
+from collections import OrderedDict
+import threading
+import time
+
+#===============================================================================
+# CacheLRU
+#===============================================================================
+class CacheLRU(object):
+    '''
+    Cache clave/valor compartida entre hilos. Cada valor se guarda con su
+    tamano estimado en bytes; cuando la suma supera el presupuesto se
+    desalojan los valores usados hace mas tiempo. Opcionalmente los valores
+    vencen despues de una cantidad de segundos.
+
+    Atributos
+    -----------------
+    presupuesto -- Cantidad maxima de bytes ocupados por los valores
+    vigencia -- Segundos que dura un valor (None para que no venza)
+    hits -- Cantidad de consultas resueltas desde la cache
+    misses -- Cantidad de consultas de claves ausentes o vencidas
+    desalojos -- Cantidad de valores descartados por falta de espacio
+    '''
+    #===========================================================================
+    # __init__
+    #===========================================================================
+    def __init__(self, presupuesto, vigencia=None):
+        'Constructor'
+        self.presupuesto = presupuesto
+        self.vigencia = vigencia
+        self.__valores = OrderedDict()
+        self.__ocupado = 0
+        self.__lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.desalojos = 0
+
+    #===========================================================================
+    # get
+    #===========================================================================
+    def get(self, clave, default_value=None):
+        '''
+        Obtiene un valor y lo marca como el usado mas recientemente.
+
+        Retorna
+        -----------
+        @return: Valor guardado o default_value si no existe o vencio
+        '''
+        with self.__lock:
+            entrada = self.__valores.pop(clave, None)
+            if entrada is None or (entrada[2] is not None and
+                                   entrada[2] < time.time()):
+                if entrada is not None:
+                    self.__ocupado -= entrada[1]
+                self.misses += 1
+                return default_value
+            self.__valores[clave] = entrada
+            self.hits += 1
+            return entrada[0]
+
+    #===========================================================================
+    # put
+    #===========================================================================
+    def put(self, clave, valor, tamano=1):
+        '''
+        Guarda un valor desalojando los menos usados si hace falta. Un valor
+        mas grande que el presupuesto no se guarda.
+
+        Parametros
+        ------------------
+        @param clave: Clave del valor
+        @param valor: Valor a guardar
+        @param tamano: Tamano estimado del valor en bytes
+        '''
+        vence = time.time() + self.vigencia if self.vigencia else None
+        with self.__lock:
+            anterior = self.__valores.pop(clave, None)
+            if anterior is not None:
+                self.__ocupado -= anterior[1]
+            if tamano > self.presupuesto:
+                return
+            while self.__ocupado + tamano > self.presupuesto:
+                _, desalojado = self.__valores.popitem(last=False)
+                self.__ocupado -= desalojado[1]
+                self.desalojos += 1
+            self.__valores[clave] = (valor, tamano, vence)
+            self.__ocupado += tamano
+
+    #===========================================================================
+    # eliminar
+    #===========================================================================
+    def eliminar(self, clave):
+        'Descarta un valor si existe'
+        with self.__lock:
+            entrada = self.__valores.pop(clave, None)
+            if entrada is not None:
+                self.__ocupado -= entrada[1]
+
+    #===========================================================================
+    # limpiar
+    #===========================================================================
+    def limpiar(self):
+        'Descarta todos los valores'
+        with self.__lock:
+            self.__valores.clear()
+            self.__ocupado = 0
+
+    #===========================================================================
+    # estadisticas
+    #===========================================================================
+    def estadisticas(self):
+        '''Devuelve un diccionario con los contadores de uso, la cantidad de
+        valores y los bytes ocupados'''
+        with self.__lock:
+            return {'hits': self.hits,
+                    'misses': self.misses,
+                    'desalojos': self.desalojos,
+                    'valores': len(self.__valores),
+                    'ocupado': self.__ocupado}
+
+    #===========================================================================
+    # __len__
+    #===========================================================================
+    def __len__(self):
+        return len(self.__valores)
@@ -0,0 +1,145 @@
+# coding=utf-8
+'''
+Cache de las busquedas de afiliados por id, numero o dni
+Created on 18/10/2026
+
+@author: romeroy
+'''
+import logging
+import threading
+import time
+
+from cache import CacheLRU
+
+logger = logging.getLogger(__name__)
+
+#===============================================================================
+# CacheAfiliados
+#===============================================================================
+class CacheAfiliados(object):
+    '''
+    Cache de lectura (read-through) de las busquedas de afiliados, por
+    (parametro, valor). Los resultados se guardan en una CacheLRU con limite
+    de memoria que vencen despues de VIGENCIA segundos. Las busquedas sin
+    resultados se guardan aparte durante VIGENCIA_NEGATIVA segundos, para
+    no repetir la consulta externa de un numero inexistente pero ver pronto
+    un afiliado nuevo.
+
+    Los afiliados guardados o borrados con save() o delete() descartan la
+    cache (ver turnos.signals).
+
+    Atributos
+    -----------------
+    hits -- Cantidad de busquedas resueltas desde la cache
+    misses -- Cantidad de busquedas que se tuvieron que hacer
+    negativos -- Cantidad de hits de busquedas sin resultados
+    '''
+    PRESUPUESTO = 1024 * 1024
+    VIGENCIA = 300
+    VIGENCIA_NEGATIVA = 60
+    # tamano estimado en bytes de cada afiliado guardado
+    TAMANO_AFILIADO = 256
+
+    #===========================================================================
+    # __init__
+    #===========================================================================
+    def __init__(self, presupuesto=PRESUPUESTO, vigencia=VIGENCIA,
+                 vigencia_negativa=VIGENCIA_NEGATIVA):
+        'Constructor'
+        self.cache = CacheLRU(presupuesto, vigencia)
+        self.cache_negativa = CacheLRU(presupuesto // 8, vigencia_negativa)
+        # se incrementa con cada limpieza para no guardar una busqueda hecha
+        # antes de que se modificaran los afiliados
+        self.__version = 0
+        self.__lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.negativos = 0
+        self.__tiempo_hits = 0.0
+        self.__tiempo_misses = 0.0
+
+    #===========================================================================
+    # buscar
+    #===========================================================================
+    def buscar(self, parametro, valor, buscar):
+        '''
+        Devuelve los afiliados de una busqueda, desde la cache o llamando a
+        buscar(parametro, valor) y guardando el resultado. El valor se
+        normaliza (unicode sin espacios) antes de armar la clave y de buscar,
+        para que las busquedas que comparten la clave den el mismo resultado.
+
+        Retorna
+        -----------
+        @return: Lista de diccionarios (copias de los guardados)
+        '''
+        inicio = time.time()
+        valor = unicode(valor).strip()
+        clave = (parametro, valor)
+        data = self.cache.get(clave)
+        negativo = data is None and self.cache_negativa.get(clave) is not None
+        if data is not None or negativo:
+            data = [dict(afiliado) for afiliado in data or []]
+            self.__contar(True, negativo, inicio)
+            return data
+        version = self.__version
+        data = buscar(parametro, valor)
+        with self.__lock:
+            if version == self.__version:
+                if data:
+                    self.cache.put(clave, [dict(afiliado) for afiliado in data],
+                                   self.TAMANO_AFILIADO * len(data))
+                else:
+                    self.cache_negativa.put(clave, True, 64)
+        self.__contar(False, False, inicio)
+        return data
+
+    #===========================================================================
+    # limpiar
+    #===========================================================================
+    def limpiar(self):
+        'Descarta todas las busquedas guardadas'
+        with self.__lock:
+            self.__version += 1
+            self.cache.limpiar()
+            self.cache_negativa.limpiar()
+
+    #===========================================================================
+    # estadisticas
+    #===========================================================================
+    def estadisticas(self):
+        '''Devuelve un diccionario con los contadores de uso, la proporcion
+        de hits, la latencia promedio en milisegundos de los hits y de los
+        misses y el estado de la cache'''
+        with self.__lock:
+            consultas = self.hits + self.misses
+            estadisticas = {
+                'hits': self.hits,
+                'misses': self.misses,
+                'negativos': self.negativos,
+                'hit_ratio': float(self.hits) / consultas if consultas else 0.0,
+                'latencia_hits_ms': (1000 * self.__tiempo_hits / self.hits
+                                     if self.hits else 0.0),
+                'latencia_misses_ms': (1000 * self.__tiempo_misses / self.misses
+                                       if self.misses else 0.0)}
+        cache = self.cache.estadisticas()
+        estadisticas.update((clave, cache[clave])
+                            for clave in ('valores', 'ocupado', 'desalojos'))
+        return estadisticas
+
+    #===========================================================================
+    # __contar
+    #===========================================================================
+    def __contar(self, hit, negativo, inicio):
+        'Registra una busqueda y su duracion'
+        duracion = time.time() - inicio
+        with self.__lock:
+            if hit:
+                self.hits += 1
+                self.negativos += negativo
+                self.__tiempo_hits += duracion
+            else:
+                self.misses += 1
+                self.__tiempo_misses += duracion
+
+# instancia compartida por todo el proceso
+cache_afiliados = CacheAfiliados()
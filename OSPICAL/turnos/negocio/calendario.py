@@ -0,0 +1,155 @@
+# coding=utf-8
+'''
+Este modulo calcula el calendario de dias con turnos de un especialista
+Created on 18/10/2026
+
+@author: romeroy
+'''
+from datetime import datetime, time
+import logging
+
+from django.db.models import Max, Sum
+from django.utils import timezone
+
+from turnos.models import DiaDisponibilidad, Turno
+from fechas import dia_local, rango_dia
+from resumen import resumen
+
+logger = logging.getLogger(__name__)
+
+#===============================================================================
+# Calendario
+#===============================================================================
+class Calendario(object):
+    '''
+    Obtiene para cada dia con turnos de un especialista la cantidad de
+    turnos por estado. Lee el resumen diario DiaDisponibilidad (ver
+    negocio.resumen) sumando las filas de todas las especialidades del
+    especialista, con una unica consulta. Si el resumen no tiene filas del
+    especialista (por ejemplo en una base existente en la que todavia no se
+    ejecuto migrar_esquema) se calcula a partir de los turnos.
+    '''
+    #===========================================================================
+    # dias
+    #===========================================================================
+    def dias(self, especialista_id, cantidad):
+        '''
+        Devuelve los proximos dias con turnos del especialista.
+
+        Parametros
+        ------------------
+        @param especialista_id: Id del especialista
+        @param cantidad: Cantidad maxima de dias devueltos
+
+        Retorna
+        -----------
+        @return: Lista ordenada por fecha de diccionarios con las claves
+                 fecha (datetime de las 00:00 del dia), disponibles,
+                 cancelados y sobreturnos (cantidad de turnos de cada tipo)
+        '''
+        ahora = timezone.now()
+        # solo se listan los dias con algun turno a partir de ahora
+        filas = (self.__resumen(especialista_id)
+                 .filter(fecha__gte=dia_local(ahora))
+                 .values('fecha')
+                 .annotate(**self.__totales())
+                 .filter(ultimo__gte=ahora)
+                 .order_by('fecha')[:cantidad])
+        if not filas and self.__sin_resumen(especialista_id):
+            filas = [fila for fila in self.__calcular(especialista_id,
+                                                      dia_local(ahora))
+                     if fila['ultimo'] >= ahora][:cantidad]
+        calendario = [self.__dia(fila) for fila in filas]
+        logger.debug("Calendario del especialista %s: %s" %
+                     (especialista_id, calendario))
+        return calendario
+
+    #===========================================================================
+    # dia
+    #===========================================================================
+    def dia(self, especialista_id, fecha):
+        '''
+        Devuelve los contadores de un dia del especialista (con las mismas
+        claves que dias) o None si ese dia no tiene turnos.
+        '''
+        fila = (self.__resumen(especialista_id)
+                .filter(fecha=dia_local(fecha))
+                .aggregate(**self.__totales()))
+        if fila['ultimo'] is None:
+            if not self.__sin_resumen(especialista_id):
+                return None
+            filas = self.__calcular(especialista_id, dia_local(fecha),
+                                    dia_local(fecha))
+            if not filas:
+                return None
+            fila = filas[0]
+        fila['fecha'] = dia_local(fecha)
+        return self.__dia(fila)
+
+    #===========================================================================
+    # __resumen
+    #===========================================================================
+    def __resumen(self, especialista_id):
+        'Filas del resumen de todas las especialidades del especialista'
+        return DiaDisponibilidad.objects.filter(
+                                        ee__especialista__id=especialista_id)
+
+    #===========================================================================
+    # __sin_resumen
+    #===========================================================================
+    def __sin_resumen(self, especialista_id):
+        'Indica si el resumen no tiene ninguna fila del especialista'
+        if self.__resumen(especialista_id).exists():
+            return False
+        logger.warning("El resumen diario no tiene filas del especialista %s, "
+                       "se consultan sus turnos (ver migrar_esquema)" %
+                       especialista_id)
+        return True
+
+    #===========================================================================
+    # __calcular
+    #===========================================================================
+    def __calcular(self, especialista_id, desde, hasta=None):
+        '''Calcula las filas agrupadas por dia (con las claves de
+        __totales) a partir de los turnos del especialista, desde el dia
+        desde y hasta el dia hasta inclusive'''
+        turnos = Turno.objects.filter(ee__especialista__id=especialista_id,
+                                      fecha__gte=rango_dia(desde)[0])
+        if hasta is not None:
+            turnos = turnos.filter(fecha__lt=rango_dia(hasta)[1])
+        filas = {}
+        for (_, dia), resumido in resumen.calcular(turnos).items():
+            fila = filas.setdefault(dia, {'fecha': dia,
+                                          'total_disponibles': 0,
+                                          'total_cancelados': 0,
+                                          'total_sobreturnos': 0,
+                                          'ultimo': resumido.ultimo_turno})
+            fila['total_disponibles'] += resumido.disponibles
+            fila['total_cancelados'] += resumido.cancelados
+            fila['total_sobreturnos'] += resumido.sobreturnos
+            fila['ultimo'] = max(fila['ultimo'], resumido.ultimo_turno)
+        return [filas[dia] for dia in sorted(filas)]
+
+    #===========================================================================
+    # __totales
+    #===========================================================================
+    def __totales(self):
+        'Agregados que suman los contadores de las filas de un mismo dia'
+        return {'total_disponibles': Sum('disponibles'),
+                'total_cancelados': Sum('cancelados'),
+                'total_sobreturnos': Sum('sobreturnos'),
+                'ultimo': Max('ultimo_turno')}
+
+    #===========================================================================
+    # __dia
+    #===========================================================================
+    def __dia(self, fila):
+        '''Convierte una fila agrupada en el diccionario del calendario. La
+        fecha es un datetime de las 00:00 en la zona horaria actual (igual
+        que QuerySet.datetimes)'''
+        fecha = datetime.combine(fila['fecha'], time.min)
+        return {'fecha': timezone.make_aware(fecha,
+                                             timezone.get_current_timezone()),
+                'disponibles': fila['total_disponibles'],
+                'cancelados': fila['total_cancelados'],
+                'sobreturnos': fila['total_sobreturnos']}
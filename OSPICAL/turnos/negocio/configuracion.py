@@ -0,0 +1,115 @@
+# coding=utf-8
+'''
+Este modulo mantiene en memoria los parametros de configuracion de la
+aplicacion (modelo models.Settings) para no consultarlos en cada peticion
+Created on 18/10/2026
+
+@author: romeroy
+'''
+import logging
+import threading
+import time
+
+from turnos.models import Settings
+
+logger = logging.getLogger(__name__)
+
+#===============================================================================
+# Configuracion
+#===============================================================================
+class Configuracion(object):
+    '''
+    Cache de los parametros de configuracion. La tabla Settings se carga
+    completa la primera vez que se consulta un parametro y se mantiene en
+    memoria hasta que se invalida (ver turnos.signals) o pasan VIGENCIA
+    segundos: las señales solo invalidan la cache del proceso que modifico
+    la tabla, los demas procesos la releen al vencer.
+
+    Atributos
+    -----------------
+    hits -- Cantidad de consultas resueltas desde la memoria
+    misses -- Cantidad de veces que se tuvo que leer la tabla Settings
+    '''
+    VIGENCIA = 60
+
+    #===========================================================================
+    # __init__
+    #===========================================================================
+    def __init__(self, vigencia=VIGENCIA):
+        'Constructor'
+        self.vigencia = vigencia
+        self.__valores = None
+        self.__vence = 0
+        self.__lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    #===========================================================================
+    # get
+    #===========================================================================
+    def get(self, key, default_value=None):
+        '''
+        Obtiene un parametro de configuracion.
+
+        Parametros
+        ------------------
+        @param key: Clave del parametro
+        @param default_value: Valor devuelto si el parametro no existe
+
+        Retorna
+        -----------
+        @return: Valor del parametro (cadena) o default_value
+        '''
+        return self.__cargar().get(key, default_value)
+
+    #===========================================================================
+    # get_int
+    #===========================================================================
+    def get_int(self, key, default_value=None):
+        '''
+        Obtiene un parametro de configuracion numerico. Si el valor almacenado
+        no es un numero valido se devuelve default_value.
+        '''
+        value = self.get(key, default_value)
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            logger.warning("Parametro de configuracion '%s' invalido: %s" %
+                           (key, value))
+            return default_value
+
+    #===========================================================================
+    # invalidar
+    #===========================================================================
+    def invalidar(self):
+        '''Descarta los valores en memoria. La proxima consulta relee la
+        tabla Settings'''
+        with self.__lock:
+            self.__valores = None
+
+    #===========================================================================
+    # estadisticas
+    #===========================================================================
+    def estadisticas(self):
+        '''Devuelve un diccionario con los contadores hits y misses'''
+        return {'hits': self.hits, 'misses': self.misses}
+
+    #===========================================================================
+    # __cargar
+    #===========================================================================
+    def __cargar(self):
+        'Devuelve el diccionario de parametros, leyendolo si hace falta'
+        with self.__lock:
+            valores = self.__valores
+            if valores is None or time.time() >= self.__vence:
+                self.misses += 1
+                valores = dict(Settings.objects.values_list('key', 'value'))
+                self.__valores = valores
+                self.__vence = time.time() + self.vigencia
+                logger.debug("Configuracion cargada: %s" % valores)
+            else:
+                self.hits += 1
+            return valores
+
+# instancia compartida por todo el proceso
+configuracion = Configuracion()
@@ -0,0 +1,359 @@
+# coding=utf-8
+'''
+Clientes del directorio externo de afiliados de la obra social
+Created on 18/10/2026
+
+@author: romeroy
+'''
+import httplib
+import json
+import logging
+import Queue
+import socket
+import threading
+import time
+import urllib
+import urlparse
+
+from django.conf import settings
+from django.utils.module_loading import import_by_path
+
+logger = logging.getLogger(__name__)
+
+# campos de cada afiliado devuelto por el directorio
+CAMPOS_AFILIADO = ('numero', 'dni', 'nombre', 'apellido')
+
+#===============================================================================
+# DirectorioAfiliados
+#===============================================================================
+class DirectorioAfiliados(object):
+    '''
+    Interfaz de los clientes del directorio externo de afiliados. Esta
+    implementacion no consulta ningun sistema externo y se usa cuando no
+    hay un directorio configurado.
+    '''
+    #===========================================================================
+    # buscar
+    #===========================================================================
+    def buscar(self, parametro, valor):
+        '''
+        Busca afiliados en el directorio externo.
+
+        Parametros
+        ------------------
+        @param parametro: 'numero' o 'dni'
+        @param valor: Valor buscado
+
+        Retorna
+        -----------
+        @return: Lista de diccionarios con las claves CAMPOS_AFILIADO (vacia
+                 si no hay afiliados) o None si no se pudo consultar
+        '''
+        return None
+
+    #===========================================================================
+    # cerrar
+    #===========================================================================
+    def cerrar(self):
+        'Libera las conexiones abiertas'
+
+    #===========================================================================
+    # estadisticas
+    #===========================================================================
+    def estadisticas(self):
+        'Devuelve un diccionario con los contadores de uso del cliente'
+        return {}
+
+#===============================================================================
+# Interruptor
+#===============================================================================
+class Interruptor(object):
+    '''
+    Interruptor de circuito (circuit breaker) compartido entre hilos.
+    Despues de una cantidad de fallas seguidas se abre y rechaza las
+    consultas durante unos segundos; luego deja pasar una sola consulta de
+    prueba: si tiene exito se cierra y si falla vuelve a abrirse.
+
+    Atributos
+    -----------------
+    fallas -- Cantidad de fallas seguidas que abren el circuito
+    espera -- Segundos que el circuito queda abierto
+    '''
+    CERRADO = 'cerrado'
+    ABIERTO = 'abierto'
+    SEMIABIERTO = 'semiabierto'
+
+    #===========================================================================
+    # __init__
+    #===========================================================================
+    def __init__(self, fallas=5, espera=30):
+        'Constructor'
+        self.fallas = fallas
+        self.espera = espera
+        self.estado = self.CERRADO
+        self.__seguidas = 0
+        self.__hasta = 0
+        self.__lock = threading.Lock()
+
+    #===========================================================================
+    # permitir
+    #===========================================================================
+    def permitir(self):
+        '''Indica si se puede hacer una consulta. Con el circuito abierto solo
+        se permite la consulta de prueba cuando termina la espera'''
+        with self.__lock:
+            if self.estado == self.CERRADO:
+                return True
+            if self.estado == self.ABIERTO and time.time() >= self.__hasta:
+                self.estado = self.SEMIABIERTO
+                return True
+            return False
+
+    #===========================================================================
+    # exito
+    #===========================================================================
+    def exito(self):
+        'Registra una consulta exitosa y cierra el circuito'
+        with self.__lock:
+            self.__seguidas = 0
+            self.estado = self.CERRADO
+
+    #===========================================================================
+    # falla
+    #===========================================================================
+    def falla(self):
+        '''Registra una consulta fallida. Abre el circuito si falla la
+        consulta de prueba o si se alcanzo la cantidad de fallas seguidas'''
+        with self.__lock:
+            self.__seguidas += 1
+            if self.estado == self.SEMIABIERTO or self.__seguidas >= self.fallas:
+                if self.estado != self.ABIERTO:
+                    logger.warning("Directorio de afiliados: circuito abierto "
+                                   "por %s segundos" % self.espera)
+                self.estado = self.ABIERTO
+                self.__hasta = time.time() + self.espera
+
+#===============================================================================
+# ClienteHTTP
+#===============================================================================
+class ClienteHTTP(DirectorioAfiliados):
+    '''
+    Cliente HTTP del directorio de afiliados. Consulta GET <url>?numero=<valor>
+    (o ?dni=<valor>) y espera una lista JSON de afiliados; un 404 equivale a
+    una lista vacia.
+
+    Cada consulta tiene un plazo de 'timeout' segundos en total: cada
+    operacion de red espera solo lo que queda del plazo y si una conexion
+    del pool estaba cerrada se reintenta con una nueva solo si queda tiempo.
+
+    Las conexiones se reutilizan (keep-alive) desde un pool. Como mucho se
+    hacen 'conexiones' consultas a la vez: si no hay lugar, o el circuito
+    esta abierto, buscar() devuelve None enseguida para que se use la base
+    local en lugar de esperar al sistema externo.
+
+    Atributos
+    -----------------
+    timeout -- Segundos de espera de cada consulta, incluido el reintento
+    consultas -- Cantidad de consultas hechas al directorio
+    errores -- Cantidad de consultas fallidas (error, timeout o respuesta
+               invalida)
+    rechazadas -- Cantidad de busquedas no enviadas por falta de lugar o
+                  por el circuito abierto
+    '''
+    #===========================================================================
+    # __init__
+    #===========================================================================
+    def __init__(self, url, timeout=0.5, conexiones=4, fallas=5, espera=30):
+        '''
+        Constructor
+
+        Parametros
+        ------------------
+        @param url: Url del recurso de afiliados (http o https)
+        @param timeout: Segundos de espera de cada consulta
+        @param conexiones: Cantidad maxima de consultas simultaneas
+        @param fallas: Fallas seguidas que abren el circuito
+        @param espera: Segundos que el circuito queda abierto
+        '''
+        partes = urlparse.urlsplit(url)
+        self.__clase = (httplib.HTTPSConnection if partes.scheme == 'https'
+                        else httplib.HTTPConnection)
+        self.__host = partes.netloc
+        self.__ruta = partes.path or '/'
+        self.timeout = timeout
+        self.interruptor = Interruptor(fallas, espera)
+        self.__cupo = threading.BoundedSemaphore(conexiones)
+        self.__libres = Queue.LifoQueue()
+        self.__lock = threading.Lock()
+        self.consultas = 0
+        self.errores = 0
+        self.rechazadas = 0
+
+    #===========================================================================
+    # buscar
+    #===========================================================================
+    def buscar(self, parametro, valor):
+        if not self.__cupo.acquire(False):
+            self.__contar('rechazadas')
+            return None
+        try:
+            if not self.interruptor.permitir():
+                self.__contar('rechazadas')
+                return None
+            self.__contar('consultas')
+            try:
+                afiliados = self.__consultar(parametro, valor)
+            except (socket.error, httplib.HTTPException, ValueError,
+                    KeyError, TypeError), e:
+                self.__contar('errores')
+                self.interruptor.falla()
+                logger.warning("Error consultando el directorio de afiliados "
+                               "%s=%s: %r" % (parametro, valor, e))
+                return None
+            self.interruptor.exito()
+            return afiliados
+        finally:
+            self.__cupo.release()
+
+    #===========================================================================
+    # cerrar
+    #===========================================================================
+    def cerrar(self):
+        while True:
+            try:
+                self.__libres.get_nowait().close()
+            except Queue.Empty:
+                return
+
+    #===========================================================================
+    # estadisticas
+    #===========================================================================
+    def estadisticas(self):
+        return {'consultas': self.consultas,
+                'errores': self.errores,
+                'rechazadas': self.rechazadas,
+                'circuito': self.interruptor.estado}
+
+    #===========================================================================
+    # __consultar
+    #===========================================================================
+    def __consultar(self, parametro, valor):
+        'Hace la consulta HTTP con una conexion del pool'
+        url = '%s?%s' % (self.__ruta, urllib.urlencode({parametro: valor}))
+        limite = time.time() + self.timeout
+        try:
+            conexion = self.__libres.get_nowait()
+        except Queue.Empty:
+            conexion, respuesta, cuerpo = self.__pedir(None, url, limite)
+        else:
+            try:
+                conexion, respuesta, cuerpo = self.__pedir(conexion, url, limite)
+            except (httplib.BadStatusLine, socket.error), e:
+                if isinstance(e, socket.timeout):
+                    raise
+                # el servidor cerro la conexion mientras estaba en el pool,
+                # se reintenta con el tiempo que queda del plazo
+                conexion, respuesta, cuerpo = self.__pedir(None, url, limite)
+        if respuesta.will_close:
+            conexion.close()
+        else:
+            self.__libres.put(conexion)
+        if respuesta.status == httplib.NOT_FOUND:
+            return []
+        if respuesta.status != httplib.OK:
+            raise httplib.HTTPException("Respuesta %s del directorio" %
+                                        respuesta.status)
+        return [dict((campo, item[campo]) for campo in CAMPOS_AFILIADO)
+                for item in json.loads(cuerpo)]
+
+    #===========================================================================
+    # __pedir
+    #===========================================================================
+    def __pedir(self, conexion, url, limite):
+        '''Envia el pedido por la conexion (una nueva si es None) y lee la
+        respuesta antes del limite (time.time()). Si hay un error cierra la
+        conexion'''
+        restante = self.__restante(limite)
+        if conexion is None:
+            conexion = self.__clase(self.__host, timeout=restante)
+        try:
+            self.__esperar(conexion, restante)
+            conexion.request('GET', url, headers={'Accept': 'application/json'})
+            respuesta = conexion.getresponse()
+            self.__esperar(conexion, self.__restante(limite))
+            return conexion, respuesta, respuesta.read()
+        except:
+            conexion.close()
+            raise
+
+    #===========================================================================
+    # __restante / __esperar
+    #===========================================================================
+    def __restante(self, limite):
+        'Segundos que quedan hasta el limite. Si no queda tiempo lanza socket.timeout'
+        restante = limite - time.time()
+        if restante <= 0:
+            raise socket.timeout("Se agoto el plazo de la consulta")
+        return restante
+
+    def __esperar(self, conexion, segundos):
+        'Limita la espera de las operaciones de red de la conexion'
+        conexion.timeout = segundos
+        if conexion.sock is not None:
+            conexion.sock.settimeout(segundos)
+
+    #===========================================================================
+    # __contar
+    #===========================================================================
+    def __contar(self, contador):
+        'Incrementa un contador de uso'
+        with self.__lock:
+            setattr(self, contador, getattr(self, contador) + 1)
+
+#===============================================================================
+# crear
+#===============================================================================
+def crear(opciones=None):
+    '''
+    Crea el cliente del directorio a partir de las opciones, por defecto las
+    de settings.DIRECTORIO_AFILIADOS. Sin opciones devuelve un
+    DirectorioAfiliados que no consulta ningun sistema externo. Ejemplo:
+
+        DIRECTORIO_AFILIADOS = {'URL': 'http://padron/afiliados/',
+                                'TIMEOUT': 0.5, 'CONEXIONES': 4,
+                                'FALLAS': 5, 'ESPERA': 30}
+
+    La clave CLIENTE permite usar otra clase (ruta completa); el resto de
+    las claves se pasan en minusculas a su constructor.
+    '''
+    if opciones is None:
+        opciones = getattr(settings, 'DIRECTORIO_AFILIADOS', None)
+    if not opciones:
+        return DirectorioAfiliados()
+    opciones = dict(opciones)
+    clase = import_by_path(opciones.pop('CLIENTE',
+                                        'turnos.negocio.directorio.ClienteHTTP'))
+    return clase(**dict((clave.lower(), valor)
+                        for clave, valor in opciones.items()))
+
+#===============================================================================
+# obtener / configurar
+#===============================================================================
+_directorio = None
+_lock = threading.Lock()
+
+def obtener():
+    'Devuelve el cliente del directorio compartido por todo el proceso'
+    global _directorio
+    with _lock:
+        if _directorio is None:
+            _directorio = crear()
+        return _directorio
+
+def configurar(directorio):
+    '''Reemplaza el cliente compartido (None para volver a crearlo desde
+    settings) y devuelve el anterior'''
+    global _directorio
+    with _lock:
+        anterior, _directorio = _directorio, directorio
+        return anterior
@@ -0,0 +1,258 @@
+# coding=utf-8
+'''
+Este modulo mantiene el registro de faltas de los afiliados
+(modelo models.Falta)
+Created on 18/10/2026
+
+@author: romeroy
+'''
+import logging
+
+from django.db import transaction
+from django.db.models import Count
+
+from turnos.models import Turno, LineaDeReserva, Falta
+
+logger = logging.getLogger(__name__)
+
+#===============================================================================
+# RegistroFaltas
+#===============================================================================
+class RegistroFaltas(object):
+    '''
+    Mantiene la tabla Falta, que guarda una fila por cada linea de reserva
+    con estado AUSENTE junto con el afiliado y la fecha de su reserva. Las
+    faltas de un afiliado en los ultimos meses se cuentan sobre el indice
+    (afiliado, fecha) de esa tabla, sin recorrer las lineas de reserva.
+
+    La tabla se actualiza desde turnos.signals cuando se guarda con save()
+    una linea que pasa a AUSENTE o deja de estarlo, o una reserva que cambia
+    de afiliado o de fecha. Los cambios de estado en lote deben hacerse con
+    actualizar_lineas(); las lineas creadas con bulk_create estan siempre
+    RESERVADAS. reconstruir() vuelve a generar la tabla (lo hace
+    migrar_esquema) y verificar() la compara con las lineas de reserva.
+
+    Mientras la tabla no se genero (una base existente la empieza vacia)
+    las faltas se cuentan sobre las lineas de reserva.
+    '''
+    TAMANO_LOTE = 500
+    # atributo donde se recuerdan los datos de la linea o reserva al leerla
+    ATRIBUTO = '_faltas_anterior'
+
+    #===========================================================================
+    # __init__
+    #===========================================================================
+    def __init__(self):
+        'Constructor'
+        self.__generada = False
+
+    #===========================================================================
+    # generada
+    #===========================================================================
+    def generada(self):
+        '''Indica si la tabla esta generada: tiene faltas o no hay lineas
+        AUSENTES. Una vez generada no se vuelve a consultar'''
+        if not self.__generada:
+            self.__generada = (Falta.objects.exists() or not
+                               LineaDeReserva.objects.filter(estado=Turno.AUSENTE)
+                               .exists())
+            if not self.__generada:
+                logger.warning("Registro de faltas sin generar, ejecute "
+                               "migrar_esquema o reconstruir_faltas")
+        return self.__generada
+
+    #===========================================================================
+    # limpiar
+    #===========================================================================
+    def limpiar(self):
+        'Olvida si la tabla estaba generada'
+        self.__generada = False
+
+    #===========================================================================
+    # registrar
+    #===========================================================================
+    def registrar(self, instancia):
+        '''Recuerda el estado de una linea o el afiliado y la fecha de una
+        reserva (post_init)'''
+        setattr(instancia, self.ATRIBUTO, self.__datos(instancia))
+
+    #===========================================================================
+    # linea_guardada
+    #===========================================================================
+    def linea_guardada(self, linea, creada):
+        '''
+        Agrega o quita la falta de una linea de reserva guardada (post_save)
+        si cambio de estado desde o hacia AUSENTE.
+        '''
+        anterior = None if creada else getattr(linea, self.ATRIBUTO, None)
+        self.registrar(linea)
+        if anterior == linea.estado:
+            return
+        if linea.estado == Turno.AUSENTE:
+            Falta.objects.get_or_create(linea=linea,
+                                        defaults={'afiliado_id': linea.reserva.afiliado_id,
+                                                  'fecha': linea.reserva.fecha})
+        elif anterior == Turno.AUSENTE or (anterior is None and not creada):
+            Falta.objects.filter(linea__id=linea.id).delete()
+
+    #===========================================================================
+    # reserva_guardada
+    #===========================================================================
+    def reserva_guardada(self, reserva, creada):
+        '''
+        Actualiza las faltas de las lineas de una reserva guardada
+        (post_save) si cambio su afiliado o su fecha.
+        '''
+        anterior = None if creada else getattr(reserva, self.ATRIBUTO, None)
+        self.registrar(reserva)
+        if creada or anterior == self.__datos(reserva):
+            return
+        Falta.objects.filter(linea__reserva__id=reserva.id).update(
+                                            afiliado=reserva.afiliado_id,
+                                            fecha=reserva.fecha)
+
+    #===========================================================================
+    # contar
+    #===========================================================================
+    def contar(self, afiliado_id, desde):
+        '''
+        Devuelve la cantidad de faltas de un afiliado en reservas hechas
+        desde la fecha indicada.
+        '''
+        if not self.generada():
+            return (LineaDeReserva.objects.filter(estado=Turno.AUSENTE,
+                                                  reserva__afiliado__id=afiliado_id,
+                                                  reserva__fecha__gte=desde)
+                    .count())
+        return Falta.objects.filter(afiliado__id=afiliado_id,
+                                    fecha__gte=desde).count()
+
+    #===========================================================================
+    # contar_afiliados
+    #===========================================================================
+    def contar_afiliados(self, afiliados_id, desde):
+        '''
+        Devuelve la cantidad de faltas de varios afiliados en reservas hechas
+        desde la fecha indicada, con una consulta agrupada por afiliado cada
+        TAMANO_LOTE afiliados.
+
+        Retorna
+        -----------
+        @return: Diccionario {afiliado_id: cantidad de faltas}. Los afiliados
+                 sin faltas no se incluyen
+        '''
+        afiliados_id = list(afiliados_id)
+        cantidades = {}
+        generada = self.generada()
+        for inicio in range(0, len(afiliados_id), self.TAMANO_LOTE):
+            lote = afiliados_id[inicio:inicio + self.TAMANO_LOTE]
+            if generada:
+                grupos = (Falta.objects.filter(afiliado__id__in=lote,
+                                               fecha__gte=desde)
+                          .values_list('afiliado'))
+            else:
+                grupos = (LineaDeReserva.objects.filter(estado=Turno.AUSENTE,
+                                                        reserva__afiliado__id__in=lote,
+                                                        reserva__fecha__gte=desde)
+                          .values_list('reserva__afiliado'))
+            cantidades.update(grupos.annotate(cantidad=Count('id')).order_by())
+        return cantidades
+
+    #===========================================================================
+    # actualizar_lineas
+    #===========================================================================
+    def actualizar_lineas(self, lineas, estado):
+        '''
+        Cambia con update() el estado de las lineas de reserva de un queryset
+        y agrega o quita sus faltas.
+
+        Retorna
+        -----------
+        @return: Cantidad de lineas actualizadas
+        '''
+        if estado == Turno.AUSENTE:
+            nuevas = list(lineas.filter(falta__isnull=True)
+                          .values_list('id', 'reserva__afiliado', 'reserva__fecha'))
+            cantidad = lineas.update(estado=estado)
+            Falta.objects.bulk_create([Falta(linea_id=linea_id,
+                                             afiliado_id=afiliado_id, fecha=fecha)
+                                       for linea_id, afiliado_id, fecha in nuevas],
+                                      batch_size=self.TAMANO_LOTE)
+            return cantidad
+        ids = list(lineas.filter(falta__isnull=False).values_list('id', flat=True))
+        cantidad = lineas.update(estado=estado)
+        for inicio in range(0, len(ids), self.TAMANO_LOTE):
+            Falta.objects.filter(linea__id__in=ids[inicio:inicio + self.TAMANO_LOTE]).delete()
+        return cantidad
+
+    #===========================================================================
+    # reconstruir
+    #===========================================================================
+    @transaction.atomic
+    def reconstruir(self):
+        '''
+        Vuelve a generar la tabla completa a partir de las lineas de reserva.
+
+        Retorna
+        -----------
+        @return: Cantidad de faltas generadas
+        '''
+        Falta.objects.all().delete()
+        filas = [Falta(linea_id=linea_id, afiliado_id=afiliado_id, fecha=fecha)
+                 for linea_id, (afiliado_id, fecha) in self.calcular().items()]
+        Falta.objects.bulk_create(filas, batch_size=self.TAMANO_LOTE)
+        self.__generada = True
+        logger.info("Registro de faltas reconstruido: %s faltas" % len(filas))
+        return len(filas)
+
+    #===========================================================================
+    # verificar
+    #===========================================================================
+    def verificar(self):
+        '''
+        Compara la tabla con las lineas de reserva con estado AUSENTE.
+
+        Retorna
+        -----------
+        @return: Lista ordenada de ids de los afiliados con faltas que
+                 difieren
+        '''
+        esperado = self.calcular()
+        actual = dict((linea_id, (afiliado_id, fecha)) for linea_id, afiliado_id, fecha
+                      in Falta.objects.values_list('linea', 'afiliado', 'fecha'))
+        afiliados = set()
+        for linea_id in set(esperado) | set(actual):
+            if esperado.get(linea_id) != actual.get(linea_id):
+                afiliados.update(datos[0] for datos in (esperado.get(linea_id),
+                                                        actual.get(linea_id))
+                                 if datos is not None)
+        return sorted(afiliados)
+
+    #===========================================================================
+    # calcular
+    #===========================================================================
+    def calcular(self):
+        '''
+        Lee las lineas de reserva con estado AUSENTE.
+
+        Retorna
+        -----------
+        @return: Diccionario {linea_id: (afiliado_id, fecha de la reserva)}
+        '''
+        lineas = (LineaDeReserva.objects.filter(estado=Turno.AUSENTE)
+                  .values_list('id', 'reserva__afiliado', 'reserva__fecha'))
+        return dict((linea_id, (afiliado_id, fecha))
+                    for linea_id, afiliado_id, fecha in lineas)
+
+    #===========================================================================
+    # __datos
+    #===========================================================================
+    def __datos(self, instancia):
+        '''Datos que afectan a las faltas: el estado de una linea o
+        (afiliado, fecha) de una reserva'''
+        if isinstance(instancia, LineaDeReserva):
+            return instancia.estado
+        return (instancia.afiliado_id, instancia.fecha)
+
+# instancia compartida por todo el proceso
+faltas = RegistroFaltas()
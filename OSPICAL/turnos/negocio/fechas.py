@@ -0,0 +1,105 @@
+# coding=utf-8
+'''
+Funciones auxiliares para filtrar turnos por fecha y hora
+Created on 18/10/2026
+
+@author: romeroy
+'''
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+
+#===============================================================================
+# dia_local
+#===============================================================================
+def dia_local(dia):
+    '''
+    Devuelve la fecha (date) de un dia expresado como date o datetime. Los
+    datetime con zona horaria se convierten antes a la zona horaria actual.
+    '''
+    if isinstance(dia, datetime):
+        if timezone.is_aware(dia):
+            dia = timezone.localtime(dia)
+        dia = dia.date()
+    return dia
+
+#===============================================================================
+# rango_dia
+#===============================================================================
+def rango_dia(dia):
+    '''
+    Devuelve el rango semiabierto [desde, hasta) que ocupa un dia en la zona
+    horaria actual.
+
+    Filtrar con fecha__gte=desde y fecha__lt=hasta es equivalente a filtrar
+    por fecha__day, fecha__month y fecha__year, pero la base de datos puede
+    resolverlo con un indice en lugar de extraer el dia de cada fila.
+
+    Parametros
+    ------------------
+    @param dia: date o datetime del dia buscado
+
+    Retorna
+    -----------
+    @return: Tupla (desde, hasta) de datetimes con zona horaria
+    '''
+    dia = dia_local(dia)
+    tz = timezone.get_current_timezone()
+    desde = timezone.make_aware(datetime.combine(dia, time.min), tz)
+    hasta = timezone.make_aware(datetime.combine(dia + timedelta(days=1),
+                                                 time.min), tz)
+    return desde, hasta
+
+#===============================================================================
+# filtro_dia
+#===============================================================================
+def filtro_dia(campo, dia):
+    '''
+    Devuelve un diccionario de filtros para buscar los registros cuyo campo
+    (por ejemplo 'fecha' o 'turno__fecha') corresponde al dia indicado.
+    '''
+    desde, hasta = rango_dia(dia)
+    return {'%s__gte' % campo: desde, '%s__lt' % campo: hasta}
+
+#===============================================================================
+# extra_horario
+#===============================================================================
+def extra_horario(modelo, campo, hora_desde=None, hora_hasta=None):
+    '''
+    Devuelve los argumentos de QuerySet.extra() que filtran los registros
+    cuyo campo datetime tiene, en la zona horaria actual, una hora dentro de
+    [hora_desde, hora_hasta). La hora se compara en la base de datos; los
+    filtros fecha__hour solo comparan por igualdad.
+
+    Parametros
+    ------------------
+    @param modelo: Modelo del queryset (el campo debe ser de su tabla)
+    @param campo: Nombre del campo datetime
+    @param hora_desde: time desde el cual filtrar o None
+    @param hora_hasta: time hasta el cual (exclusive) filtrar o None
+
+    Retorna
+    -----------
+    @return: Diccionario con las claves where y params
+    '''
+    qn = connection.ops.quote_name
+    columna = "%s.%s" % (qn(modelo._meta.db_table),
+                         qn(modelo._meta.get_field(campo).column))
+    tzname = timezone.get_current_timezone_name() if settings.USE_TZ else None
+    sql, params = [], []
+    for parte in ('hour', 'minute', 'second'):
+        parte_sql, parte_params = connection.ops.datetime_extract_sql(
+                                                        parte, columna, tzname)
+        sql.append("(%s)" % parte_sql)
+        params.extend(parte_params)
+    segundos = "%s * 3600 + %s * 60 + %s" % tuple(sql)
+    where = []
+    parametros = []
+    for hora, operador in ((hora_desde, '>='), (hora_hasta, '<')):
+        if hora is not None:
+            where.append("%s %s %%s" % (segundos, operador))
+            parametros.extend(params + [hora.hour * 3600 + hora.minute * 60 +
+                                        hora.second])
+    return {'where': where, 'params': parametros}
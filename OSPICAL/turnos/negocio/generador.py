@@ -0,0 +1,213 @@
+# coding=utf-8
+'''
+Este modulo agrupa la generacion masiva de turnos a partir de las
+disponibilidades de los especialistas
+Created on 18/10/2026
+
+@author: romeroy
+'''
+from datetime import datetime, timedelta
+import logging
+
+from django.db import transaction, IntegrityError
+from django.utils import timezone
+
+from turnos.models import Turno, Disponibilidad
+from turnos.signals import turnos_modificados
+
+logger = logging.getLogger(__name__)
+
+#===============================================================================
+# GeneradorTurnos
+#===============================================================================
+class GeneradorTurnos(object):
+    '''
+    Genera los turnos de todos los especialistas en un rango de fechas.
+
+    Los turnos candidatos se calculan en memoria a partir de las
+    disponibilidades (que se leen una sola vez), se descartan los que ya
+    existen en la base de datos con una consulta por especialista y los
+    restantes se insertan con bulk_create en lotes. Los turnos que otro
+    proceso haya creado mientras tanto se ignoran gracias a la restriccion
+    unica (fecha, ee, sobreturno), por lo que generar dos veces el mismo
+    rango no crea repetidos. Al final los turnos creados se informan con la
+    señal turnos_modificados (resumen diario e indice de disponibilidad).
+
+    Atributos
+    -----------------
+    tamano_lote -- Cantidad maxima de turnos insertados por sentencia
+    '''
+    TAMANO_LOTE = 500
+
+    #===========================================================================
+    # __init__
+    #===========================================================================
+    def __init__(self, tamano_lote=TAMANO_LOTE):
+        'Constructor'
+        self.tamano_lote = tamano_lote
+
+    #===========================================================================
+    # generar
+    #===========================================================================
+    def generar(self, fecha_inicio, fecha_fin):
+        '''
+        Crea los turnos de todos los especialistas entre fecha_inicio
+        (inclusive) y fecha_fin (exclusive).
+
+        Retorna
+        -----------
+        @return: Lista de turnos creados (con su id) ordenada por fecha
+        '''
+        candidatos = self.calcular(fecha_inicio, fecha_fin)
+        return self.guardar(candidatos)
+
+    #===========================================================================
+    # calcular
+    #===========================================================================
+    def calcular(self, fecha_inicio, fecha_fin):
+        '''
+        Calcula en memoria los turnos que corresponden a cada disponibilidad
+        en el rango de fechas. No accede a la base de datos salvo para leer
+        las disponibilidades.
+
+        Retorna
+        -----------
+        @return: Lista de turnos (sin guardar)
+        '''
+        # agrupo las disponibilidades por dia de la semana
+        disponibilidades = {}
+        for disponibilidad in (Disponibilidad.objects
+                               .select_related('ee', 'consultorio')):
+            (disponibilidades.setdefault(int(disponibilidad.dia), [])
+                             .append(disponibilidad))
+        candidatos = []
+        fecha = fecha_inicio
+        while fecha < fecha_fin:
+            for disponibilidad in disponibilidades.get(fecha.weekday(), ()):
+                candidatos += self.__turnos_del_dia(disponibilidad, fecha)
+            fecha += timedelta(days=1)
+        return candidatos
+
+    #===========================================================================
+    # guardar
+    #===========================================================================
+    def guardar(self, turnos):
+        '''
+        Guarda los turnos que no existan en la base de datos.
+
+        Parametros
+        ------------------
+        @param turnos: Iterable de turnos sin guardar
+
+        Retorna
+        -----------
+        @return: Lista de turnos efectivamente creados (con su id) ordenada
+                 por fecha
+        '''
+        # agrupo los turnos por especialista descartando repetidos
+        por_ee = {}
+        for turno in turnos:
+            por_ee.setdefault(turno.ee_id, {}).setdefault(self.clave(turno),
+                                                          turno)
+        creados = []
+        for ee_id, candidatos in por_ee.items():
+            creados += self.__guardar_del_especialista(ee_id, candidatos)
+        creados.sort(key=lambda turno: turno.fecha)
+        turnos_modificados.send(sender=Turno, turnos=creados)
+        logger.debug("Turnos creados: %s" % len(creados))
+        return creados
+
+    #===========================================================================
+    # clave
+    #===========================================================================
+    @staticmethod
+    def clave(turno):
+        'Devuelve la clave que identifica a un turno (fecha, ee, sobreturno)'
+        return (turno.fecha, turno.ee_id, turno.sobreturno)
+
+    #===========================================================================
+    # __guardar_del_especialista
+    #===========================================================================
+    def __guardar_del_especialista(self, ee_id, candidatos):
+        '''
+        Inserta los turnos candidatos de un especialista que no existan.
+        Devuelve los turnos creados con sus id, que se leen de la base de
+        datos porque bulk_create no los completa
+        '''
+        fechas = [clave[0] for clave in candidatos]
+        rango = (min(fechas), max(fechas))
+        existentes = set(Turno.objects
+                         .filter(ee__id=ee_id, fecha__range=rango)
+                         .values_list('fecha', 'ee', 'sobreturno'))
+        nuevos = [turno for clave, turno in candidatos.items()
+                  if clave not in existentes]
+        if not nuevos:
+            return []
+        nuevos = self.__insertar(nuevos)
+        if not nuevos:
+            return []
+        # leo los id de los turnos insertados y se los asigno
+        ids = dict(((fecha, ee, sobreturno), pk) for pk, fecha, ee, sobreturno
+                   in (Turno.objects.filter(ee__id=ee_id, fecha__range=rango)
+                       .values_list('id', 'fecha', 'ee', 'sobreturno')))
+        for turno in nuevos:
+            turno.id = ids[self.clave(turno)]
+            turno._state.adding = False
+            turno._state.db = Turno.objects.db
+        return nuevos
+
+    #===========================================================================
+    # __insertar
+    #===========================================================================
+    def __insertar(self, turnos):
+        '''
+        Inserta los turnos en lotes ignorando los que ya existan. Si un lote
+        viola la restriccion unica (otro proceso creo alguno de sus turnos
+        despues de la lectura de existentes) se insertan sus turnos de a uno,
+        descartando los repetidos.
+
+        Retorna
+        -----------
+        @return: Lista de turnos efectivamente insertados
+        '''
+        insertados = []
+        for i in range(0, len(turnos), self.tamano_lote):
+            lote = turnos[i:i + self.tamano_lote]
+            try:
+                with transaction.atomic():
+                    Turno.objects.bulk_create(lote)
+                insertados += lote
+            except IntegrityError:
+                logger.warning("Turnos repetidos en el lote, insertando de a uno")
+                for turno in lote:
+                    try:
+                        with transaction.atomic():
+                            Turno.objects.bulk_create([turno])
+                        insertados.append(turno)
+                    except IntegrityError:
+                        logger.debug("Turno repetido ignorado: %s" %
+                                     (self.clave(turno),))
+        return insertados
+
+    #===========================================================================
+    # __turnos_del_dia
+    #===========================================================================
+    def __turnos_del_dia(self, disponibilidad, dia):
+        '''
+        Calcula los turnos de una disponibilidad en un dia determinado
+        '''
+        # configuro la zona horaria
+        tz = timezone.get_default_timezone()
+        # configuro la hora que empezara y dejara de atender el especialista
+        desde = tz.localize(datetime.combine(dia, disponibilidad.horaDesde))
+        hasta = tz.localize(datetime.combine(dia, disponibilidad.horaHasta))
+        frecuencia = timedelta(minutes=disponibilidad.ee.frecuencia_turnos)
+        turnos = []
+        while desde < hasta:
+            turnos.append(Turno(fecha=desde,
+                                estado=Turno.DISPONIBLE,
+                                sobreturno=False,
+                                consultorio=disponibilidad.consultorio,
+                                ee=disponibilidad.ee))
+            desde += frecuencia
+        return turnos
@@ -0,0 +1,379 @@
+# coding=utf-8
+'''
+Indice en memoria de los turnos disponibles de cada especialista por dia
+Created on 18/10/2026
+
+@author: romeroy
+'''
+from array import array
+from datetime import datetime, timedelta
+import logging
+import sys
+import threading
+
+from django.utils import timezone
+
+from turnos.models import Turno, Disponibilidad, EspecialistaEspecialidad
+from cache import CacheLRU
+from fechas import dia_local, filtro_dia
+
+logger = logging.getLogger(__name__)
+
+#===============================================================================
+# Grilla
+#===============================================================================
+class Grilla(object):
+    '''
+    Horarios de atencion de un especialista en una especialidad durante un
+    dia. Cada horario tiene una posicion: los conjuntos de horarios se
+    representan como enteros donde el bit i corresponde a la posicion i.
+
+    Atributos
+    -----------------
+    segmentos -- Lista de tuplas (inicio, cantidad de horarios) de cada
+                 disponibilidad del dia
+    frecuencia -- Microsegundos entre dos horarios
+    ids -- array con el id del turno de cada horario (0 si no hay turno)
+    ids_sobreturnos -- Idem para los sobreturnos
+    libres -- Bits de los horarios con turno disponible
+    libres_sobreturnos -- Bits de los horarios con sobreturno disponible
+    sobreturnos -- Bits de los horarios con sobreturno en cualquier estado
+    '''
+    #===========================================================================
+    # __init__
+    #===========================================================================
+    def __init__(self, segmentos, frecuencia):
+        'Constructor'
+        self.segmentos = segmentos
+        self.frecuencia = frecuencia
+        cantidad = sum(horarios for _, horarios in segmentos)
+        self.ids = array('l', [0]) * cantidad
+        self.ids_sobreturnos = array('l', [0]) * cantidad
+        self.libres = 0
+        self.libres_sobreturnos = 0
+        self.sobreturnos = 0
+
+    #===========================================================================
+    # posicion
+    #===========================================================================
+    def posicion(self, fecha):
+        'Devuelve la posicion del horario o None si no esta en la grilla'
+        desplazamiento = 0
+        for inicio, horarios in self.segmentos:
+            diferencia = microsegundos(fecha - inicio)
+            if 0 <= diferencia < self.frecuencia * horarios:
+                if diferencia % self.frecuencia:
+                    return None
+                return desplazamiento + diferencia // self.frecuencia
+            desplazamiento += horarios
+        return None
+
+    #===========================================================================
+    # agregar
+    #===========================================================================
+    def agregar(self, turno_id, fecha, estado, sobreturno):
+        '''Registra un turno. Devuelve False si su horario no esta en la
+        grilla'''
+        posicion = self.posicion(fecha)
+        if posicion is None:
+            return False
+        bit = 1 << posicion
+        if sobreturno:
+            self.ids_sobreturnos[posicion] = turno_id
+            self.sobreturnos |= bit
+            if estado == Turno.DISPONIBLE:
+                self.libres_sobreturnos |= bit
+        else:
+            self.ids[posicion] = turno_id
+            if estado == Turno.DISPONIBLE:
+                self.libres |= bit
+        return True
+
+    #===========================================================================
+    # horario
+    #===========================================================================
+    def horario(self, posicion):
+        'Devuelve la fecha y hora de una posicion'
+        for inicio, horarios in self.segmentos:
+            if posicion < horarios:
+                return inicio + timedelta(microseconds=self.frecuencia *
+                                                       posicion)
+            posicion -= horarios
+
+    #===========================================================================
+    # disponibles
+    #===========================================================================
+    def disponibles(self):
+        'Devuelve una lista de tuplas (fecha, id) de los turnos disponibles'
+        return ([(self.horario(p), self.ids[p]) for p in bits(self.libres)] +
+                [(self.horario(p), self.ids_sobreturnos[p])
+                 for p in bits(self.libres_sobreturnos)])
+
+    #===========================================================================
+    # tamano
+    #===========================================================================
+    def tamano(self):
+        'Estimacion de la memoria ocupada en bytes'
+        return (sys.getsizeof(self.ids) + sys.getsizeof(self.ids_sobreturnos) +
+                sys.getsizeof(self.libres) +
+                sys.getsizeof(self.libres_sobreturnos) +
+                sys.getsizeof(self.sobreturnos) + 64 * len(self.segmentos))
+
+#===============================================================================
+# DiaIndexado
+#===============================================================================
+class DiaIndexado(object):
+    '''
+    Turnos de un especialista en un dia: una grilla por cada especialidad
+    que atiende ese dia.
+    '''
+    #===========================================================================
+    # __init__
+    #===========================================================================
+    def __init__(self, grillas):
+        'Constructor'
+        self.grillas = grillas
+
+    #===========================================================================
+    # libres
+    #===========================================================================
+    def libres(self):
+        'Devuelve los id de los turnos disponibles ordenados por horario'
+        disponibles = []
+        for grilla in self.grillas:
+            disponibles += grilla.disponibles()
+        return [turno_id for _, turno_id in sorted(disponibles)]
+
+    #===========================================================================
+    # hay_libres
+    #===========================================================================
+    def hay_libres(self):
+        'Verifica si queda algun turno disponible'
+        return any(grilla.libres or grilla.libres_sobreturnos
+                   for grilla in self.grillas)
+
+    #===========================================================================
+    # hay_sobreturnos
+    #===========================================================================
+    def hay_sobreturnos(self):
+        'Verifica si el dia tiene sobreturnos (en cualquier estado)'
+        return any(grilla.sobreturnos for grilla in self.grillas)
+
+    #===========================================================================
+    # tamano
+    #===========================================================================
+    def tamano(self):
+        'Estimacion de la memoria ocupada en bytes'
+        return 64 + sum(grilla.tamano() for grilla in self.grillas)
+
+#===============================================================================
+# IndiceDisponibilidad
+#===============================================================================
+class IndiceDisponibilidad(object):
+    '''
+    Responde que turnos estan disponibles en un dia, o cual es el primer
+    dia con turnos disponibles, con operaciones de bits sobre grillas de
+    horarios en memoria en lugar de consultas SQL.
+
+    Cada dia de un especialista se indexa la primera vez que se consulta
+    (una consulta con sus turnos) y se guarda en una CacheLRU con limite de
+    memoria. Los turnos modificados invalidan su dia (ver turnos.signals) y
+    los valores vencen despues de VIGENCIA segundos para acotar el tiempo
+    que tarda en verse un cambio hecho por otro proceso.
+
+    Los dias con turnos que no coinciden con los horarios de las
+    disponibilidades (por ejemplo turnos creados a mano) no se indexan: el
+    indice devuelve None y se debe consultar la base de datos.
+    '''
+    PRESUPUESTO = 4 * 1024 * 1024
+    VIGENCIA = 60
+
+    #===========================================================================
+    # __init__
+    #===========================================================================
+    def __init__(self, presupuesto=PRESUPUESTO, vigencia=VIGENCIA):
+        'Constructor'
+        self.cache = CacheLRU(presupuesto, vigencia)
+        # especialista de cada EspecialistaEspecialidad indexada
+        self.__especialistas = {}
+        # se incrementa con cada invalidacion para no guardar un dia leido
+        # antes de que se modificaran sus turnos
+        self.__version = 0
+        self.__lock = threading.Lock()
+
+    #===========================================================================
+    # dia
+    #===========================================================================
+    def dia(self, especialista_id, fecha):
+        '''
+        Devuelve los turnos de un especialista en un dia.
+
+        Parametros
+        ------------------
+        @param especialista_id: Id del especialista
+        @param fecha: date o datetime del dia
+
+        Retorna
+        -----------
+        @return: DiaIndexado, o None si el dia no se puede indexar
+        '''
+        especialista_id = int(especialista_id)
+        fecha = dia_local(fecha)
+        clave = ('dia', especialista_id, fecha)
+        indexado = self.cache.get(clave, False)
+        if indexado is not False:
+            return indexado
+        version = self.__version
+        indexado = self.__indexar(especialista_id, fecha)
+        with self.__lock:
+            if version == self.__version:
+                self.cache.put(clave, indexado,
+                               indexado.tamano() if indexado else 64)
+        return indexado
+
+    #===========================================================================
+    # primer_dia_libre
+    #===========================================================================
+    def primer_dia_libre(self, especialista_id, desde, dias):
+        '''
+        Busca el primer dia con turnos disponibles de un especialista.
+
+        Parametros
+        ------------------
+        @param especialista_id: Id del especialista
+        @param desde: date o datetime del primer dia a revisar
+        @param dias: Cantidad de dias a revisar
+
+        Retorna
+        -----------
+        @return: date del primer dia con turnos disponibles o None
+        '''
+        desde = dia_local(desde)
+        for numero in range(dias):
+            fecha = desde + timedelta(days=numero)
+            indexado = self.dia(especialista_id, fecha)
+            if indexado is None:
+                libre = (Turno.objects
+                         .filter(ee__especialista__id=especialista_id,
+                                 estado=Turno.DISPONIBLE,
+                                 **filtro_dia('fecha', fecha))
+                         .exists())
+            else:
+                libre = indexado.hay_libres()
+            if libre:
+                return fecha
+        return None
+
+    #===========================================================================
+    # invalidar
+    #===========================================================================
+    def invalidar(self, turnos):
+        '''Descarta los dias indexados de los turnos modificados. El
+        especialista de las EspecialistaEspecialidad sin disponibilidades
+        (que no se leyeron con la agenda) se obtiene con una consulta'''
+        turnos = list(turnos)
+        faltantes = set(turno.ee_id for turno in turnos
+                        if turno.ee_id not in self.__especialistas)
+        resueltos = []
+        if faltantes:
+            resueltos = list(EspecialistaEspecialidad.objects
+                             .filter(id__in=faltantes)
+                             .values_list('id', 'especialista'))
+        with self.__lock:
+            self.__version += 1
+            self.__especialistas.update(resueltos)
+            for turno in turnos:
+                especialista_id = self.__especialistas.get(turno.ee_id)
+                if especialista_id is not None:
+                    self.cache.eliminar(('dia', especialista_id,
+                                         dia_local(turno.fecha)))
+
+    #===========================================================================
+    # limpiar
+    #===========================================================================
+    def limpiar(self):
+        '''Descarta todo el indice (por ejemplo cuando cambian las
+        disponibilidades)'''
+        with self.__lock:
+            self.__version += 1
+            self.cache.limpiar()
+            self.__especialistas.clear()
+
+    #===========================================================================
+    # __agenda
+    #===========================================================================
+    def __agenda(self, especialista_id):
+        '''Devuelve las disponibilidades del especialista agrupadas por dia
+        de la semana, leyendolas si hace falta'''
+        clave = ('agenda', especialista_id)
+        agenda = self.cache.get(clave)
+        if agenda is None:
+            agenda = {}
+            for disponibilidad in (Disponibilidad.objects
+                                   .filter(ee__especialista__id=especialista_id)
+                                   .select_related('ee')):
+                self.__especialistas[disponibilidad.ee_id] = especialista_id
+                (agenda.setdefault(int(disponibilidad.dia), [])
+                       .append((disponibilidad.ee_id,
+                                disponibilidad.horaDesde,
+                                disponibilidad.horaHasta,
+                                disponibilidad.ee.frecuencia_turnos)))
+            self.cache.put(clave, agenda, 64 + 128 * len(agenda))
+        return agenda
+
+    #===========================================================================
+    # __indexar
+    #===========================================================================
+    def __indexar(self, especialista_id, fecha):
+        'Arma las grillas de un dia con sus turnos'
+        tz = timezone.get_default_timezone()
+        segmentos = {}
+        frecuencias = {}
+        for ee_id, desde, hasta, frecuencia in (self.__agenda(especialista_id)
+                                                .get(fecha.weekday(), ())):
+            inicio = tz.localize(datetime.combine(fecha, desde))
+            fin = tz.localize(datetime.combine(fecha, hasta))
+            paso = microsegundos(timedelta(minutes=frecuencia))
+            # mismos horarios que GeneradorTurnos: desde inicio mientras < fin
+            horarios = max(0, -(-microsegundos(fin - inicio) // paso))
+            segmentos.setdefault(ee_id, []).append((inicio, horarios))
+            frecuencias[ee_id] = paso
+        grillas = dict((ee_id, Grilla(sorted(segmentos[ee_id]),
+                                      frecuencias[ee_id]))
+                       for ee_id in segmentos)
+        turnos = (Turno.objects
+                  .filter(ee__especialista__id=especialista_id,
+                          **filtro_dia('fecha', fecha))
+                  .values_list('id', 'ee', 'fecha', 'estado', 'sobreturno'))
+        for turno_id, ee_id, fecha_turno, estado, sobreturno in turnos:
+            grilla = grillas.get(ee_id)
+            if grilla is None or not grilla.agregar(turno_id, fecha_turno,
+                                                    estado, sobreturno):
+                logger.debug("Turno %s fuera de la grilla, el dia %s del "
+                             "especialista %s no se indexa" %
+                             (turno_id, fecha, especialista_id))
+                return None
+        return DiaIndexado(grillas.values())
+
+#===============================================================================
+# microsegundos
+#===============================================================================
+def microsegundos(diferencia):
+    'Convierte un timedelta en una cantidad entera de microsegundos'
+    return ((diferencia.days * 86400 + diferencia.seconds) * 1000000 +
+            diferencia.microseconds)
+
+#===============================================================================
+# bits
+#===============================================================================
+def bits(conjunto):
+    'Devuelve las posiciones de los bits encendidos de un entero'
+    posicion = 0
+    while conjunto:
+        if conjunto & 1:
+            yield posicion
+        conjunto >>= 1
+        posicion += 1
+
+# instancia compartida por todo el proceso
+indice = IndiceDisponibilidad()
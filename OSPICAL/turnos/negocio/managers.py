@@ -5,14 +5,18 @@ Created on 30/07/2014
 
 @author: romeroy
 '''
-from datetime import datetime, timedelta
+from datetime import timedelta
 
-from django.db import transaction
+from django.db import transaction, IntegrityError
 from django.utils import timezone
 
 import excepciones
-from turnos.models import Turno, Disponibilidad, Settings, Reserva, \
-    LineaDeReserva, Afiliado
+import generador
+from configuracion import configuracion
+from fechas import dia_local, rango_dia
+from turnos.models import Turno, Reserva, LineaDeReserva, Afiliado, \
+    HistorialTurno
+from turnos.signals import turnos_modificados
 
 
 # from turnos.models import Turno, Disponibilidad
@@ -28,16 +32,7 @@ class TurnoManager():
     #===========================================================================
     def __init__(self):
         'Constructor'
-        self.DIAS = int(self.__getSetting('cantidad_dias_crear_turnos', 7))
-    
-    #===========================================================================
-    # __getSetting
-    #===========================================================================
-    def __getSetting(self, key, default_value=None):
-        'Obtiene un parametro de configuracion desde la base de datos'
-        # TODO: Ver si puede hacer esto en el service
-        setting = Settings.objects.filter(key=key)
-        return setting[0].value if setting else default_value
+        self.DIAS = configuracion.get_int('cantidad_dias_crear_turnos', 7)
     
     #===========================================================================
     # crear_turno
@@ -55,17 +50,19 @@ class TurnoManager():
         @return:  Instancia del turno creado. None en caso que el turno a crear
         esté repetido
         '''
-        # valido que el turno no exista
-        if not Turno.objects.filter(fecha=fecha,
-                                    ee=ee,
-                                    sobreturno=sobreturno).exists():
-            turno = Turno(fecha=fecha,
-                          ee=ee,
-                          estado=Turno.DISPONIBLE,
-                          consultorio=consultorio,
-                          sobreturno=sobreturno)
-            turno.save()
-            return turno
+        turno = Turno(fecha=fecha,
+                      ee=ee,
+                      estado=Turno.DISPONIBLE,
+                      consultorio=consultorio,
+                      sobreturno=sobreturno)
+        # la base de datos rechaza el turno si ya existe (fecha, ee,
+        # sobreturno), asi que no hace falta consultarlo antes
+        try:
+            with transaction.atomic():
+                turno.save()
+        except IntegrityError:
+            return None
+        return turno
     
     #===========================================================================
     # borrar_turno
@@ -79,10 +76,44 @@ class TurnoManager():
         '''
         return turno.delete()
     
+    #===========================================================================
+    # ocupar_turnos
+    #===========================================================================
+    @transaction.atomic()
+    def ocupar_turnos(self, turnos, estado=Turno.RESERVADO):
+        '''
+        Cambia el estado de turnos disponibles con un unico UPDATE condicional
+        (... WHERE estado = 'D'). La base de datos bloquea las filas
+        modificadas hasta el fin de la transaccion, por lo que si dos
+        transacciones quieren ocupar el mismo turno solo una lo modifica y la
+        otra no lo encuentra disponible. No hace falta select_for_update.
+        
+        Parametros:
+        @param turnos: Lista de turnos (models.Turno) a ocupar
+        @param estado: Estado nuevo de los turnos
+        
+        Retorna:
+        @return: Cantidad de turnos ocupados
+        
+        Excepciones:
+        TurnoReservadoException -- Si algun turno no estaba disponible (o
+                                   esta repetido en la lista). Se deshacen
+                                   los cambios de todos los turnos
+        '''
+        ids = [turno.id for turno in turnos]
+        ocupados = (Turno.objects.filter(id__in=ids, estado=Turno.DISPONIBLE)
+                    .update(estado=estado))
+        if ocupados != len(ids):
+            raise excepciones.TurnoReservadoException("Turno reservado")
+        for turno in turnos:
+            turno.estado = estado
+        turnos_modificados.send(sender=Turno, turnos=turnos)
+        return ocupados
+    
     #===========================================================================
     # crear_turnos
     #===========================================================================
-    @transaction.commit_on_success()
+    @transaction.atomic()
     def crear_turnos(self, fecha_inicio, fecha_fin):
         '''
         Crea los turnos en el sistema para todos las especialidades en el rango
@@ -105,21 +136,9 @@ class TurnoManager():
         '''
         # valido las fechas ingresadas por parametro
         self.__crear_turnos_validate(fecha_inicio, fecha_fin)
-        
-        # inicializo la lista que contendra a los turnos creados
-        creados = []
-        # defino la fecha en la que se crearan los turnos
-        fecha = fecha_inicio
-        # recorro todos los dias del rango
-        while fecha < fecha_fin:
-            # obtengo las disponibilidades del dia
-            for disponibilidad in (Disponibilidad.
-                                   objects.filter(dia=fecha.weekday())):
-                # creo los turnos del dia y los agrego a la lista de creados
-                creados += self.__crear_turnos_del_dia(disponibilidad, fecha)
-            # pasamos al siguiente dia
-            fecha += timedelta(days=1)
-        return creados
+        # calculo todos los turnos del rango en memoria y guardo los que no
+        # existan
+        return generador.GeneradorTurnos().generar(fecha_inicio, fecha_fin)
     
     #===========================================================================
     # __crear_turnos_validate
@@ -153,45 +172,71 @@ class TurnoManager():
             raise ValueError("La fecha inicio no debe ser en el pasado")
     
     #===========================================================================
-    # __crear_turnos_del_dia
+    # cancelar_turnos_rango
     #===========================================================================
-    def __crear_turnos_del_dia(self, disponibilidad, dia):
-        ''' Crea todos los turnos del dia de un especialista.
+    @transaction.atomic()
+    def cancelar_turnos_rango(self, ee, desde, hasta, empleado=None):
+        '''
+        Cancela los turnos disponibles y reservados de un especialista entre
+        dos dias (inclusive), por ejemplo por una licencia. Las lineas de
+        reserva y los turnos se cancelan con un UPDATE cada uno y el
+        historial se escribe con un bulk_create, sin importar la cantidad de
+        dias del rango.
         
         Parametros
-        -------------
-        @param disponibilidad: Instancia de models.Disponibilidad al que se le
-        crearan los turnos
-        
-        @param dia: Dia que se crearan los turnos
+        ------------------
+        @param ee: models.EspecialistaEspecialidad cuyos turnos se cancelan
+        @param desde: date del primer dia a cancelar
+        @param hasta: date del ultimo dia a cancelar
+        @param empleado: models.Empleado que realiza la cancelacion
         
         Retorna
-        ------------
-        @return: Lista de turnos creados
+        -----------
+        @return: Diccionario {models.Afiliado: lista de models.LineaDeReserva
+                 canceladas} con los afiliados a notificar
+        
+        Excepciones
+        -------------------
+        ValueError -- Si desde es posterior a hasta
+        CancelarTurnoException -- Si desde es anterior al dia actual
         '''
-        # configuro la zona horaria
-        tz = timezone.get_default_timezone() 
-        # configuro la hora que empezara a atender el especialista
-        desde = tz.localize(datetime.combine(dia, disponibilidad.horaDesde))
-        # configuro la hora que dejara a atender el especialista
-        hasta = tz.localize(datetime.combine(dia, disponibilidad.horaHasta))
-        # inicializo la lista de turnos creados
-        creados = []
-        # recorremos el rango de horarios desde que empieza a atender hasta
-        # que finaliza
-        while desde < hasta:
-            # creamos el turno
-            turno = self.crear_turno(fecha=desde,
-                                     ee=disponibilidad.ee,
-                                     consultorio=disponibilidad.consultorio)
-            # si el turno fue creado
-            if turno:
-                # agregamos el turno a la lista de creados
-                creados.append(turno)
-            # avanzamos al siguiente turno (depende de la frecuencia de cada
-            # especialista)
-            desde += timedelta(minutes=disponibilidad.ee.frecuencia_turnos)
-        return creados
+        desde, hasta = dia_local(desde), dia_local(hasta)
+        if desde > hasta:
+            raise ValueError("La fecha hasta debe ser posterior a la fecha desde")
+        if desde < dia_local(timezone.now()):
+            raise excepciones.CancelarTurnoException(
+                "No se puede cancelar turnos de un dia anterior a la fecha actual")
+        turnos = Turno.objects.filter(ee=ee,
+                                      estado__in=(Turno.DISPONIBLE,
+                                                  Turno.RESERVADO),
+                                      fecha__gte=rango_dia(desde)[0],
+                                      fecha__lt=rango_dia(hasta)[1])
+        lineas = LineaDeReserva.objects.filter(turno__in=turnos,
+                                               estado=Turno.RESERVADO)
+        # update() descarta lo leido, los recuerdo para el historial, el
+        # resumen y la notificacion
+        afectados = list(turnos)
+        canceladas = list(lineas.select_related('reserva__afiliado', 'turno')
+                          .order_by('turno__fecha'))
+        HistorialTurno.objects.bulk_create([HistorialTurno(
+                    estadoAnterior=turno.estado,
+                    estadoNuevo=Turno.CANCELADO,
+                    descripcion="Turnos cancelados del %s al %s" % (desde, hasta),
+                    turno=turno,
+                    empleado=empleado) for turno in afectados])
+        # primero las lineas: su filtro depende del estado de los turnos
+        # las lineas RESERVADAS no tienen faltas (ver negocio.faltas)
+        lineas.update(estado=Turno.CANCELADO)
+        turnos.update(estado=Turno.CANCELADO)
+        for turno in afectados:
+            turno.estado = Turno.CANCELADO
+        turnos_modificados.send(sender=Turno, turnos=afectados)
+        afiliados = {}
+        for linea in canceladas:
+            linea.estado = linea.turno.estado = Turno.CANCELADO
+            afiliados.setdefault(linea.reserva.afiliado, []).append(linea)
+        return afiliados
+    
     # TODO:testGetDiasTurnos
 
 #===============================================================================
@@ -237,12 +282,13 @@ class ReservaManager:
         self.__crear_reserva_validate(afiliado, telefono, turnos)
         reserva = Reserva.objects.create(afiliado=afiliado,
                                          telefono=telefono)
-        for turno in turnos:
-            turno.estado = Turno.RESERVADO
-            turno.save()
-            LineaDeReserva.objects.create(turno=turno,
-                                          reserva=reserva,
-                                          estado=Turno.RESERVADO)
+        # la validacion no alcanza si otra reserva concurrente toma el mismo
+        # turno: el UPDATE condicional es el que decide
+        TurnoManager().ocupar_turnos(turnos)
+        LineaDeReserva.objects.bulk_create([LineaDeReserva(turno=turno,
+                                                           reserva=reserva,
+                                                           estado=Turno.RESERVADO)
+                                            for turno in turnos])
         return reserva
     
     #===========================================================================
@@ -291,6 +337,10 @@ class ReservaManager:
         ValueError -- En caso que se pase algun parametro como objeto nulo
         TurnoReservadoException -- En caso que algun turno a reservar
                                    ya este reservado
+        
+        Las excepciones de turnos llevan en more_info un diccionario con las
+        listas de ids 'inexistentes' y 'reservados', con todos los turnos
+        invalidos de la reserva y no solo el primero.
         '''
         # valido que la lista de turnos no este vacia
         if not turnos:
@@ -301,13 +351,23 @@ class ReservaManager:
         # valido que el afiliado exista
         if not Afiliado.objects.filter(id=afiliado.id).exists():
             raise excepciones.AfiliadoNotExistsException("Afiliado inexistente")
-        # valido si los turnos a reservar existen
-        for turno in turnos:
-            if not Turno.objects.filter(id=turno.id).exists():
-                raise excepciones.TurnoNotExistsException("Turno inexistente")
-            if not (Turno.objects.filter(id=turno.id, estado=Turno.DISPONIBLE)
-                    .exists()):
-                raise excepciones.TurnoReservadoException("Turno reservado")
+        # valido con una sola consulta que los turnos existan y esten
+        # disponibles
+        ids = [turno.id for turno in turnos]
+        estados = dict(Turno.objects.filter(id__in=ids)
+                       .values_list('id', 'estado'))
+        invalidos = {'inexistentes': sorted(set(turno_id for turno_id in ids
+                                                if turno_id not in estados)),
+                     'reservados': sorted(set(turno_id for turno_id in ids
+                                              if turno_id in estados and
+                                              estados[turno_id] !=
+                                              Turno.DISPONIBLE))}
+        if invalidos['inexistentes']:
+            raise excepciones.TurnoNotExistsException("Turno inexistente",
+                                                      invalidos)
+        if invalidos['reservados']:
+            raise excepciones.TurnoReservadoException("Turno reservado",
+                                                      invalidos)
     
     def get_turnos_reservados(self, afiliado):
         '''
@@ -329,3 +389,168 @@ class ReservaManager:
         '''
         pass
     
+
+#===============================================================================
+# AfiliadoManager
+#===============================================================================
+class AfiliadoManager:
+    '''
+    Permite administrar los afiliados de la base local
+    '''
+    # campos que se copian del directorio externo
+    CAMPOS = ('dni', 'nombre', 'apellido')
+    # campos de los afiliados sugeridos
+    CAMPOS_SUGERIDOS = ('id', 'numero', 'dni', 'nombre', 'apellido')
+    # cantidad maxima de digitos de un dni
+    DIGITOS_DNI = 9
+    #===========================================================================
+    # guardar_afiliados
+    #===========================================================================
+    def guardar_afiliados(self, afiliados):
+        '''
+        Agrega o actualiza en la tabla Afiliado, por numero, los afiliados
+        obtenidos del directorio externo y les asigna su id local. Los
+        afiliados nuevos se insertan con un solo bulk_create y solo se
+        actualizan los que cambiaron.
+        
+        Parametros
+        ------------------
+        @param afiliados: Lista de diccionarios con las claves numero, dni,
+                          nombre y apellido. Se les agrega la clave id
+        
+        Retorna
+        -----------
+        @return: Cantidad de afiliados agregados o modificados
+        '''
+        nuevos, modificados, ids = self.__guardar_lote(afiliados, True)
+        for afiliado in afiliados:
+            afiliado['id'] = ids[afiliado['numero']]
+        return nuevos + modificados
+    
+    #===========================================================================
+    # importar_afiliados
+    #===========================================================================
+    def importar_afiliados(self, afiliados):
+        '''
+        Agrega o actualiza por numero un lote de afiliados de un padron, igual
+        que guardar_afiliados pero sin asignarles el id. Si un numero se
+        repite en el lote se guarda el ultimo.
+        
+        Retorna
+        -----------
+        @return: Tupla (cantidad de afiliados agregados, cantidad de
+                 afiliados modificados)
+        '''
+        nuevos, modificados, _ = self.__guardar_lote(afiliados, False)
+        return nuevos, modificados
+    
+    #===========================================================================
+    # sugerir_afiliados
+    #===========================================================================
+    def sugerir_afiliados(self, texto, cantidad=10):
+        '''
+        Devuelve los primeros afiliados que coinciden con un texto a medio
+        escribir, para autocompletar. Un texto numerico busca el dni exacto
+        y el prefijo del numero de afiliado; cualquier otro texto busca el
+        prefijo del apellido, o con el formato "apellido, nombre" el apellido
+        exacto y el prefijo del nombre.
+        
+        Cada consulta es un rango sobre un indice (dni, numero o (apellido,
+        nombre)) en el orden del indice y limitado a 'cantidad' filas, asi
+        que no depende del tamano de la tabla. Como la comparacion distingue
+        mayusculas, el texto se busca tal como se escribio, capitalizado y
+        en mayusculas.
+        
+        Parametros
+        ------------------
+        @param texto: Texto escrito por el operador
+        @param cantidad: Cantidad maxima de afiliados
+        
+        Retorna
+        -----------
+        @return: Lista de diccionarios con los campos CAMPOS_SUGERIDOS
+        '''
+        texto = texto.strip()
+        if not texto:
+            return []
+        if texto.isdigit():
+            consultas = [self.__prefijo(Afiliado.objects.all(), 'numero', texto)
+                         .order_by('numero')]
+            if len(texto) <= self.DIGITOS_DNI:
+                consultas.append(Afiliado.objects.filter(dni=int(texto))
+                                 .order_by('dni'))
+            orden = lambda afiliado: afiliado['numero']
+        else:
+            apellido, coma, nombre = [parte.strip() for parte in texto.partition(',')]
+            consultas = []
+            variantes = []
+            for variante in ((apellido, nombre),
+                             (apellido.title(), nombre.title()),
+                             (apellido.upper(), nombre.upper())):
+                if variante not in variantes:
+                    variantes.append(variante)
+            for apellido, nombre in variantes:
+                if coma and nombre:
+                    consulta = self.__prefijo(Afiliado.objects.filter(
+                                                            apellido=apellido),
+                                              'nombre', nombre)
+                elif coma:
+                    consulta = Afiliado.objects.filter(apellido=apellido)
+                else:
+                    consulta = self.__prefijo(Afiliado.objects.all(), 'apellido',
+                                              apellido)
+                consultas.append(consulta.order_by('apellido', 'nombre'))
+            orden = lambda afiliado: (afiliado['apellido'], afiliado['nombre'],
+                                      afiliado['numero'])
+        encontrados = {}
+        for consulta in consultas:
+            for afiliado in consulta.values(*self.CAMPOS_SUGERIDOS)[:cantidad]:
+                encontrados[afiliado['id']] = afiliado
+        return sorted(encontrados.values(), key=orden)[:cantidad]
+    
+    def __prefijo(self, queryset, campo, prefijo):
+        '''Filtra los valores del campo que empiezan con el prefijo como un
+        rango [prefijo, siguiente) que puede recorrer el indice del campo
+        (a diferencia de LIKE)'''
+        siguiente = prefijo[:-1] + unichr(ord(prefijo[-1]) + 1)
+        return queryset.filter(**{campo + '__gte': prefijo,
+                                  campo + '__lt': siguiente})
+    
+    def __guardar_lote(self, afiliados, asignar_ids):
+        'Guarda un lote en una transaccion'
+        por_numero = dict((afiliado['numero'], afiliado) for afiliado in afiliados)
+        try:
+            with transaction.atomic():
+                return self.__guardar(por_numero, asignar_ids)
+        except IntegrityError:
+            # otro proceso agrego alguno de los afiliados al mismo tiempo
+            with transaction.atomic():
+                return self.__guardar(por_numero, asignar_ids)
+    
+    def __guardar(self, por_numero, asignar_ids):
+        '''Devuelve la cantidad de afiliados agregados y modificados y el id
+        de cada numero (de los agregados solo si asignar_ids)'''
+        existentes = (Afiliado.objects.filter(numero__in=list(por_numero))
+                      .values_list('id', 'numero', *self.CAMPOS))
+        ids = {}
+        modificados = 0
+        for fila in existentes:
+            ids[fila[1]] = fila[0]
+            datos = por_numero[fila[1]]
+            cambios = dict((campo, datos[campo])
+                           for campo, valor in zip(self.CAMPOS, fila[2:])
+                           if unicode(valor) != unicode(datos[campo]))
+            if cambios:
+                Afiliado.objects.filter(id=fila[0]).update(**cambios)
+                modificados += 1
+        nuevos = [Afiliado(numero=numero, **dict((campo, datos[campo])
+                                                 for campo in self.CAMPOS))
+                  for numero, datos in por_numero.items() if numero not in ids]
+        if nuevos:
+            Afiliado.objects.bulk_create(nuevos)
+            if asignar_ids:
+                # bulk_create no asigna los ids
+                ids.update(Afiliado.objects.filter(numero__in=[afiliado.numero
+                                                               for afiliado in nuevos])
+                           .values_list('numero', 'id'))
+        return len(nuevos), modificados, ids
@@ -0,0 +1,108 @@
+# coding=utf-8
+'''
+Proyecciones de consultas a diccionarios planos para las respuestas JSON.
+Cada proyeccion lee solo las columnas que necesita con values(), en una
+consulta con los JOIN necesarios, y arma los diccionarios a partir de las
+filas sin instanciar modelos.
+Created on 18/10/2026
+
+@author: romeroy
+'''
+
+#===============================================================================
+# turnos_reservados
+#===============================================================================
+# columnas de LineaDeReserva que necesita turno_reservado
+CAMPOS_TURNO_RESERVADO = ('id', 'reserva__fecha', 'turno__fecha',
+                          'turno__ee__especialidad__descripcion',
+                          'turno__ee__especialista__apellido',
+                          'turno__ee__especialista__nombre',
+                          'turno__consultorio__numero')
+
+def turnos_reservados(lineas):
+    '''
+    Devuelve una lista de diccionarios con las claves id, fecha_reserva,
+    fecha_turno, especialidad, especialista y consultorio a partir de un
+    queryset de LineaDeReserva.
+    '''
+    return [turno_reservado(fila)
+            for fila in lineas.values(*CAMPOS_TURNO_RESERVADO)]
+
+def turno_reservado(fila):
+    'Arma el diccionario de una fila con las columnas CAMPOS_TURNO_RESERVADO'
+    return {'id': fila['id'],
+            'fecha_reserva': fila['reserva__fecha'],
+            'fecha_turno': fila['turno__fecha'],
+            'especialidad': fila['turno__ee__especialidad__descripcion'],
+            'especialista': nombre_completo(
+                                fila['turno__ee__especialista__apellido'],
+                                fila['turno__ee__especialista__nombre']),
+            'consultorio': fila['turno__consultorio__numero']}
+
+#===============================================================================
+# reservas_especialista
+#===============================================================================
+# columnas de LineaDeReserva que necesita reserva_especialista
+CAMPOS_RESERVA_ESPECIALISTA = ('reserva__fecha', 'turno__fecha',
+                               'reserva__afiliado__apellido',
+                               'reserva__afiliado__nombre',
+                               'reserva__afiliado__numero',
+                               'reserva__telefono')
+
+def reservas_especialista(lineas):
+    '''
+    Devuelve una lista de diccionarios con las claves fecha_reserva,
+    fecha_turno, afiliado, numero y telefono a partir de un queryset de
+    LineaDeReserva.
+    '''
+    return [reserva_especialista(fila)
+            for fila in lineas.values(*CAMPOS_RESERVA_ESPECIALISTA)]
+
+def reserva_especialista(fila):
+    'Arma el diccionario de una fila con las columnas CAMPOS_RESERVA_ESPECIALISTA'
+    return {'fecha_reserva': fila['reserva__fecha'],
+            'fecha_turno': fila['turno__fecha'],
+            'afiliado': nombre_completo(fila['reserva__afiliado__apellido'],
+                                        fila['reserva__afiliado__nombre']),
+            'numero': fila['reserva__afiliado__numero'],
+            'telefono': fila['reserva__telefono']}
+
+#===============================================================================
+# reserva_exportada
+#===============================================================================
+# columnas de LineaDeReserva que necesita reserva_exportada
+CAMPOS_RESERVA_EXPORTADA = ('id', 'turno__fecha',
+                            'turno__ee__especialidad__descripcion',
+                            'turno__ee__especialista__apellido',
+                            'turno__ee__especialista__nombre',
+                            'reserva__fecha',
+                            'reserva__afiliado__apellido',
+                            'reserva__afiliado__nombre',
+                            'reserva__afiliado__numero',
+                            'reserva__telefono', 'estado')
+# claves de reserva_exportada en el orden de las columnas exportadas
+COLUMNAS_RESERVA_EXPORTADA = ('id', 'fecha_turno', 'especialidad',
+                              'especialista', 'fecha_reserva', 'afiliado',
+                              'numero', 'telefono', 'estado')
+
+def reserva_exportada(fila):
+    'Arma el diccionario de una fila con las columnas CAMPOS_RESERVA_EXPORTADA'
+    return {'id': fila['id'],
+            'fecha_turno': fila['turno__fecha'],
+            'especialidad': fila['turno__ee__especialidad__descripcion'],
+            'especialista': nombre_completo(
+                                fila['turno__ee__especialista__apellido'],
+                                fila['turno__ee__especialista__nombre']),
+            'fecha_reserva': fila['reserva__fecha'],
+            'afiliado': nombre_completo(fila['reserva__afiliado__apellido'],
+                                        fila['reserva__afiliado__nombre']),
+            'numero': fila['reserva__afiliado__numero'],
+            'telefono': fila['reserva__telefono'],
+            'estado': fila['estado']}
+
+#===============================================================================
+# nombre_completo
+#===============================================================================
+def nombre_completo(apellido, nombre):
+    'Igual que full_name() de Especialista y Afiliado'
+    return u"%s, %s" % (apellido, nombre)
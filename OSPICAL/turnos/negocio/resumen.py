@@ -0,0 +1,258 @@
+# coding=utf-8
+'''
+Este modulo mantiene el resumen diario de turnos de cada especialista
+(modelo models.DiaDisponibilidad)
+Created on 18/10/2026
+
+@author: romeroy
+'''
+import logging
+
+from django.db import connection, transaction
+from django.db.backends.util import typecast_timestamp
+from django.db.models import Count, Max, F
+from django.utils import six, timezone
+
+from turnos.models import Turno, DiaDisponibilidad
+from fechas import dia_local, rango_dia
+
+logger = logging.getLogger(__name__)
+
+#===============================================================================
+# ResumenDisponibilidad
+#===============================================================================
+class ResumenDisponibilidad(object):
+    '''
+    Mantiene la tabla DiaDisponibilidad, que guarda por especialista y dia
+    la cantidad de turnos disponibles, reservados, cancelados y sobreturnos.
+
+    La tabla se actualiza dentro de la misma transaccion que modifica los
+    turnos. Los turnos guardados con save() se informan desde
+    turnos.signals y solo suman o restan sus contadores; los cambios hechos
+    con update() o bulk_create se informan con la señal turnos_modificados,
+    que llama a actualizar() para recalcular los dias afectados a partir de
+    los turnos de la base de datos.
+    '''
+    TAMANO_LOTE = 500
+    # contador de cada estado (los demas estados no se cuentan)
+    COLUMNAS = {Turno.DISPONIBLE: 'disponibles',
+                Turno.RESERVADO: 'reservados',
+                Turno.CANCELADO: 'cancelados'}
+    # atributo donde se recuerda el estado del turno al leerlo o guardarlo
+    ATRIBUTO = '_resumen_anterior'
+
+    #===========================================================================
+    # registrar
+    #===========================================================================
+    def registrar(self, turno):
+        'Recuerda los datos del turno que afectan al resumen (post_init)'
+        setattr(turno, self.ATRIBUTO, self.__datos(turno))
+
+    #===========================================================================
+    # guardado
+    #===========================================================================
+    def guardado(self, turno, creado):
+        '''
+        Actualiza el resumen despues de guardar un turno (post_save). Las
+        altas y los cambios de estado suman y restan los contadores del dia
+        con un UPDATE; si el turno cambio de dia o especialista, o el dia no
+        esta en el resumen, se recalcula.
+        '''
+        anterior = None if creado else getattr(turno, self.ATRIBUTO, None)
+        actual = self.__datos(turno)
+        setattr(turno, self.ATRIBUTO, actual)
+        if anterior == actual:
+            return
+        if not creado and (anterior is None or anterior[:3] != actual[:3]):
+            claves = [actual[:2]] + ([anterior[:2]] if anterior else [])
+            self.recalcular(claves)
+            return
+        cambios = self.__cambios(actual, 1)
+        if anterior is not None:
+            for columna, cantidad in self.__cambios(anterior, -1).items():
+                cambios[columna] = cambios.get(columna, 0) + cantidad
+        filas = DiaDisponibilidad.objects.filter(ee__id=actual[0],
+                                                 fecha=actual[1])
+        cambios = dict((columna, F(columna) + cantidad)
+                       for columna, cantidad in cambios.items() if cantidad)
+        if not (filas.update(**cambios) if cambios else filas.exists()):
+            self.recalcular([actual[:2]])
+        elif creado:
+            filas.filter(ultimo_turno__lt=turno.fecha).update(
+                                                    ultimo_turno=turno.fecha)
+
+    #===========================================================================
+    # eliminado
+    #===========================================================================
+    def eliminado(self, turno):
+        'Recalcula el dia de un turno eliminado (post_delete)'
+        self.actualizar([turno])
+
+    #===========================================================================
+    # actualizar
+    #===========================================================================
+    def actualizar(self, turnos):
+        '''
+        Recalcula los dias de los turnos indicados. Los turnos quedan
+        registrados con su estado actual, que ya coincide con la base de
+        datos, por si luego se guardan con save().
+
+        Parametros
+        ------------------
+        @param turnos: Iterable de turnos modificados
+        '''
+        for turno in turnos:
+            self.registrar(turno)
+        self.recalcular(set((turno.ee_id, dia_local(turno.fecha))
+                            for turno in turnos))
+
+    #===========================================================================
+    # recalcular
+    #===========================================================================
+    def recalcular(self, claves):
+        '''
+        Recalcula el resumen de los dias indicados, con una consulta por
+        especialista.
+
+        Parametros
+        ------------------
+        @param claves: Iterable de tuplas (id de EspecialistaEspecialidad,
+                       date)
+        '''
+        por_ee = {}
+        for ee_id, dia in claves:
+            por_ee.setdefault(ee_id, set()).add(dia)
+        for ee_id, dias in por_ee.items():
+            turnos = Turno.objects.filter(ee__id=ee_id,
+                                          fecha__gte=rango_dia(min(dias))[0],
+                                          fecha__lt=rango_dia(max(dias))[1])
+            filas = [fila for (_, dia), fila in self.calcular(turnos).items()
+                     if dia in dias]
+            DiaDisponibilidad.objects.filter(ee__id=ee_id,
+                                             fecha__in=dias).delete()
+            DiaDisponibilidad.objects.bulk_create(filas)
+            logger.debug("Resumen del ee %s actualizado para los dias %s" %
+                         (ee_id, sorted(dias)))
+
+    #===========================================================================
+    # reconstruir
+    #===========================================================================
+    @transaction.atomic
+    def reconstruir(self):
+        '''
+        Vuelve a generar la tabla completa a partir de todos los turnos.
+
+        Retorna
+        -----------
+        @return: Cantidad de dias generados
+        '''
+        DiaDisponibilidad.objects.all().delete()
+        filas = self.calcular(Turno.objects.all()).values()
+        DiaDisponibilidad.objects.bulk_create(filas,
+                                              batch_size=self.TAMANO_LOTE)
+        logger.info("Resumen de disponibilidad reconstruido: %s dias" %
+                    len(filas))
+        return len(filas)
+
+    #===========================================================================
+    # verificar
+    #===========================================================================
+    def verificar(self):
+        '''
+        Compara la tabla con el resumen calculado a partir de los turnos.
+
+        Retorna
+        -----------
+        @return: Lista ordenada de claves (ee, dia) que difieren
+        '''
+        esperado = dict((clave, self.__valores(fila)) for clave, fila
+                        in self.calcular(Turno.objects.all()).items())
+        actual = dict(((fila.ee_id, fila.fecha), self.__valores(fila))
+                      for fila in DiaDisponibilidad.objects.all())
+        return sorted(clave for clave in set(esperado) | set(actual)
+                      if esperado.get(clave) != actual.get(clave))
+
+    #===========================================================================
+    # calcular
+    #===========================================================================
+    def calcular(self, turnos):
+        '''
+        Calcula el resumen de un queryset de turnos con una consulta
+        agrupada por especialista, dia, estado y sobreturno. El dia se trunca
+        en la base de datos en la zona horaria actual.
+
+        Retorna
+        -----------
+        @return: Diccionario {(ee_id, dia): DiaDisponibilidad sin guardar}
+        '''
+        tzname = timezone.get_current_timezone_name()
+        columna = "%s.%s" % (connection.ops.quote_name(Turno._meta.db_table),
+                             connection.ops.quote_name('fecha'))
+        sql, params = connection.ops.datetime_trunc_sql('day', columna, tzname)
+        grupos = (turnos.extra(select={'dia': sql}, select_params=params)
+                  .values('ee', 'dia', 'estado', 'sobreturno')
+                  .annotate(cantidad=Count('id'), ultimo=Max('fecha'))
+                  .order_by())
+        filas = {}
+        for grupo in grupos:
+            clave = (grupo['ee'], self.__fecha(grupo['dia']).date())
+            ultimo = self.__fecha(grupo['ultimo'])
+            fila = filas.get(clave)
+            if fila is None:
+                fila = filas[clave] = DiaDisponibilidad(ee_id=clave[0],
+                                                        fecha=clave[1],
+                                                        ultimo_turno=ultimo)
+            if grupo['estado'] == Turno.DISPONIBLE:
+                fila.disponibles += grupo['cantidad']
+            elif grupo['estado'] == Turno.RESERVADO:
+                fila.reservados += grupo['cantidad']
+            elif grupo['estado'] == Turno.CANCELADO:
+                fila.cancelados += grupo['cantidad']
+            if grupo['sobreturno']:
+                fila.sobreturnos += grupo['cantidad']
+            fila.ultimo_turno = max(fila.ultimo_turno, ultimo)
+        return filas
+
+    #===========================================================================
+    # __datos
+    #===========================================================================
+    def __datos(self, turno):
+        '''Datos del turno que afectan al resumen: (ee, dia, fecha, estado,
+        sobreturno)'''
+        if turno.fecha is None:
+            return None
+        return (turno.ee_id, dia_local(turno.fecha), turno.fecha,
+                turno.estado, turno.sobreturno)
+
+    #===========================================================================
+    # __cambios
+    #===========================================================================
+    def __cambios(self, datos, cantidad):
+        'Devuelve lo que hay que sumar a cada contador por un turno'
+        estado, sobreturno = datos[3:]
+        cambios = {}
+        if estado in self.COLUMNAS:
+            cambios[self.COLUMNAS[estado]] = cantidad
+        if sobreturno:
+            cambios['sobreturnos'] = cantidad
+        return cambios
+
+    #===========================================================================
+    # __fecha
+    #===========================================================================
+    def __fecha(self, valor):
+        'sqlite devuelve las fechas truncadas y los agregados como texto'
+        if isinstance(valor, six.string_types):
+            valor = typecast_timestamp(valor)
+        return valor
+
+    #===========================================================================
+    # __valores
+    #===========================================================================
+    def __valores(self, fila):
+        'Devuelve los contadores de una fila para compararla'
+        return (fila.disponibles, fila.reservados, fila.cancelados,
+                fila.sobreturnos, fila.ultimo_turno)
+
+# instancia compartida por todo el proceso
+resumen = ResumenDisponibilidad()
@@ -7,7 +7,7 @@ Created on 30/07/2014
 '''
 import managers
 import commands
-from turnos.models import Settings
+from configuracion import configuracion
 
 from django.utils import timezone
 from datetime import timedelta
@@ -29,18 +29,7 @@ class ReservaTurnosService(object):
         '''
         self.turno_manager = managers.TurnoManager()
         self.reserva_manager = managers.ReservaManager()
-        self.DIAS = int(self.__getSetting('cantidad_dias_crear_turnos', 7))
-        
-    #===========================================================================
-    # __getSetting
-    #===========================================================================
-    def __getSetting(self, key, default_value=None):
-        '''
-        Obtiene un parametro de configuracion (key) y se puede setear un valor 
-        por defecto.
-        '''
-        setting = Settings.objects.filter(key=key)
-        return setting[0].value if setting else default_value
+        self.DIAS = configuracion.get_int('cantidad_dias_crear_turnos', 7)
         
     #===========================================================================
     # __ejecutar
@@ -164,4 +153,31 @@ class ReservaTurnosService(object):
         # ejecutamos la orden
         self.__ejecutar(orden)
         # devolvemos la reserva
-        return orden.reserva
\ No newline at end of file
+        return orden.reserva
+    
+    #===========================================================================
+    # cancelar_turnos_rango
+    #===========================================================================
+    def cancelar_turnos_rango(self, ee, desde, hasta, empleado=None):
+        '''
+        Cancela los turnos de un especialista entre dos dias (inclusive).
+        
+        Parametros
+        ------------------
+        @param ee: Instancia de models.EspecialistaEspecialidad
+        @param desde: date del primer dia a cancelar
+        @param hasta: date del ultimo dia a cancelar
+        @param empleado: models.Empleado que realiza la cancelacion
+        
+        Retorna
+        -----------
+        @return: Diccionario {models.Afiliado: lista de models.LineaDeReserva
+                 canceladas} con los afiliados a notificar
+        
+        Excepciones
+        -------------------
+        ValueError -- Si desde es posterior a hasta
+        CancelarTurnoException -- Si desde es anterior al dia actual
+        '''
+        return self.turno_manager.cancelar_turnos_rango(ee, desde, hasta,
+                                                        empleado)
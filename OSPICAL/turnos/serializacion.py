@@ -0,0 +1,138 @@
+# coding=utf-8
+'''
+Serializacion a JSON de las respuestas de las vistas /json/. Cada vista
+declara con Campos los campos que devuelve y cuales son fechas; las fechas
+se convierten a segundos desde 1970 (epoch) antes de codificar, para que el
+codificador no tenga que llamar a un default() escrito en Python. Si esta
+instalado ujson se usa en lugar del modulo json.
+Created on 18/10/2026
+
+@author: romeroy
+'''
+import datetime
+import json
+from operator import itemgetter, attrgetter
+
+from django.http import HttpResponse
+from django.utils import timezone
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+EPOCA = datetime.datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+#===============================================================================
+# epoca
+#===============================================================================
+def epoca(fecha):
+    '''
+    Devuelve los segundos enteros desde 1970-01-01 UTC de un datetime,
+    restando la fecha en lugar de usar mktime(): no depende de la zona
+    horaria del proceso y no es ambiguo en los cambios de horario. Las
+    fechas sin zona horaria se interpretan en la zona horaria por defecto.
+    '''
+    if timezone.is_naive(fecha):
+        fecha = timezone.make_aware(fecha, timezone.get_default_timezone())
+    diferencia = fecha - EPOCA
+    return diferencia.days * 86400 + diferencia.seconds
+
+#===============================================================================
+# Campos
+#===============================================================================
+class Campos(object):
+    '''
+    Campos de los elementos de una respuesta JSON. Los elementos pueden ser
+    diccionarios (values() o negocio.proyecciones) o instancias de modelos;
+    el resultado tiene solo los campos declarados y las fechas convertidas
+    con epoca().
+
+    Atributos
+    -----------------
+    campos -- Nombres de los campos (claves o atributos de cada elemento)
+    fechas -- Campos que son datetime (o None)
+    '''
+    #===========================================================================
+    # __init__
+    #===========================================================================
+    def __init__(self, campos, fechas=()):
+        'Constructor'
+        self.campos = tuple(campos)
+        self.fechas = tuple(fechas)
+        # con un solo campo itemgetter y attrgetter no devuelven una tupla
+        self.__claves = itemgetter(*self.campos + self.campos[:1])
+        self.__atributos = attrgetter(*self.campos + self.campos[:1])
+
+    #===========================================================================
+    # __call__
+    #===========================================================================
+    def __call__(self, elementos):
+        'Devuelve la lista de diccionarios de los elementos'
+        return [self.elemento(elemento) for elemento in elementos]
+
+    #===========================================================================
+    # elemento
+    #===========================================================================
+    def elemento(self, elemento):
+        'Devuelve el diccionario de un elemento'
+        if isinstance(elemento, dict):
+            data = dict(zip(self.campos, self.__claves(elemento)))
+        else:
+            data = dict(zip(self.campos, self.__atributos(elemento)))
+        for campo in self.fechas:
+            if data[campo] is not None:
+                data[campo] = epoca(data[campo])
+        return data
+
+# campos de las respuestas de cada vista
+AFILIADO = Campos(('id', 'numero', 'dni', 'nombre', 'apellido'))
+ESPECIALISTA = Campos(('id', 'nombre', 'apellido'))
+DIA_TURNOS = Campos(('fecha', 'estado'), fechas=('fecha',))
+TURNO_DISPONIBLE = Campos(('id', 'fecha', 'estado', 'sobreturno', 'ee_id',
+                           'consultorio_id'), fechas=('fecha',))
+PROXIMO_TURNO = Campos(('id', 'fecha', 'sobreturno', 'consultorio', 'ee_id',
+                        'especialista_id', 'especialista'), fechas=('fecha',))
+TURNO_RESERVADO = Campos(('id', 'fecha_reserva', 'fecha_turno', 'especialidad',
+                          'especialista', 'consultorio'),
+                         fechas=('fecha_reserva', 'fecha_turno'))
+RESERVA_ESPECIALISTA = Campos(('fecha_reserva', 'fecha_turno', 'afiliado',
+                               'numero', 'telefono'),
+                              fechas=('fecha_reserva', 'fecha_turno'))
+
+#===============================================================================
+# dumps
+#===============================================================================
+class _Codificador(json.JSONEncoder):
+    'Codificador del modulo json, para las fechas no declaradas con Campos'
+    def default(self, obj):
+        if isinstance(obj, datetime.datetime):
+            return epoca(obj)
+        return json.JSONEncoder.default(self, obj)
+
+_codificador = _Codificador(separators=(',', ':'))
+
+def dumps(data):
+    '''
+    Codifica data a JSON con ujson si esta instalado o con el codificador en
+    C del modulo json. Los valores que ujson no sabe codificar (por ejemplo
+    una fecha no declarada) se codifican con el modulo json.
+    '''
+    if ujson is not None:
+        try:
+            return ujson.dumps(data)
+        except (TypeError, OverflowError):
+            pass
+    return _codificador.encode(data)
+
+#===============================================================================
+# JSONResponse
+#===============================================================================
+def JSONResponse(data, campos=None):
+    '''
+    Respuesta JSON de una vista. Si se indican los campos (Campos), data es
+    la lista de elementos a convertir.
+    '''
+    if campos is not None:
+        data = campos(data)
+    return HttpResponse(dumps(data), content_type="application/json; charset=utf-8")
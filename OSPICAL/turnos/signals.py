@@ -1,9 +1,21 @@
 # coding=utf-8
 from django.contrib.auth.signals import user_logged_in, user_logged_out, user_login_failed
+from django.db.models.signals import post_init, post_save, post_delete
+from django.dispatch import Signal
 import logging
 
+from turnos.models import Settings, Turno, Disponibilidad, LineaDeReserva, Reserva, \
+    Afiliado
+from turnos.negocio.cache_afiliados import cache_afiliados
+from turnos.negocio.configuracion import configuracion
+from turnos.negocio.faltas import faltas
+from turnos.negocio.indice import indice
+from turnos.negocio.resumen import resumen
+
 # Definicion de señales
 logger = logging.getLogger(__name__)
+# turnos modificados sin save() (con update() o bulk_create)
+turnos_modificados = Signal(providing_args=["turnos"])
 
 def log_login(sender, request, user, **kwargs):
     logger.info("<%s> ha iniciado sesion desde <%s>" % (user.username,request.get_host()))
@@ -12,7 +24,50 @@ def log_logout(sender, request, user, **kwargs):
 def log_failed(sender, credentials, **kwargs):
     print sender, credentials, kwargs 
     logger.error("<%s> fallo al iniciar sesion" % (credentials['username']))   
+def invalidar_configuracion(sender, **kwargs):
+    logger.debug("Parametros de configuracion modificados, invalidando cache")
+    configuracion.invalidar()
+def registrar_turno(sender, instance, **kwargs):
+    resumen.registrar(instance)
+def turno_guardado(sender, instance, created, **kwargs):
+    logger.debug("Turno %s guardado, actualizando resumen diario" % instance.id)
+    resumen.guardado(instance, created)
+    indice.invalidar([instance])
+def turno_eliminado(sender, instance, **kwargs):
+    logger.debug("Turno %s eliminado, actualizando resumen diario" % instance.id)
+    resumen.eliminado(instance)
+    indice.invalidar([instance])
+def actualizar_turnos(sender, turnos, **kwargs):
+    logger.debug("%s turnos modificados, actualizando resumen diario" % len(turnos))
+    resumen.actualizar(turnos)
+    indice.invalidar(turnos)
+def registrar_faltas(sender, instance, **kwargs):
+    faltas.registrar(instance)
+def linea_guardada(sender, instance, created, **kwargs):
+    faltas.linea_guardada(instance, created)
+def reserva_guardada(sender, instance, created, **kwargs):
+    faltas.reserva_guardada(instance, created)
+def limpiar_afiliados(sender, **kwargs):
+    logger.debug("Afiliados modificados, descartando cache de busquedas")
+    cache_afiliados.limpiar()
+def limpiar_indice(sender, **kwargs):
+    logger.debug("Disponibilidades modificadas, descartando indice de turnos")
+    indice.limpiar()
 
 user_logged_in.connect(log_login)
 user_logged_out.connect(log_logout)
-user_login_failed.connect(log_failed)
\ No newline at end of file
+user_login_failed.connect(log_failed)
+post_save.connect(invalidar_configuracion, sender=Settings)
+post_delete.connect(invalidar_configuracion, sender=Settings)
+post_init.connect(registrar_turno, sender=Turno)
+post_save.connect(turno_guardado, sender=Turno)
+post_delete.connect(turno_eliminado, sender=Turno)
+turnos_modificados.connect(actualizar_turnos, sender=Turno)
+post_init.connect(registrar_faltas, sender=LineaDeReserva)
+post_save.connect(linea_guardada, sender=LineaDeReserva)
+post_init.connect(registrar_faltas, sender=Reserva)
+post_save.connect(reserva_guardada, sender=Reserva)
+post_save.connect(limpiar_afiliados, sender=Afiliado)
+post_delete.connect(limpiar_afiliados, sender=Afiliado)
+post_save.connect(limpiar_indice, sender=Disponibilidad)
+post_delete.connect(limpiar_indice, sender=Disponibilidad)
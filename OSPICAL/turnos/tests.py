@@ -1,23 +1,62 @@
 # coding=utf-8
 
 
-from datetime import timedelta
+from StringIO import StringIO
+from datetime import timedelta, datetime, time
+import calendar
+import csv
+import json
 import logging
+import os
+import re
+import tempfile
+import threading
+from time import sleep, mktime
+from unittest import skipUnless
 
 from dateutil.relativedelta import relativedelta
+from django.contrib.auth.models import User
+from django.contrib.messages.storage.cookie import CookieStorage
 from django.core.exceptions import ValidationError
-from django.test import TestCase
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.core.management.color import no_style
+from django.db import connection, connections, transaction, IntegrityError, \
+    OperationalError
+from django.test import TestCase, TransactionTestCase
+from django.test.client import RequestFactory
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 
 from bussiness import Bussiness
+from decorators import PaginaCursor, seek
+from directorio_falso import ServidorDirectorioFalso
+from exportar import reservas_ndjson
+from forms import SugerirAfiliadosForm
+from management.commands import migrar_esquema
 from models import Turno, Consultorio, EspecialistaEspecialidad, LineaDeReserva, \
-    Especialidad, Especialista, Disponibilidad, Afiliado, Reserva
+    Especialidad, Especialista, Disponibilidad, Afiliado, Reserva, Settings, \
+    HistorialTurno, DiaDisponibilidad, Empleado, Falta
+from negocio.busqueda import BuscadorTurnos
+from negocio.calendario import Calendario
 from negocio.commands import OrdenCrearTurno, OrdenCrearTurnos, OrdenReservar
+from negocio.cache import CacheLRU
+from negocio.cache_afiliados import CacheAfiliados, cache_afiliados
+from negocio.configuracion import Configuracion, configuracion
+from negocio.fechas import filtro_dia, dia_local, rango_dia
+from negocio import directorio
+from negocio.directorio import ClienteHTTP, DirectorioAfiliados
+from negocio.faltas import faltas
 from negocio.excepciones import TurnoNotExistsException, \
     AfiliadoNotExistsException, TurnoReservadoException, ConfirmarReservaException, \
     CancelarReservaException, CancelarTurnoException
-from negocio.managers import TurnoManager, ReservaManager
+from negocio.indice import indice, IndiceDisponibilidad
+from negocio.managers import TurnoManager, ReservaManager, AfiliadoManager
+from negocio.resumen import resumen
 from negocio.service import ReservaTurnosService
+from serializacion import Campos, epoca, dumps, JSONResponse
+import serializacion
+from turnos import views
 from turnos.validators import PasswordValidator
 
 
@@ -33,6 +72,8 @@ class ReservasTestSuite(TestCase):
     manager = ReservaManager()
     def setUp(self):
         TestCase.setUp(self)
+        # los rollback de cada test no invalidan el indice compartido
+        indice.limpiar()
     
     #===========================================================================
     # test_reservar_unico_turno
@@ -229,6 +270,70 @@ class ReservasTestSuite(TestCase):
         for turno in lista_turnos[:-1]:
             self.assertEqual(turno.estado, Turno.DISPONIBLE)
 
+    #===========================================================================
+    # test_turnos_invalidos
+    #===========================================================================
+    def test_turnos_invalidos(self):
+        """
+        Verifica que la excepcion informe todos los turnos invalidos de la
+        reserva y que la validacion consulte los turnos una sola vez.
+        """
+        afiliado = Afiliado.objects.all().first()
+        disponibles = list(Turno.objects.filter(estado=Turno.DISPONIBLE)[:3])
+        self.manager.crear_reserva(afiliado, '12345678', disponibles[:2])
+        inexistente = Turno(id=Turno.objects.order_by('-id').first().id + 1)
+        with CaptureQueriesContext(connection) as consultas:
+            with self.assertRaises(TurnoNotExistsException) as contexto:
+                self.manager.crear_reserva(afiliado, '12345678',
+                                           disponibles + [inexistente])
+        self.assertEqual(contexto.exception.more_info,
+                         {'inexistentes': [inexistente.id],
+                          'reservados': sorted(t.id for t in disponibles[:2])})
+        tabla = connection.ops.quote_name(Turno._meta.db_table)
+        self.assertEqual(len([q for q in consultas.captured_queries
+                              if 'FROM %s' % tabla in q['sql']]), 1)
+        with self.assertRaises(TurnoReservadoException) as contexto:
+            self.manager.crear_reserva(afiliado, '12345678', disponibles)
+        self.assertEqual(contexto.exception.more_info['reservados'],
+                         sorted(t.id for t in disponibles[:2]))
+
+    #===========================================================================
+    # test_reserva_cantidad_fija_de_consultas
+    #===========================================================================
+    def test_reserva_cantidad_fija_de_consultas(self):
+        """
+        Verifica que reservar muchos turnos cueste la misma cantidad de
+        consultas que reservar uno.
+        """
+        CANTIDAD = 20
+        afiliado = Afiliado.objects.all().first()
+        ee = EspecialistaEspecialidad.objects.all().first()
+        def crear_turnos(dias):
+            fecha = timezone.now() + timedelta(days=dias)
+            return [TurnoManager().crear_turno(fecha=fecha +
+                                               timedelta(minutes=15 * numero),
+                                               ee=ee)
+                    for numero in range(CANTIDAD)]
+        # savepoints, afiliado, reserva, turnos, UPDATE de estados, resumen
+        # del dia (3 consultas) y lineas; Bussiness ademas lee el afiliado
+        # y escribe el historial
+        turnos = crear_turnos(1)
+        with self.assertNumQueries(12):
+            self.manager.crear_reserva(afiliado, '12345678', turnos)
+        self.assertEqual(LineaDeReserva.objects.filter(turno__in=turnos,
+                                                       estado=Turno.RESERVADO)
+                         .count(), CANTIDAD)
+        turnos = crear_turnos(2)
+        with self.assertNumQueries(14):
+            b.reservarTurnos(afiliado.id, '12345678',
+                             [turno.id for turno in turnos])
+        self.assertEqual(HistorialTurno.objects.filter(turno__in=turnos,
+                                                       estadoNuevo=Turno.RESERVADO)
+                         .count(), CANTIDAD)
+        self.assertEqual(Turno.objects.filter(id__in=[t.id for t in turnos],
+                                              estado=Turno.RESERVADO).count(),
+                         CANTIDAD)
+
     #===========================================================================
     # test_fatiga
     #===========================================================================
@@ -417,7 +522,8 @@ class ReservasTestSuite(TestCase):
         fecha = timezone.now()
         ee = EspecialistaEspecialidad.objects.get(id=1)
         for i in listaTurnos:
-            Turno.objects.create(fecha=fecha,
+            # cada turno en un segundo distinto: (fecha, ee, sobreturno) es unico
+            Turno.objects.create(fecha=fecha + timedelta(seconds=i - 1000),
                                  estado=Turno.DISPONIBLE,
                                  sobreturno=False,
                                  consultorio=Consultorio.objects.get(id=1),
@@ -447,7 +553,8 @@ class ReservasTestSuite(TestCase):
         fecha = timezone.now()
         ee = EspecialistaEspecialidad.objects.get(id=1)
         for i in listaTurnos:
-            Turno.objects.create(fecha=fecha,
+            # cada turno en un segundo distinto: (fecha, ee, sobreturno) es unico
+            Turno.objects.create(fecha=fecha + timedelta(seconds=i - 1000),
                                  estado=Turno.DISPONIBLE,
                                  sobreturno=False,
                                  consultorio=Consultorio.objects.get(id=1),
@@ -485,6 +592,45 @@ class ReservasTestSuite(TestCase):
                              )
         test = b.getDiaTurnos(1)
         self.assertGreaterEqual(len(test), 1)
+
+    def testGetDiasTurnosEstados(self):
+        """
+        Verifica el estado de cada dia (X cancelado, C completo, S con
+        sobreturnos) y que se calcule con una sola consulta.
+        """
+        es = Especialidad.objects.get(id=1)
+        e = Especialista.objects.create(nombre='n', apellido='n', dni=1234)
+        ee = EspecialistaEspecialidad.objects.create(especialista=e,
+                                                     especialidad=es)
+        tz = timezone.get_current_timezone()
+        hoy = timezone.localtime(timezone.now()).date()
+        def crear(dias, hora, estado, sobreturno=False):
+            fecha = datetime.combine(hoy + timedelta(days=dias), time(hora))
+            return Turno.objects.create(fecha=timezone.make_aware(fecha, tz),
+                                        estado=estado, sobreturno=sobreturno,
+                                        ee=ee)
+        crear(1, 10, Turno.DISPONIBLE)
+        crear(2, 10, Turno.RESERVADO)
+        crear(2, 11, Turno.RESERVADO, sobreturno=True)
+        crear(3, 10, Turno.DISPONIBLE)
+        crear(3, 11, Turno.CANCELADO)
+        crear(4, 10, Turno.DISPONIBLE)
+        crear(4, 11, Turno.DISPONIBLE, sobreturno=True)
+        with self.assertNumQueries(1):
+            dias = b.getDiaTurnos(e.id)
+        self.assertEqual([dia['estado'] for dia in dias], [None, 'C', 'X', 'S'])
+        # las fechas son las mismas que devuelve QuerySet.datetimes
+        self.assertEqual([dia['fecha'] for dia in dias],
+                         list(Turno.objects.filter(ee=ee)
+                              .datetimes('fecha', 'day')))
+        # un dia completo sin sobreturnos los crea
+        Disponibilidad.objects.create(dia=(hoy + timedelta(days=5)).weekday(),
+                                      horaDesde="10:00", horaHasta="13:00",
+                                      ee=ee)
+        crear(5, 10, Turno.RESERVADO)
+        self.assertEqual(b.getDiaTurnos(e.id)[-1]['estado'], 'S')
+        self.assertTrue(Turno.objects.filter(ee=ee, sobreturno=True,
+                                             estado=Turno.DISPONIBLE).exists())
         
 class ConfirmarReservaTest:
     def testConfirmarReserva(self):
@@ -752,8 +898,8 @@ class CancelarTurnoTest(TestCase):
         # Creo los turnos
         turnos = b.crear_turnos_del_especialista(ee, 1)
         # Cambio la fecha a los turnos
-        for turno in turnos:
-            turno.fecha = fecha
+        for i, turno in enumerate(turnos):
+            turno.fecha = fecha + timedelta(seconds=i)
             turno.save()
         # Cancelo los turnos
         with self.assertRaises(CancelarTurnoException):
@@ -777,11 +923,153 @@ class CancelarTurnoTest(TestCase):
         reservas = list()
         for turno in turnos:
             reservas.append(b.reservarTurnos(1, '12345678', [turno.id]))
-        # Cancelo los turnos
-        cancelados = b.cancelar_turnos(ee.especialista.id, fecha)
+        # Cancelo los turnos: la cantidad de consultas no depende de la
+        # cantidad de turnos del dia (una de ellas busca las faltas de las
+        # lineas canceladas)
+        with self.assertNumQueries(9):
+            cancelados = b.cancelar_turnos(ee.especialista.id, fecha)
+            afiliados = set(reserva.afiliado.id for reserva in cancelados)
         self.assertEquals(len(reservas), len(cancelados))
+        self.assertEquals(afiliados, set([1]))
+        self.assertEquals(HistorialTurno.objects.filter(turno__ee=ee,
+                                                        estadoNuevo=Turno.CANCELADO)
+                          .count(), len(turnos))
         self.assertTrue(b._Bussiness__isCancelado(ee.id, fecha))
         
+#===============================================================================
+# CancelarTurnosRangoTestSuite
+#===============================================================================
+class CancelarTurnosRangoTestSuite(TestCase):
+    '''
+    Prueba la cancelacion de los turnos de un especialista entre dos fechas
+    '''
+    fixtures = ['test.json']
+    #===========================================================================
+    # setUp
+    #===========================================================================
+    def setUp(self):
+        indice.limpiar()
+        e = Especialista.objects.create(nombre='n', apellido='n', dni=1234)
+        self.ee = EspecialistaEspecialidad.objects.create(
+                            especialista=e,
+                            especialidad=Especialidad.objects.create(descripcion='e'))
+        for dia in range(7):
+            Disponibilidad.objects.create(dia=dia, horaDesde=time(8),
+                                          horaHasta=time(12), ee=self.ee)
+        b.crear_turnos_del_especialista(self.ee, 10)
+        self.hoy = dia_local(timezone.now())
+        self.service = ReservaTurnosService()
+
+    #===========================================================================
+    # reservar
+    #===========================================================================
+    def reservar(self, afiliado_id, dias):
+        'Reserva el primer turno disponible de cada dia indicado'
+        turnos = [Turno.objects.filter(ee=self.ee, estado=Turno.DISPONIBLE,
+                                       **filtro_dia('fecha', self.hoy +
+                                                    timedelta(days=dia)))
+                  .first().id for dia in dias]
+        b.reservarTurnos(afiliado_id, '12345678', turnos)
+        return turnos
+
+    #===========================================================================
+    # test_cancelar_rango
+    #===========================================================================
+    def test_cancelar_rango(self):
+        '''
+        Verifica que se cancelen los turnos y reservas del rango (y solo
+        esos), que se registre el historial y que se devuelvan los afiliados
+        agrupados para notificarlos.
+        '''
+        primero = self.reservar(1, [2, 3])
+        segundo = self.reservar(2, [4])
+        fuera = self.reservar(1, [8])
+        desde, hasta = self.hoy + timedelta(days=2), self.hoy + timedelta(days=5)
+        en_rango = Turno.objects.filter(ee=self.ee,
+                                        fecha__gte=rango_dia(desde)[0],
+                                        fecha__lt=rango_dia(hasta)[1])
+        cantidad = en_rango.count()
+        afiliados = self.service.cancelar_turnos_rango(self.ee, desde, hasta)
+        self.assertEqual(dict((afiliado.id, [l.turno.id for l in lineas])
+                              for afiliado, lineas in afiliados.items()),
+                         {1: primero, 2: segundo})
+        self.assertFalse(en_rango.exclude(estado=Turno.CANCELADO).exists())
+        self.assertEqual(LineaDeReserva.objects.filter(turno__in=primero + segundo,
+                                                       estado=Turno.CANCELADO)
+                         .count(), 3)
+        self.assertEqual(Turno.objects.get(id=fuera[0]).estado, Turno.RESERVADO)
+        self.assertFalse(Turno.objects.filter(ee=self.ee,
+                                              estado=Turno.CANCELADO)
+                         .exclude(id__in=en_rango).exists())
+        self.assertEqual(HistorialTurno.objects.filter(turno__in=en_rango,
+                                                       estadoNuevo=Turno.CANCELADO)
+                         .count(), cantidad)
+        self.assertEqual(resumen.verificar(), [])
+
+    #===========================================================================
+    # test_cantidad_de_consultas
+    #===========================================================================
+    def test_cantidad_de_consultas(self):
+        '''
+        Verifica que cancelar un dia o varios cueste la misma cantidad de
+        consultas.
+        '''
+        dia = self.hoy + timedelta(days=6)
+        with self.assertNumQueries(10):
+            self.service.cancelar_turnos_rango(self.ee, dia, dia)
+        with self.assertNumQueries(10):
+            self.service.cancelar_turnos_rango(self.ee,
+                                               self.hoy + timedelta(days=1),
+                                               self.hoy + timedelta(days=5))
+
+    #===========================================================================
+    # test_validaciones
+    #===========================================================================
+    def test_validaciones(self):
+        '''
+        Verifica que no se puedan cancelar rangos invertidos ni dias
+        anteriores al actual.
+        '''
+        with self.assertRaises(ValueError):
+            self.service.cancelar_turnos_rango(self.ee,
+                                               self.hoy + timedelta(days=2),
+                                               self.hoy + timedelta(days=1))
+        with self.assertRaises(CancelarTurnoException):
+            self.service.cancelar_turnos_rango(self.ee,
+                                               self.hoy - timedelta(days=1),
+                                               self.hoy)
+
+    #===========================================================================
+    # test_vista
+    #===========================================================================
+    def test_vista(self):
+        '''
+        Verifica que la vista cancele los turnos y muestre los afiliados a
+        notificar.
+        '''
+        self.reservar(1, [2])
+        user = User.objects.create_user('empleado')
+        user.is_superuser = True
+        user.save()
+        Empleado.objects.get_or_create(user=user, defaults={'dni': 1})
+        desde = self.hoy + timedelta(days=1)
+        request = RequestFactory().post('/cancelar/turnos/rango/',
+                    {'especialidad': self.ee.especialidad.id,
+                     'especialista': self.ee.especialista.id,
+                     'desde': desde.strftime('%Y-%m-%d'),
+                     'hasta': (desde + timedelta(days=2)).strftime('%Y-%m-%d')})
+        request.user = user
+        request._messages = CookieStorage(request)
+        response = views.cancelar_turnos_rango(request)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Romero', response.content)
+        self.assertFalse(Turno.objects.filter(ee=self.ee,
+                                              estado=Turno.RESERVADO).exists())
+        historial = HistorialTurno.objects.filter(turno__ee=self.ee,
+                                                  estadoNuevo=Turno.CANCELADO)
+        self.assertTrue(historial.exists())
+        self.assertFalse(historial.exclude(empleado__user=user).exists())
+
 #===============================================================================
 # CrearTurnoTestSuite
 #===============================================================================
@@ -978,6 +1266,51 @@ class CrearTurnoTestSuite(TestCase):
         for turno in creados:
             self.assertNotEqual(turno.ee.id, ee.id)
         
+    #===========================================================================
+    # test_un_ano_consultas
+    #===========================================================================
+    def test_un_ano_consultas(self):
+        """
+        Crea turnos a un año y verifica que la cantidad de consultas no
+        dependa de la cantidad de turnos creados (no se consulta ni se guarda
+        turno por turno).
+        """
+        DIAS = 365
+        fecha_inicio = timezone.now()
+        fecha_fin = fecha_inicio + timedelta(days=DIAS)
+        with CaptureQueriesContext(connection) as consultas:
+            turnos = self.manager.crear_turnos(fecha_inicio, fecha_fin)
+        logger.info("Creacion de %s turnos: %s consultas" %
+                    (len(turnos), len(consultas)))
+        self.assertGreater(len(turnos), 1)
+        self.assertLess(len(consultas), len(turnos) / 10)
+        # todos los turnos devueltos deben tener id para poder deshacerse
+        ids = [turno.id for turno in turnos]
+        self.assertNotIn(None, ids)
+        self.assertEqual(Turno.objects.filter(id__in=ids[:500]).count(),
+                         len(ids[:500]))
+
+    #===========================================================================
+    # test_crear_turnos_del_especialista_repetidos
+    #===========================================================================
+    def test_crear_turnos_del_especialista_repetidos(self):
+        """
+        Crea los turnos de un especialista dos veces. La segunda vez no debe
+        crear ningun turno y cada turno creado debe tener su historial.
+        """
+        ee = EspecialistaEspecialidad.objects.get(id=1)
+        creados = b.crear_turnos_del_especialista(ee, 7)
+        self.assertTrue(creados)
+        ids = [turno.id for turno in creados]
+        self.assertNotIn(None, ids)
+        self.assertEqual(HistorialTurno.objects.filter(turno__id__in=ids).count(),
+                         len(ids))
+        # la deteccion de repetidos no depende de la cantidad de turnos:
+        # disponibilidades, existentes y el savepoint de la transaccion
+        with self.assertNumQueries(4):
+            repetidos = b.crear_turnos_del_especialista(ee, 7)
+        self.assertEqual(repetidos, [])
+
 #      #==========================================================================
 #      # testCrearSobreturnos
 #      #==========================================================================
@@ -1088,6 +1421,23 @@ class ValidadoresTestSuite(TestCase):
 class ConsultaReservaTest(TestCase):
     """Esta clase agrupa las pruebas de consulta de reservas"""
     fixtures = ['test.json']
+    def testTurnosReservados(self):
+        '''Obtiene los turnos reservados de un afiliado con una sola consulta,
+        con los mismos datos que se leen de los modelos'''
+        afiliado_id = 1
+        b.reservarTurnos(afiliado_id, '12345678', [2, 3, 4])
+        with self.assertNumQueries(1):
+            reservados = b.get_turnos_reservados(afiliado_id)
+        esperados = [{'id': linea.id,
+                      'fecha_reserva': linea.reserva.fecha,
+                      'fecha_turno': linea.turno.fecha,
+                      'especialidad': linea.turno.ee.especialidad.descripcion,
+                      'especialista': linea.turno.ee.especialista.full_name(),
+                      'consultorio': linea.turno.consultorio.numero if linea.turno.consultorio else None}
+                     for linea in LineaDeReserva.objects.filter(reserva__afiliado__id=afiliado_id,
+                                                                estado=Turno.RESERVADO)]
+        self.assertEqual(len(reservados), 3)
+        self.assertEqual(sorted(reservados), sorted(esperados))
     def testSinReservas(self):
         '''Consulta las reservas sin que haya ninguna cargada.
         Debe devolver una lista vacia'''
@@ -1350,8 +1700,9 @@ class ServiceTestSuite(TestCase):
         FRECUENCIA = 1  # minutos
         # obtengo especialidad
         es = Especialidad.objects.all().first()
-        # obtengo especialista
-        e = Especialista.objects.all().first()
+        # creo un especialista (la combinacion especialista/especialidad es
+        # unica)
+        e = Especialista.objects.create(nombre='n', apellido='n', dni=1234)
         # creo asociacion entre especialista y especialidad y le seteo la 
         # frecuencia
         ee = (EspecialistaEspecialidad.objects
@@ -1674,4 +2025,1920 @@ class CommandTestSuite(TestCase):
         despues = Turno.objects.all().count()
         # verifico que despues haya la misma cantidad que antes
         self.assertEquals(despues, antes)
-        
\ No newline at end of file
+
+#===============================================================================
+# ConfiguracionTestSuite
+#===============================================================================
+class ConfiguracionTestSuite(TestCase):
+    '''
+    Prueba la cache de parametros de configuracion
+    '''
+    fixtures = ['test.json']
+    #===========================================================================
+    # test_una_sola_lectura
+    #===========================================================================
+    def test_una_sola_lectura(self):
+        '''
+        Verifica que la tabla Settings se lea una sola vez aunque se creen
+        varios objetos de negocio.
+        '''
+        configuracion.invalidar()
+        # la primera construccion lee la tabla completa
+        with self.assertNumQueries(1):
+            Bussiness()
+        misses = configuracion.misses
+        # las siguientes no deben consultar la base de datos
+        with self.assertNumQueries(0):
+            Bussiness()
+            TurnoManager()
+            ReservaTurnosService()
+        self.assertEqual(configuracion.misses, misses)
+        self.assertGreater(configuracion.estadisticas()['hits'], 0)
+
+    #===========================================================================
+    # test_invalidar_al_guardar
+    #===========================================================================
+    def test_invalidar_al_guardar(self):
+        '''
+        Verifica que al modificar o borrar un parametro se descarte la cache.
+        '''
+        Settings.objects.create(key='max_sobreturnos', value='5')
+        self.assertEqual(Bussiness().MAX_SOBRETURNOS, 5)
+        Settings.objects.filter(key='max_sobreturnos').delete()
+        # el borrado por queryset tambien dispara post_delete
+        self.assertEqual(Bussiness().MAX_SOBRETURNOS, 3)
+
+    #===========================================================================
+    # test_valor_invalido
+    #===========================================================================
+    def test_valor_invalido(self):
+        '''
+        Verifica que un valor no numerico devuelva el valor por defecto.
+        '''
+        Settings.objects.create(key='max_sobreturnos', value='muchos')
+        self.assertEqual(configuracion.get_int('max_sobreturnos', 3), 3)
+        self.assertEqual(configuracion.get('max_sobreturnos'), 'muchos')
+
+    #===========================================================================
+    # test_vigencia
+    #===========================================================================
+    def test_vigencia(self):
+        '''
+        Verifica que los cambios hechos por otro proceso, que no invalida la
+        cache de este, se lean al vencer la vigencia.
+        '''
+        cache = Configuracion(vigencia=0.2)
+        Settings.objects.create(key='max_sobreturnos', value='5')
+        self.assertEqual(cache.get_int('max_sobreturnos'), 5)
+        connection.cursor().execute("UPDATE turnos_settings SET value = '7' "
+                                    "WHERE key = 'max_sobreturnos'")
+        with self.assertNumQueries(0):
+            self.assertEqual(cache.get_int('max_sobreturnos'), 5)
+        sleep(0.25)
+        self.assertEqual(cache.get_int('max_sobreturnos'), 7)
+        self.assertEqual(cache.misses, 2)
+
+#===============================================================================
+# EsquemaTestSuite
+#===============================================================================
+class EsquemaTestSuite(TestCase):
+    '''
+    Prueba las restricciones de unicidad de los turnos
+    '''
+    fixtures = ['test.json']
+    #===========================================================================
+    # test_turno_repetido
+    #===========================================================================
+    def test_turno_repetido(self):
+        '''
+        Verifica que la base de datos rechace un turno repetido.
+        '''
+        turno = Turno.objects.all().first()
+        with self.assertRaises(IntegrityError):
+            with transaction.atomic():
+                Turno.objects.create(fecha=turno.fecha,
+                                     ee=turno.ee,
+                                     sobreturno=turno.sobreturno,
+                                     estado=Turno.DISPONIBLE)
+
+    #===========================================================================
+    # test_crear_turno_repetido
+    #===========================================================================
+    def test_crear_turno_repetido(self):
+        '''
+        Verifica que crear un turno existente no falle y devuelva None, sin
+        consultar antes si existe.
+        '''
+        manager = TurnoManager()
+        fecha = timezone.now()
+        ee = EspecialistaEspecialidad.objects.get(id=1)
+        self.assertTrue(manager.crear_turno(fecha, ee))
+        self.assertIsNone(manager.crear_turno(fecha, ee))
+        self.assertEqual(Turno.objects.filter(fecha=fecha, ee=ee).count(), 1)
+
+    #===========================================================================
+    # test_migrar_esquema
+    #===========================================================================
+    def test_migrar_esquema(self):
+        '''
+        Verifica que el comando migrar_esquema pueda ejecutarse mas de una
+        vez sin modificar los datos.
+        '''
+        antes = Turno.objects.count()
+        call_command('migrar_esquema', stdout=StringIO())
+        call_command('migrar_esquema', stdout=StringIO())
+        self.assertEqual(Turno.objects.count(), antes)
+
+    #===========================================================================
+    # test_unique_together_existente
+    #===========================================================================
+    def test_unique_together_existente(self):
+        '''
+        Verifica que migrar_esquema no duplique los indices unicos que syncdb
+        ya creo para unique_together, y que si falta el indice lo cree.
+        '''
+        comando = migrar_esquema.Command()
+        for modelo in comando.MODELOS:
+            self.assertFalse([sql for sql in comando.sentencias(modelo)
+                              if sql.startswith('CREATE UNIQUE INDEX')])
+        cursor = connection.cursor()
+        cursor.execute("CREATE TABLE prueba_unicos (a integer, b integer)")
+        self.assertEqual(comando.indices_unicos('prueba_unicos'), set())
+        cursor.execute("CREATE UNIQUE INDEX prueba_unicos_uniq "
+                       "ON prueba_unicos (b, a)")
+        self.assertEqual(comando.indices_unicos('prueba_unicos'),
+                         set([frozenset(['a', 'b'])]))
+
+    #===========================================================================
+    # plan
+    #===========================================================================
+    def plan(self, queryset):
+        'Devuelve el plan de ejecucion (EXPLAIN QUERY PLAN) de un queryset'
+        sql, params = queryset.query.sql_with_params()
+        cursor = connection.cursor()
+        cursor.execute("EXPLAIN QUERY PLAN " + sql, params)
+        return " ".join(fila[-1] for fila in cursor.fetchall())
+
+    #===========================================================================
+    # assertUsaIndice
+    #===========================================================================
+    def assertUsaIndice(self, queryset, modelo, campos):
+        '''Verifica que el plan de ejecucion del queryset use el indice
+        index_together del modelo formado por los campos'''
+        campos = [modelo._meta.get_field(campo) for campo in campos]
+        indice = connection.creation.sql_indexes_for_fields(modelo, campos,
+                                                             no_style())[0]
+        usados = re.findall(r"USING (?:COVERING )?INDEX (\S+)",
+                            self.plan(queryset))
+        self.assertTrue([nombre for nombre in usados if nombre in indice],
+                        "%s no usa el indice %s" % (usados, indice))
+
+    #===========================================================================
+    # test_plan_turnos_del_dia
+    #===========================================================================
+    @skipUnless(connection.vendor == 'sqlite', "EXPLAIN QUERY PLAN de sqlite")
+    def test_plan_turnos_del_dia(self):
+        '''
+        Verifica que buscar los turnos de un especialista en un dia use el
+        indice (ee, fecha, estado) en lugar de recorrer la tabla.
+        '''
+        turnos = Turno.objects.filter(ee=1, estado=Turno.DISPONIBLE,
+                                      **filtro_dia('fecha', timezone.now()))
+        self.assertUsaIndice(turnos, Turno, ('ee', 'fecha', 'estado'))
+
+    #===========================================================================
+    # test_plan_lineas_de_reserva
+    #===========================================================================
+    @skipUnless(connection.vendor == 'sqlite', "EXPLAIN QUERY PLAN de sqlite")
+    def test_plan_lineas_de_reserva(self):
+        '''
+        Verifica que buscar las lineas de una reserva por estado use el
+        indice (reserva, estado).
+        '''
+        lineas = LineaDeReserva.objects.filter(reserva=1,
+                                               estado=Turno.RESERVADO)
+        self.assertUsaIndice(lineas, LineaDeReserva, ('reserva', 'estado'))
+
+    #===========================================================================
+    # test_plan_paginar_reservas
+    #===========================================================================
+    @skipUnless(connection.vendor == 'sqlite', "EXPLAIN QUERY PLAN de sqlite")
+    def test_plan_paginar_reservas(self):
+        '''
+        Verifica que la pagina siguiente de la consulta de reservas recorra
+        desde el cursor el indice unico (fecha, ee, sobreturno) del turno.
+        '''
+        orden = ('-turno__fecha', '-reserva__fecha', '-id')
+        lineas = (b.consultar_reservas().order_by(*orden)
+                  .filter(seek(orden, [timezone.now(), timezone.now(), 1])))
+        plan = self.plan(lineas)
+        self.assertTrue(re.search(r"SEARCH (?:TABLE )?turnos_turno (?:AS \S+ )?"
+                                  r"USING (?:COVERING )?INDEX \S+ \(fecha[<>]",
+                                  plan), plan)
+
+    #===========================================================================
+    # test_plan_faltas
+    #===========================================================================
+    @skipUnless(connection.vendor == 'sqlite', "EXPLAIN QUERY PLAN de sqlite")
+    def test_plan_faltas(self):
+        '''
+        Verifica que contar las faltas de un afiliado use el indice
+        (afiliado, fecha) del registro de faltas.
+        '''
+        faltas = Falta.objects.filter(afiliado__id=1, fecha__gte=timezone.now())
+        self.assertUsaIndice(faltas, Falta, ('afiliado', 'fecha'))
+
+    #===========================================================================
+    # test_plan_afiliados
+    #===========================================================================
+    @skipUnless(connection.vendor == 'sqlite', "EXPLAIN QUERY PLAN de sqlite")
+    def test_plan_afiliados(self):
+        '''
+        Verifica que buscar un afiliado por dni use su indice y que la
+        busqueda por prefijo del apellido recorra el indice (apellido,
+        nombre) en orden, sin ordenar las filas encontradas.
+        '''
+        self.assertUsaIndice(Afiliado.objects.filter(dni=12345678), Afiliado,
+                             ('dni',))
+        apellidos = (Afiliado.objects.filter(apellido__gte='Ro',
+                                             apellido__lt='Rp')
+                     .order_by('apellido', 'nombre')[:10])
+        self.assertUsaIndice(apellidos, Afiliado, ('apellido', 'nombre'))
+        self.assertNotIn("TEMP B-TREE", self.plan(apellidos))
+
+    #===========================================================================
+    # test_filtro_dia
+    #===========================================================================
+    def test_filtro_dia(self):
+        '''
+        Verifica que el filtro por dia use la zona horaria actual: un turno a
+        las 23:30 hora local pertenece a ese dia aunque en UTC sea el dia
+        siguiente.
+        '''
+        tz = timezone.get_current_timezone()
+        dia = timezone.localtime(timezone.now()).date() + timedelta(days=1)
+        ee = EspecialistaEspecialidad.objects.get(id=1)
+        fecha = timezone.make_aware(datetime.combine(dia, time(23, 30)), tz)
+        turno = Turno.objects.create(fecha=fecha, ee=ee,
+                                     estado=Turno.DISPONIBLE)
+        self.assertIn(turno, Turno.objects.filter(**filtro_dia('fecha', dia)))
+        self.assertIn(turno, Turno.objects.filter(**filtro_dia('fecha',
+                                                               fecha)))
+        self.assertNotIn(turno, Turno.objects.filter(
+                            **filtro_dia('fecha', dia + timedelta(days=1))))
+
+#===============================================================================
+# ResumenTestSuite
+#===============================================================================
+class ResumenTestSuite(TestCase):
+    '''
+    Prueba el mantenimiento del resumen diario de turnos (DiaDisponibilidad)
+    '''
+    fixtures = ['test.json']
+    #===========================================================================
+    # setUp
+    #===========================================================================
+    def setUp(self):
+        self.ee = EspecialistaEspecialidad.objects.get(id=1)
+        self.fecha = timezone.now() + timedelta(days=1)
+        self.turnos = [Turno.objects.create(fecha=self.fecha +
+                                            timedelta(minutes=15 * i),
+                                            estado=Turno.DISPONIBLE,
+                                            ee=self.ee)
+                       for i in range(5)]
+
+    #===========================================================================
+    # assertActualizado
+    #===========================================================================
+    def assertActualizado(self):
+        'Verifica que el resumen coincida con los turnos'
+        self.assertEqual(resumen.verificar(), [])
+
+    #===========================================================================
+    # test_alta
+    #===========================================================================
+    def test_alta(self):
+        '''
+        Verifica que al crear turnos se sumen al resumen de su dia.
+        '''
+        self.assertActualizado()
+        dia = DiaDisponibilidad.objects.get(ee=self.ee,
+                                            fecha=dia_local(self.fecha))
+        self.assertEqual(dia.disponibles, 5)
+        self.assertEqual(dia.ultimo_turno, self.turnos[-1].fecha)
+
+    #===========================================================================
+    # test_transiciones
+    #===========================================================================
+    def test_transiciones(self):
+        '''
+        Verifica que el resumen se mantenga al reservar, confirmar, cancelar
+        y modificar reservas y al cancelar los turnos del dia.
+        '''
+        ids = [turno.id for turno in self.turnos]
+        b.reservarTurnos(1, '12345678', ids[:3])
+        self.assertActualizado()
+        lineas = LineaDeReserva.objects.filter(turno__id__in=ids)
+        b.cancelar_reserva(lineas[0].id)
+        self.assertActualizado()
+        b.modificar_linea_reserva(lineas[1], turno=Turno.objects.get(id=ids[4]))
+        self.assertActualizado()
+        b.cancelar_turnos(self.ee.id, self.fecha)
+        self.assertActualizado()
+        self.turnos[0].delete()
+        self.assertActualizado()
+
+    #===========================================================================
+    # test_generar
+    #===========================================================================
+    def test_generar(self):
+        '''
+        Verifica que la generacion masiva de turnos actualice el resumen.
+        '''
+        b.crear_turnos_del_especialista(self.ee, 14)
+        self.assertActualizado()
+
+    #===========================================================================
+    # test_verificar
+    #===========================================================================
+    def test_verificar(self):
+        '''
+        Verifica que el comando detecte un resumen desactualizado y que al
+        reconstruirlo vuelva a coincidir con los turnos.
+        '''
+        DiaDisponibilidad.objects.update(disponibles=0)
+        with self.assertRaises(CommandError):
+            call_command('reconstruir_disponibilidad', verificar=True,
+                         stdout=StringIO())
+        call_command('reconstruir_disponibilidad', stdout=StringIO())
+        call_command('reconstruir_disponibilidad', verificar=True,
+                     stdout=StringIO())
+
+    #===========================================================================
+    # test_sin_resumen
+    #===========================================================================
+    def test_sin_resumen(self):
+        '''
+        Verifica que en una base existente, con el resumen vacio, el
+        calendario se calcule a partir de los turnos y que migrar_esquema
+        genere el resumen.
+        '''
+        especialista_id = self.ee.especialista.id
+        esperado = b.getDiaTurnos(especialista_id)
+        dia = Calendario().dia(especialista_id, self.fecha)
+        self.assertEqual(dia['disponibles'], 5)
+        DiaDisponibilidad.objects.all().delete()
+        self.assertEqual(b.getDiaTurnos(especialista_id), esperado)
+        self.assertEqual(Calendario().dia(especialista_id, self.fecha), dia)
+        self.assertIsNone(Calendario().dia(especialista_id,
+                                           self.fecha + timedelta(days=1)))
+        call_command('migrar_esquema', stdout=StringIO())
+        self.assertActualizado()
+        self.assertEqual(b.getDiaTurnos(especialista_id), esperado)
+
+#===============================================================================
+# IndiceTestSuite
+#===============================================================================
+class IndiceTestSuite(TestCase):
+    '''
+    Prueba el indice en memoria de turnos disponibles
+    '''
+    fixtures = ['test.json']
+    DIAS = 28
+    #===========================================================================
+    # setUp
+    #===========================================================================
+    def setUp(self):
+        # los rollback de cada test no invalidan el indice compartido
+        indice.limpiar()
+        es = Especialidad.objects.get(id=1)
+        self.especialista = Especialista.objects.create(nombre='n',
+                                                        apellido='n', dni=1234)
+        self.ee = EspecialistaEspecialidad.objects.create(
+                            especialista=self.especialista, especialidad=es)
+        for dia in range(5):
+            Disponibilidad.objects.create(dia=dia, horaDesde="08:00",
+                                          horaHasta="18:00", ee=self.ee)
+        b.crear_turnos_del_especialista(self.ee, self.DIAS)
+        self.hoy = timezone.localtime(timezone.now()).date()
+
+    #===========================================================================
+    # libres_sql
+    #===========================================================================
+    def libres_sql(self, fecha):
+        'Turnos disponibles del dia consultados en la base de datos'
+        return list(Turno.objects
+                    .filter(ee__especialista__id=self.especialista.id,
+                            estado=Turno.DISPONIBLE, **filtro_dia('fecha', fecha))
+                    .order_by('fecha').values_list('id', flat=True))
+
+    #===========================================================================
+    # test_libres
+    #===========================================================================
+    def test_libres(self):
+        '''
+        Verifica que el indice devuelva los mismos turnos disponibles que la
+        base de datos y que una segunda consulta no acceda a la base.
+        '''
+        for numero in range(self.DIAS):
+            fecha = self.hoy + timedelta(days=numero)
+            indexado = indice.dia(self.especialista.id, fecha)
+            self.assertEqual(indexado.libres(), self.libres_sql(fecha))
+        with self.assertNumQueries(0):
+            indice.dia(self.especialista.id, self.hoy + timedelta(days=1))
+
+    #===========================================================================
+    # test_invalidar
+    #===========================================================================
+    def test_invalidar(self):
+        '''
+        Verifica que reservar o cancelar turnos actualice el indice.
+        '''
+        fecha = indice.primer_dia_libre(self.especialista.id, self.hoy,
+                                        self.DIAS)
+        libres = indice.dia(self.especialista.id, fecha).libres()
+        b.reservarTurnos(1, '12345678', libres[:2])
+        self.assertEqual(indice.dia(self.especialista.id, fecha).libres(),
+                         libres[2:])
+        b.cancelar_turnos(self.ee.id, fecha)
+        self.assertEqual(indice.dia(self.especialista.id, fecha).libres(), [])
+
+    #===========================================================================
+    # test_fuera_de_grilla
+    #===========================================================================
+    def test_fuera_de_grilla(self):
+        '''
+        Verifica que un dia con un turno fuera de los horarios de atencion no
+        se indexe y se siga consultando la base de datos.
+        '''
+        fecha = indice.primer_dia_libre(self.especialista.id, self.hoy,
+                                        self.DIAS)
+        tz = timezone.get_current_timezone()
+        turno = Turno.objects.create(ee=self.ee, estado=Turno.DISPONIBLE,
+                                     fecha=timezone.make_aware(
+                                       datetime.combine(fecha, time(8, 7)), tz))
+        self.assertIsNone(indice.dia(self.especialista.id, fecha))
+        disponibles = b.getTurnosDisponibles(self.especialista.id, fecha)
+        self.assertIn(turno.id, [d['id'] for d in disponibles])
+
+    #===========================================================================
+    # test_desactualizado
+    #===========================================================================
+    def test_desactualizado(self):
+        '''
+        Verifica que un turno reservado por otro proceso, que no invalida el
+        indice de este, no se ofrezca como disponible.
+        '''
+        fecha = indice.primer_dia_libre(self.especialista.id, self.hoy,
+                                        self.DIAS)
+        libres = indice.dia(self.especialista.id, fecha).libres()
+        connection.cursor().execute("UPDATE turnos_turno SET estado = %s "
+                                    "WHERE id = %s", [Turno.RESERVADO, libres[0]])
+        self.assertEqual(indice.dia(self.especialista.id, fecha).libres(), libres)
+        disponibles = b.getTurnosDisponibles(self.especialista.id, fecha)
+        self.assertEqual([d['id'] for d in disponibles], libres[1:])
+
+    #===========================================================================
+    # test_invalidar_sin_disponibilidad
+    #===========================================================================
+    def test_invalidar_sin_disponibilidad(self):
+        '''
+        Verifica que un turno de una especialidad del especialista sin
+        disponibilidades descarte el dia indexado.
+        '''
+        fecha = indice.primer_dia_libre(self.especialista.id, self.hoy,
+                                        self.DIAS)
+        self.assertIsNotNone(indice.dia(self.especialista.id, fecha))
+        otra = EspecialistaEspecialidad.objects.create(
+                            especialista=self.especialista,
+                            especialidad=Especialidad.objects.create(descripcion='o'))
+        tz = timezone.get_current_timezone()
+        Turno.objects.create(ee=otra, estado=Turno.DISPONIBLE,
+                             fecha=timezone.make_aware(
+                               datetime.combine(fecha, time(8)), tz))
+        self.assertIsNone(indice.dia(self.especialista.id, fecha))
+
+    #===========================================================================
+    # test_primer_dia_libre
+    #===========================================================================
+    def test_primer_dia_libre(self):
+        '''
+        Verifica que se saltee un dia sin turnos disponibles.
+        '''
+        fecha = indice.primer_dia_libre(self.especialista.id, self.hoy,
+                                        self.DIAS)
+        b.cancelar_turnos(self.ee.id, fecha)
+        siguiente = indice.primer_dia_libre(self.especialista.id, self.hoy,
+                                            self.DIAS)
+        self.assertGreater(siguiente, fecha)
+        self.assertTrue(self.libres_sql(siguiente))
+
+    #===========================================================================
+    # test_presupuesto
+    #===========================================================================
+    def test_presupuesto(self):
+        '''
+        Verifica que el indice no supere su presupuesto de memoria,
+        desalojando los dias usados hace mas tiempo.
+        '''
+        chico = IndiceDisponibilidad(presupuesto=4096)
+        for numero in range(self.DIAS):
+            chico.dia(self.especialista.id, self.hoy + timedelta(days=numero))
+        estadisticas = chico.cache.estadisticas()
+        self.assertLessEqual(estadisticas['ocupado'], 4096)
+        self.assertGreater(estadisticas['desalojos'], 0)
+
+    #===========================================================================
+    # test_benchmark
+    #===========================================================================
+    def test_benchmark(self):
+        '''
+        Compara el tiempo de obtener los turnos disponibles de cada dia con
+        el indice y con una consulta SQL. Los tiempos solo se registran en el
+        log: el test verifica que ambos resultados coincidan.
+        '''
+        REPETICIONES = 20
+        dias = [self.hoy + timedelta(days=numero)
+                for numero in range(self.DIAS)]
+        inicio = timezone.now()
+        for _ in range(REPETICIONES):
+            esperado = [self.libres_sql(fecha) for fecha in dias]
+        sql = timezone.now() - inicio
+        inicio = timezone.now()
+        for _ in range(REPETICIONES):
+            obtenido = [indice.dia(self.especialista.id, fecha).libres()
+                        for fecha in dias]
+        memoria = timezone.now() - inicio
+        logger.info("Turnos disponibles de %s dias x %s: SQL %s, indice %s" %
+                    (self.DIAS, REPETICIONES, sql, memoria))
+        self.assertEqual(obtenido, esperado)
+
+#===============================================================================
+# CacheLRUTestSuite
+#===============================================================================
+class CacheLRUTestSuite(TestCase):
+    '''
+    Prueba la cache LRU con presupuesto de memoria
+    '''
+    #===========================================================================
+    # test_desalojo
+    #===========================================================================
+    def test_desalojo(self):
+        '''
+        Verifica que se desaloje el valor usado hace mas tiempo.
+        '''
+        cache = CacheLRU(presupuesto=30)
+        cache.put('a', 1, 10)
+        cache.put('b', 2, 10)
+        cache.put('c', 3, 10)
+        cache.get('a')
+        cache.put('d', 4, 10)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), 1)
+        self.assertEqual(cache.get('d'), 4)
+        self.assertEqual(cache.estadisticas()['desalojos'], 1)
+
+    #===========================================================================
+    # test_vigencia
+    #===========================================================================
+    def test_vigencia(self):
+        '''
+        Verifica que los valores venzan.
+        '''
+        cache = CacheLRU(presupuesto=30, vigencia=-1)
+        cache.put('a', 1)
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.estadisticas()['ocupado'], 0)
+
+#===============================================================================
+# ProximosTurnosTestSuite
+#===============================================================================
+class ProximosTurnosTestSuite(TestCase):
+    '''
+    Prueba la busqueda de los proximos turnos disponibles de una especialidad
+    '''
+    DIAS = 14
+    ESPECIALISTAS = 5
+    #===========================================================================
+    # setUp
+    #===========================================================================
+    def setUp(self):
+        indice.limpiar()
+        self.especialidad = Especialidad.objects.create(descripcion='e')
+        for numero in range(self.ESPECIALISTAS):
+            e = Especialista.objects.create(nombre='n', apellido='n',
+                                            dni=1000 + numero)
+            ee = EspecialistaEspecialidad.objects.create(
+                                    especialista=e,
+                                    especialidad=self.especialidad,
+                                    frecuencia_turnos=10 + 5 * numero)
+            for dia in range(numero % 2, 7, 2):
+                Disponibilidad.objects.create(dia=dia,
+                                              horaDesde=time(8 + numero),
+                                              horaHasta=time(13 + numero),
+                                              ee=ee)
+            b.crear_turnos_del_especialista(ee, self.DIAS)
+
+    #===========================================================================
+    # esperados
+    #===========================================================================
+    def esperados(self, cantidad, condicion=lambda fecha: True):
+        'Resuelve la busqueda leyendo todos los turnos de la especialidad'
+        turnos = (Turno.objects.filter(ee__especialidad=self.especialidad,
+                                       estado=Turno.DISPONIBLE,
+                                       fecha__gte=timezone.now())
+                  .order_by('fecha', 'id').values_list('id', 'fecha'))
+        return [turno_id for turno_id, fecha in turnos
+                if condicion(timezone.localtime(fecha))][:cantidad]
+
+    #===========================================================================
+    # test_proximos
+    #===========================================================================
+    def test_proximos(self):
+        '''
+        Verifica que se devuelvan los primeros turnos disponibles de todos
+        los especialistas, en orden.
+        '''
+        proximos = b.get_proximos_turnos(self.especialidad.id, 20)
+        self.assertEqual([turno['id'] for turno in proximos],
+                         self.esperados(20))
+        self.assertGreater(len(set(t['especialista_id'] for t in proximos)), 1)
+
+    #===========================================================================
+    # test_filtros
+    #===========================================================================
+    def test_filtros(self):
+        '''
+        Verifica el filtro por dias de la semana y franja horaria.
+        '''
+        proximos = b.get_proximos_turnos(self.especialidad.id, 30, dias=[1, 4],
+                                         hora_desde=time(10, 30),
+                                         hora_hasta=time(12))
+        condicion = lambda fecha: (fecha.weekday() in (1, 4) and
+                                   time(10, 30) <= fecha.time() < time(12))
+        self.assertEqual([turno['id'] for turno in proximos],
+                         self.esperados(30, condicion))
+
+    #===========================================================================
+    # test_sin_turnos_en_horario
+    #===========================================================================
+    def test_sin_turnos_en_horario(self):
+        '''
+        Verifica que la franja horaria se filtre en la base de datos: si
+        ningun especialista tiene turnos en la franja se hace una sola
+        consulta por especialista.
+        '''
+        with self.assertNumQueries(self.ESPECIALISTAS + 1):
+            proximos = b.get_proximos_turnos(self.especialidad.id, 1,
+                                             hora_desde=time(22),
+                                             hora_hasta=time(23, 30))
+        self.assertEqual(proximos, [])
+
+    #===========================================================================
+    # test_horizonte
+    #===========================================================================
+    def test_horizonte(self):
+        '''
+        Verifica que la busqueda termine en la fecha indicada y que los
+        especialistas con muchos turnos se lean de a paginas.
+        '''
+        hasta = timezone.now() + timedelta(days=3)
+        proximos = BuscadorTurnos().proximos(self.especialidad.id, 1000,
+                                             hasta=hasta)
+        condicion = lambda fecha: fecha < hasta
+        self.assertEqual([turno['id'] for turno in proximos],
+                         self.esperados(1000, condicion))
+        todos = BuscadorTurnos().proximos(self.especialidad.id, 1000)
+        self.assertEqual([turno['id'] for turno in todos], self.esperados(1000))
+        self.assertGreater(len(todos), BuscadorTurnos.TAMANO_PAGINA)
+
+    #===========================================================================
+    # test_vista
+    #===========================================================================
+    def test_vista(self):
+        '''
+        Verifica la respuesta JSON de la vista y la validacion de parametros.
+        '''
+        url = '/json/turnos/especialidad/%s/proximos/' % self.especialidad.id
+        def get(parametros):
+            request = RequestFactory().get(url, parametros)
+            request.user = User.objects.create_user('u%s' % len(parametros))
+            return views.get_proximos_turnos(request, self.especialidad.id)
+        response = get({'cantidad': 5, 'dias': [0, 2], 'desde': '09:00'})
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.content)
+        self.assertEqual(len(data), 5)
+        # sin cantidad se devuelven 10
+        response = get({})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(json.loads(response.content)), 10)
+        response = get({'cantidad': 1000})
+        self.assertEqual(response.status_code, 400)
+
+    #===========================================================================
+    # test_benchmark
+    #===========================================================================
+    def test_benchmark(self):
+        '''
+        Mide la busqueda de los proximos turnos: debe hacer una consulta por
+        especialista (mas la de especialistas). El tiempo se registra en el log.
+        '''
+        REPETICIONES = 20
+        with self.assertNumQueries(self.ESPECIALISTAS + 1):
+            b.get_proximos_turnos(self.especialidad.id, 10)
+        inicio = timezone.now()
+        for _ in range(REPETICIONES):
+            b.get_proximos_turnos(self.especialidad.id, 10)
+        promedio = (timezone.now() - inicio) / REPETICIONES
+        logger.info("Proximos 10 turnos entre %s especialistas: %s" %
+                    (self.ESPECIALISTAS, promedio))
+
+#===============================================================================
+# ReservaConcurrenteTestSuite
+#===============================================================================
+class ReservaConcurrenteTestSuite(TransactionTestCase):
+    '''
+    Prueba que dos reservas concurrentes no puedan tomar el mismo turno.
+    Necesita una base de datos compartida entre hilos: con sqlite en memoria
+    cada conexion ve una base distinta, asi que la suite usa una base en un
+    archivo temporal solo mientras se ejecuta.
+    '''
+    HILOS = 8
+    INTENTOS = 40
+    TURNOS = 20
+    #===========================================================================
+    # setUpClass / tearDownClass
+    #===========================================================================
+    @classmethod
+    def setUpClass(cls):
+        super(ReservaConcurrenteTestSuite, cls).setUpClass()
+        cls.anteriores = None
+        if connection.settings_dict['NAME'] != ':memory:':
+            return
+        descriptor, cls.archivo = tempfile.mkstemp(suffix='.sqlite')
+        os.close(descriptor)
+        # la conexion en memoria del resto de las pruebas se conserva abierta;
+        # las conexiones nuevas (de este hilo y de los demas) usan el archivo
+        cls.anteriores = (connections.databases['default'], connections['default'])
+        datos = dict(connections.databases['default'], NAME=cls.archivo)
+        connections.databases['default'] = datos
+        del connections._connections.default
+        call_command('syncdb', interactive=False, verbosity=0,
+                     load_initial_data=False)
+
+    @classmethod
+    def tearDownClass(cls):
+        if cls.anteriores is not None:
+            connection.close()
+            connections.databases['default'] = cls.anteriores[0]
+            connections._connections.default = cls.anteriores[1]
+            os.remove(cls.archivo)
+        super(ReservaConcurrenteTestSuite, cls).tearDownClass()
+
+    #===========================================================================
+    # setUp
+    #===========================================================================
+    def setUp(self):
+        indice.limpiar()
+        e = Especialista.objects.create(nombre='n', apellido='n', dni=1)
+        ee = EspecialistaEspecialidad.objects.create(
+                especialista=e,
+                especialidad=Especialidad.objects.create(descripcion='e'))
+        consultorio = Consultorio.objects.create(numero=1,
+                                                 disponible=True)
+        self.afiliado = Afiliado.objects.create(nombre='a', apellido='a',
+                                                numero=1, dni=1)
+        self.turnos = [Turno.objects.create(fecha=timezone.now() +
+                                            timedelta(hours=numero + 1),
+                                            ee=ee, consultorio=consultorio,
+                                            estado=Turno.DISPONIBLE)
+                       for numero in range(self.TURNOS)]
+
+    #===========================================================================
+    # test_reservas_concurrentes
+    #===========================================================================
+    def test_reservas_concurrentes(self):
+        '''
+        Varios hilos reservan los mismos turnos en distinto orden: cada
+        turno debe quedar con una sola linea de reserva.
+        '''
+        resultados = {'ok': 0, 'reservado': 0, 'bloqueado': 0}
+        lock = threading.Lock()
+        def reservar(hilo):
+            try:
+                for intento in range(self.INTENTOS):
+                    turno = self.turnos[(hilo * 7 + intento) % self.TURNOS]
+                    try:
+                        ReservaManager().crear_reserva(self.afiliado, '1',
+                                                       [turno])
+                        resultado = 'ok'
+                    except TurnoReservadoException:
+                        resultado = 'reservado'
+                    except OperationalError:
+                        # sqlite: "database is locked"
+                        resultado = 'bloqueado'
+                    with lock:
+                        resultados[resultado] += 1
+            finally:
+                connection.close()
+        hilos = [threading.Thread(target=reservar, args=(numero,))
+                 for numero in range(self.HILOS)]
+        inicio = timezone.now()
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        duracion = (timezone.now() - inicio).total_seconds()
+        logger.info("Reservas concurrentes: %s en %.2f s (%.0f intentos/s)" %
+                    (resultados, duracion,
+                     self.HILOS * self.INTENTOS / duracion))
+        lineas = (LineaDeReserva.objects.filter(turno__in=self.turnos,
+                                                estado=Turno.RESERVADO)
+                  .values_list('turno', flat=True))
+        self.assertGreater(resultados['ok'], 0)
+        self.assertEqual(len(lineas), len(set(lineas)))
+        self.assertEqual(len(lineas), resultados['ok'])
+        self.assertEqual(Turno.objects.filter(id__in=[t.id for t in self.turnos],
+                                              estado=Turno.RESERVADO).count(),
+                         resultados['ok'])
+        self.assertEqual(Reserva.objects.filter(afiliado=self.afiliado).count(),
+                         resultados['ok'])
+
+#===============================================================================
+# AgendaEspecialistaTestSuite
+#===============================================================================
+class AgendaEspecialistaTestSuite(TestCase):
+    '''
+    Prueba la agenda diaria de reservas de un especialista
+    '''
+    RESERVAS = 60
+    #===========================================================================
+    # setUp
+    #===========================================================================
+    def setUp(self):
+        indice.limpiar()
+        e = Especialista.objects.create(nombre='n', apellido='n', dni=1)
+        self.ee = EspecialistaEspecialidad.objects.create(
+                            especialista=e,
+                            especialidad=Especialidad.objects.create(descripcion='e'),
+                            frecuencia_turnos=10)
+        self.dia = dia_local(timezone.now()) + timedelta(days=1)
+        # de 8 a 18 cada 10 minutos: 60 turnos
+        Disponibilidad.objects.create(dia=self.dia.weekday(),
+                                      horaDesde=time(8), horaHasta=time(18),
+                                      ee=self.ee)
+        b.crear_turnos_del_especialista(self.ee, 2)
+        self.afiliados = [Afiliado.objects.create(nombre='n%s' % numero,
+                                                  apellido='a%s' % numero,
+                                                  numero='9%s' % numero,
+                                                  dni=numero)
+                          for numero in range(3)]
+        turnos = Turno.objects.filter(ee=self.ee, **filtro_dia('fecha', self.dia))
+        for numero, turno in enumerate(turnos.order_by('fecha')):
+            b.reservarTurnos(self.afiliados[numero % 3].id, str(numero),
+                             [turno.id])
+
+    #===========================================================================
+    # test_vista
+    #===========================================================================
+    def test_vista(self):
+        '''
+        Verifica que la vista devuelva la agenda ordenada por horario con una
+        sola consulta.
+        '''
+        request = RequestFactory().get('/json/reservas/')
+        request.user = User.objects.create_user('u')
+        with self.assertNumQueries(1):
+            response = views.get_reservas_especialista(
+                                request, self.ee.especialidad.id,
+                                self.ee.especialista.id, self.dia.year,
+                                self.dia.month, self.dia.day)
+        data = json.loads(response.content)
+        self.assertEqual(len(data), self.RESERVAS)
+        self.assertEqual([reserva['fecha_turno'] for reserva in data],
+                         sorted(reserva['fecha_turno'] for reserva in data))
+        self.assertEqual([reserva['telefono'] for reserva in data],
+                         [str(numero) for numero in range(self.RESERVAS)])
+        self.assertEqual(data[1]['afiliado'], self.afiliados[1].full_name())
+        self.assertEqual(data[1]['numero'], self.afiliados[1].numero)
+
+    #===========================================================================
+    # test_benchmark
+    #===========================================================================
+    def test_benchmark(self):
+        '''
+        Mide la agenda de 60 reservas en una consulta. El tiempo se registra
+        en el log.
+        '''
+        REPETICIONES = 20
+        ee = EspecialistaEspecialidad.objects.filter(id=self.ee.id)
+        with self.assertNumQueries(1):
+            b.get_reserva_especialista(ee, self.dia)
+        inicio = timezone.now()
+        for _ in range(REPETICIONES):
+            agenda = b.get_reserva_especialista(ee, self.dia)
+        promedio = (timezone.now() - inicio) / REPETICIONES
+        logger.info("Agenda de %s reservas: %s" % (len(agenda), promedio))
+        self.assertEqual(len(agenda), self.RESERVAS)
+
+#===============================================================================
+# PaginarTestSuite
+#===============================================================================
+class PaginarTestSuite(TestCase):
+    '''
+    Prueba la paginacion por cursor de la consulta de reservas
+    '''
+    fixtures = ['test.json']
+    ORDEN = ('-turno__fecha', '-reserva__fecha', '-id')
+    #===========================================================================
+    # setUp
+    #===========================================================================
+    def setUp(self):
+        indice.limpiar()
+        # turnos con la misma fecha en distintos especialistas y reservas
+        # de varios turnos para que haya empates en los dos primeros campos
+        ees = list(EspecialistaEspecialidad.objects.all())
+        for numero in range(3):
+            e = Especialista.objects.create(nombre='n', apellido='n',
+                                            dni=5000 + numero)
+            ees.append(EspecialistaEspecialidad.objects.create(
+                                especialista=e,
+                                especialidad=ees[0].especialidad))
+        fecha = timezone.now() + timedelta(days=1)
+        for hora in range(6):
+            turnos = [TurnoManager().crear_turno(fecha + timedelta(hours=hora), ee)
+                      for ee in ees]
+            b.reservarTurnos(1, '1', [turno.id for turno in turnos[:2]])
+            b.reservarTurnos(2, '2', [turno.id for turno in turnos[2:]])
+        self.esperados = list(b.consultar_reservas().values_list('id', flat=True))
+        self.user = User.objects.create_user('u')
+        self.user.is_superuser = True
+        self.user.save()
+
+    #===========================================================================
+    # get
+    #===========================================================================
+    def get(self, **parametros):
+        'Consulta las reservas con la vista paginada'
+        parametros.setdefault('per_page', 5)
+        request = RequestFactory().get('/buscar/', parametros)
+        request.user = self.user
+        return views.consultar_reservas(request)
+
+    #===========================================================================
+    # test_recorrer
+    #===========================================================================
+    def test_recorrer(self):
+        '''
+        Verifica que recorrer las paginas hacia adelante y hacia atras
+        devuelva todas las reservas en orden, sin repetidos ni faltantes.
+        '''
+        paginas = []
+        cursor = None
+        while True:
+            pagina = self.get(cursor=cursor or '').context_data['object_list']
+            paginas.append([linea.id for linea in pagina])
+            cursor = pagina.siguiente
+            if cursor is None:
+                break
+        self.assertGreater(len(paginas), 3)
+        self.assertEqual(sum(paginas, []), self.esperados)
+        anteriores = [paginas[-1]]
+        cursor = pagina.anterior
+        while cursor is not None:
+            pagina = self.get(cursor=cursor).context_data['object_list']
+            anteriores.insert(0, [linea.id for linea in pagina])
+            cursor = pagina.anterior
+        self.assertEqual(anteriores, paginas)
+        self.assertFalse(pagina.has_previous)
+
+    #===========================================================================
+    # test_consultas
+    #===========================================================================
+    def test_consultas(self):
+        '''
+        Verifica que una pagina profunda se lea con una sola consulta (sin
+        COUNT) y que la vista se pueda mostrar.
+        '''
+        queryset = b.consultar_reservas()
+        pagina = PaginaCursor(queryset, self.ORDEN, 5)
+        for _ in range(3):
+            pagina = PaginaCursor(queryset, self.ORDEN, 5, pagina.siguiente)
+        with self.assertNumQueries(1):
+            pagina = PaginaCursor(queryset, self.ORDEN, 5, pagina.siguiente)
+            [linea.turno.ee.especialista.full_name() for linea in pagina]
+        self.assertEqual([linea.id for linea in pagina], self.esperados[20:25])
+        self.assertEqual(pagina.count, len(self.esperados))
+        # la cantidad total de resultados solo se consulta si se pide
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.get(cursor=pagina.siguiente).render()
+        self.assertFalse([c for c in consultas.captured_queries
+                          if 'COUNT(' in c['sql']])
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('resultados encontrados', response.content)
+        self.assertIn('contar=1', response.content)
+        response = self.get(cursor=pagina.siguiente, contar=1).render()
+        self.assertIn('%s resultados encontrados' % len(self.esperados),
+                      response.content)
+
+    #===========================================================================
+    # test_cursor_invalido
+    #===========================================================================
+    def test_cursor_invalido(self):
+        '''
+        Verifica que un cursor adulterado devuelva la primera pagina.
+        '''
+        pagina = self.get(cursor='adulterado').context_data['object_list']
+        self.assertEqual([linea.id for linea in pagina], self.esperados[:5])
+        self.assertFalse(pagina.has_previous)
+
+#===============================================================================
+# ExportarReservasTestSuite
+#===============================================================================
+class ExportarReservasTestSuite(TestCase):
+    '''
+    Prueba la exportacion de la consulta de reservas en CSV y JSON
+    '''
+    fixtures = ['test.json']
+    #===========================================================================
+    # setUp
+    #===========================================================================
+    def setUp(self):
+        self.crear_reservas(300, timezone.now() + timedelta(days=400))
+        self.esperados = list(b.consultar_reservas().values_list('id', flat=True))
+        self.user = User.objects.create_user('u')
+        self.user.is_superuser = True
+        self.user.save()
+
+    #===========================================================================
+    # crear_reservas
+    #===========================================================================
+    def crear_reservas(self, cantidad, fecha):
+        'Reserva cantidad turnos consecutivos desde fecha para un afiliado'
+        ee = EspecialistaEspecialidad.objects.get(id=1)
+        Turno.objects.bulk_create(
+                Turno(fecha=fecha + timedelta(minutes=15 * i), ee=ee,
+                      estado=Turno.RESERVADO)
+                for i in range(cantidad))
+        reserva = Reserva.objects.create(afiliado_id=3, telefono=u'4444-ñ')
+        turnos = Turno.objects.filter(fecha__gte=fecha).values_list('id', flat=True)
+        LineaDeReserva.objects.bulk_create(
+                LineaDeReserva(reserva=reserva, turno_id=turno_id,
+                               estado=Turno.RESERVADO)
+                for turno_id in turnos)
+
+    #===========================================================================
+    # get
+    #===========================================================================
+    def get(self, formato, **parametros):
+        'Exporta las reservas con la vista'
+        request = RequestFactory().get('/buscar/exportar/%s/' % formato, parametros)
+        request.user = self.user
+        return views.exportar_reservas(request, formato)
+
+    #===========================================================================
+    # test_csv
+    #===========================================================================
+    def test_csv(self):
+        '''
+        Verifica que el CSV tenga la cabecera y todas las reservas en el
+        orden de la consulta.
+        '''
+        response = self.get('csv')
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        filas = list(csv.reader(response.streaming_content))
+        self.assertEqual(filas[0][:2], ['id', 'fecha_turno'])
+        self.assertEqual([int(fila[0]) for fila in filas[1:]], self.esperados)
+        self.assertEqual(filas[1][5:7], ['Lopez, Otro duplicado', '000100020004'])
+        self.assertEqual(filas[1][7].decode('utf-8'), u'4444-ñ')
+
+    #===========================================================================
+    # test_ndjson
+    #===========================================================================
+    def test_ndjson(self):
+        '''
+        Verifica que se exporte un objeto JSON por linea, filtrando con los
+        parametros de la consulta.
+        '''
+        response = self.get('json', afiliado=36542356)
+        lineas = ''.join(response.streaming_content).splitlines()
+        esperados = list(b.consultar_reservas(afiliado=Afiliado.objects.get(id=1))
+                         .values_list('id', flat=True))
+        self.assertTrue(esperados)
+        self.assertEqual([json.loads(linea)['id'] for linea in lineas], esperados)
+        self.assertEqual(self.get('json', afiliado='x').status_code, 400)
+
+    #===========================================================================
+    # test_memoria_acotada
+    #===========================================================================
+    @skipUnless(os.path.exists('/proc/self/statm'), "memoria residente de linux")
+    def test_memoria_acotada(self):
+        '''
+        Verifica que la exportacion lea las reservas de a lotes y que la
+        memoria residente no crezca con las filas exportadas.
+        '''
+        self.crear_reservas(20000, timezone.now() + timedelta(days=800))
+        cantidad = b.consultar_reservas().count()
+        tamano = 500
+        with self.assertNumQueries(cantidad // tamano + 1):
+            exportadas = 0
+            for exportadas, _ in enumerate(reservas_ndjson(b.consultar_reservas(),
+                                                           tamano), 1):
+                if exportadas == tamano * 3:
+                    inicial = memoria_residente()
+            final = memoria_residente()
+        self.assertEqual(exportadas, cantidad)
+        # guardar las 20000 filas exportadas ocuparia varios MB
+        self.assertLess(final - inicial, 2 * 1024 * 1024)
+
+#===============================================================================
+# memoria_residente
+#===============================================================================
+def memoria_residente():
+    'Memoria residente del proceso en bytes'
+    with open('/proc/self/statm') as statm:
+        return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+
+#===============================================================================
+# FaltasTestSuite
+#===============================================================================
+class FaltasTestSuite(TestCase):
+    '''
+    Prueba el mantenimiento del registro de faltas de los afiliados (Falta)
+    '''
+    fixtures = ['test.json']
+    #===========================================================================
+    # setUp
+    #===========================================================================
+    def setUp(self):
+        ee = EspecialistaEspecialidad.objects.get(id=1)
+        fecha = timezone.now() + timedelta(days=1)
+        ids = [Turno.objects.create(fecha=fecha + timedelta(minutes=15 * i),
+                                    estado=Turno.DISPONIBLE, ee=ee).id
+               for i in range(b.AUSENTES_CANTIDAD + 1)]
+        self.reserva = b.reservarTurnos(1, '12345678', ids)
+        self.lineas = list(LineaDeReserva.objects.filter(reserva=self.reserva))
+        faltas.limpiar()
+
+    #===========================================================================
+    # ausentes
+    #===========================================================================
+    def ausentes(self, lineas, estado=Turno.AUSENTE):
+        'Guarda las lineas con el estado indicado'
+        for linea in lineas:
+            linea.estado = estado
+            linea.save()
+
+    #===========================================================================
+    # test_transiciones
+    #===========================================================================
+    def test_transiciones(self):
+        '''
+        Verifica que el registro agregue y quite faltas cuando las lineas
+        pasan a AUSENTE o dejan de estarlo.
+        '''
+        self.ausentes(self.lineas)
+        self.assertEqual(b.contarFaltas(1), len(self.lineas))
+        self.assertFalse(b.presentismoOK(1))
+        self.ausentes(self.lineas[:1], Turno.PRESENTE)
+        self.assertEqual(b.contarFaltas(1), len(self.lineas) - 1)
+        self.assertTrue(b.presentismoOK(1))
+        # guardar de nuevo una falta no la duplica
+        self.ausentes(LineaDeReserva.objects.filter(reserva=self.reserva,
+                                                    estado=Turno.AUSENTE))
+        self.assertEqual(faltas.verificar(), [])
+
+    #===========================================================================
+    # test_reserva_modificada
+    #===========================================================================
+    def test_reserva_modificada(self):
+        '''
+        Verifica que las faltas sigan a la fecha y al afiliado de su reserva
+        y que las faltas anteriores a AUSENTES_MESES no se cuenten.
+        '''
+        self.ausentes(self.lineas)
+        self.reserva.fecha = (timezone.now() +
+                              relativedelta(months=-b.AUSENTES_MESES, days=-1))
+        self.reserva.save()
+        self.assertEqual(b.contarFaltas(1), 0)
+        self.reserva.fecha = timezone.now()
+        self.reserva.afiliado_id = 2
+        self.reserva.save()
+        self.assertEqual(b.contarFaltas(1), 0)
+        self.assertEqual(b.contarFaltas(2), len(self.lineas))
+        self.assertEqual(faltas.verificar(), [])
+
+    #===========================================================================
+    # test_consultas
+    #===========================================================================
+    def test_consultas(self):
+        '''
+        Verifica que el presentismo se resuelva con una sola consulta al
+        registro de faltas.
+        '''
+        self.ausentes(self.lineas)
+        # solo se verifica una vez por proceso que el registro este generado
+        self.assertTrue(faltas.generada())
+        with self.assertNumQueries(1):
+            self.assertFalse(b.presentismoOK(1))
+
+    #===========================================================================
+    # test_presentismo_afiliados
+    #===========================================================================
+    def test_presentismo_afiliados(self):
+        '''
+        Verifica que el presentismo de varios afiliados se resuelva con una
+        consulta agrupada y coincida con el de cada afiliado.
+        '''
+        self.ausentes(self.lineas)
+        user = User.objects.create_user('u')
+        request = RequestFactory().get('/json/presentismo/',
+                                       {'afiliados': '1,2,3,99,1'})
+        request.user = user
+        self.assertTrue(faltas.generada())
+        with self.assertNumQueries(1):
+            response = views.presentismo_afiliados(request)
+        data = json.loads(response.content)
+        self.assertEqual(data, {'1': False, '2': True, '3': True, '99': True})
+        for afiliado_id in (1, 2, 3, 99):
+            self.assertEqual(data[str(afiliado_id)], b.presentismoOK(afiliado_id))
+        for afiliados in ('', '1,x', ','.join(map(str, range(501)))):
+            request = RequestFactory().get('/json/presentismo/',
+                                           {'afiliados': afiliados})
+            request.user = user
+            self.assertEqual(views.presentismo_afiliados(request).status_code, 400)
+
+    #===========================================================================
+    # test_verificar
+    #===========================================================================
+    def test_verificar(self):
+        '''
+        Verifica que el comando detecte faltas cambiadas con update() y que
+        al reconstruir el registro vuelva a coincidir con las lineas.
+        '''
+        self.ausentes(self.lineas[:1])
+        LineaDeReserva.objects.filter(reserva=self.reserva).update(
+                                                        estado=Turno.AUSENTE)
+        self.assertEqual(faltas.verificar(), [1])
+        with self.assertRaises(CommandError):
+            call_command('reconstruir_faltas', verificar=True,
+                         stdout=StringIO())
+        call_command('reconstruir_faltas', stdout=StringIO())
+        call_command('reconstruir_faltas', verificar=True, stdout=StringIO())
+        self.assertEqual(b.contarFaltas(1), len(self.lineas))
+
+    #===========================================================================
+    # test_sin_generar
+    #===========================================================================
+    def test_sin_generar(self):
+        '''
+        Verifica que con el registro vacio de una base existente las faltas
+        se cuenten sobre las lineas de reserva, y que migrar_esquema lo
+        genere.
+        '''
+        LineaDeReserva.objects.filter(reserva=self.reserva).update(
+                                                        estado=Turno.AUSENTE)
+        self.assertFalse(Falta.objects.exists())
+        self.assertEqual(b.contarFaltas(1), len(self.lineas))
+        self.assertFalse(b.presentismoOK(1))
+        self.assertEqual(b.presentismo_afiliados([1, 2]), {1: False, 2: True})
+        call_command('migrar_esquema', stdout=StringIO())
+        self.assertEqual(Falta.objects.count(), len(self.lineas))
+        self.assertTrue(faltas.generada())
+        self.assertEqual(b.contarFaltas(1), len(self.lineas))
+
+    #===========================================================================
+    # test_actualizar_lineas
+    #===========================================================================
+    def test_actualizar_lineas(self):
+        '''
+        Verifica que los cambios de estado en lote, como cancelar los turnos
+        de un dia, mantengan el registro.
+        '''
+        lineas = LineaDeReserva.objects.filter(reserva=self.reserva)
+        self.assertEqual(faltas.actualizar_lineas(lineas, Turno.AUSENTE),
+                         len(self.lineas))
+        self.assertEqual(faltas.verificar(), [])
+        self.assertEqual(b.contarFaltas(1), len(self.lineas))
+        self.ausentes(lineas[:1], Turno.PRESENTE)
+        self.assertEqual(b.contarFaltas(1), len(self.lineas) - 1)
+        faltas.actualizar_lineas(lineas, Turno.AUSENTE)
+        self.assertEqual(faltas.verificar(), [])
+        b.cancelar_turnos(self.lineas[0].turno.ee, self.lineas[0].turno.fecha)
+        self.assertEqual(faltas.verificar(), [])
+        self.assertEqual(b.contarFaltas(1), 0)
+
+#===============================================================================
+# DirectorioTestSuite
+#===============================================================================
+class DirectorioTestSuite(TestCase):
+    '''
+    Prueba la busqueda de afiliados en el directorio externo con el servidor
+    falso
+    '''
+    fixtures = ['test.json']
+    TIMEOUT = 0.2
+    #===========================================================================
+    # setUp
+    #===========================================================================
+    def setUp(self):
+        cache_afiliados.limpiar()
+        self.servidor = ServidorDirectorioFalso([
+                {'numero': '000100020003', 'dni': 36542356,
+                 'nombre': 'Yonatan', 'apellido': 'Romero'},
+                {'numero': '000100029999', 'dni': 40000000,
+                 'nombre': 'Solo', 'apellido': 'Externo'}]).iniciar()
+        self.addCleanup(self.servidor.detener)
+        self.cliente = ClienteHTTP(self.servidor.url, timeout=self.TIMEOUT,
+                                   conexiones=2, fallas=3, espera=0.3)
+        self.addCleanup(self.cliente.cerrar)
+        self.addCleanup(directorio.configurar,
+                        directorio.configurar(self.cliente))
+
+    #===========================================================================
+    # test_buscar
+    #===========================================================================
+    def test_buscar(self):
+        '''
+        Verifica que los afiliados del directorio lleven su id local, que
+        los nuevos se agreguen a la base local y que las consultas
+        reutilicen la conexion.
+        '''
+        data = b.getAfiliados('numero', '000100020003')
+        self.assertEqual([(item['id'], item['apellido']) for item in data],
+                         [(1, 'Romero')])
+        data = b.getAfiliados('dni', '40000000')
+        nuevo = Afiliado.objects.get(numero='000100029999')
+        self.assertEqual([(item['id'], item['apellido']) for item in data],
+                         [(nuevo.id, 'Externo')])
+        for _ in range(20):
+            self.cliente.buscar('numero', '000100020003')
+        self.assertEqual(self.servidor.consultas, 22)
+        self.assertEqual(self.servidor.conexiones, 1)
+
+    #===========================================================================
+    # test_no_encontrado
+    #===========================================================================
+    def test_no_encontrado(self):
+        '''
+        Verifica que si el directorio no tiene al afiliado, o responde con
+        error, se busque en la base local.
+        '''
+        data = b.getAfiliados('numero', '000100020004')
+        self.assertEqual([item['apellido'] for item in data], ['Lopez'])
+        self.servidor.estado = 500
+        data = b.getAfiliados('dni', '36542356')
+        self.assertEqual([item['id'] for item in data], [1])
+        self.assertEqual(self.cliente.errores, 1)
+        # los ids locales no se consultan en el directorio
+        self.assertEqual(b.getAfiliados('id', 2)[0]['apellido'], 'Perez')
+        self.assertEqual(self.servidor.consultas, 2)
+
+    #===========================================================================
+    # test_circuito
+    #===========================================================================
+    def test_circuito(self):
+        '''
+        Verifica que con el directorio lento cada busqueda espere como mucho
+        el timeout, que despues de 3 fallas el circuito se abra y se use la
+        base local sin esperar, y que se cierre cuando el directorio
+        vuelve a responder.
+        '''
+        self.servidor.demora = 1
+        demoras = []
+        for _ in range(10):
+            cache_afiliados.limpiar()
+            inicio = timezone.now()
+            data = b.getAfiliados('numero', '000100020003')
+            demoras.append((timezone.now() - inicio).total_seconds())
+            self.assertEqual([item['id'] for item in data], [1])
+        self.assertEqual(self.cliente.estadisticas(),
+                         {'consultas': 3, 'errores': 3, 'rechazadas': 7,
+                          'circuito': 'abierto'})
+        self.assertTrue(all(demora < self.TIMEOUT + 0.1 for demora in demoras[:3]),
+                        demoras)
+        self.assertTrue(all(demora < 0.05 for demora in demoras[3:]), demoras)
+        self.servidor.demora = 0
+        sleep(0.3)
+        self.assertEqual(b.getAfiliados('dni', '40000000')[0]['apellido'],
+                         'Externo')
+        self.assertEqual(self.cliente.interruptor.estado, 'cerrado')
+
+    #===========================================================================
+    # test_plazo_reintento
+    #===========================================================================
+    def test_plazo_reintento(self):
+        '''
+        Verifica que si una conexion del pool se cierra sin responder la
+        consulta se reintente con una conexion nueva, y que el reintento
+        espere solo lo que queda del timeout.
+        '''
+        self.assertTrue(self.cliente.buscar('numero', '000100020003'))
+        self.servidor.descartar = 1
+        self.assertTrue(self.cliente.buscar('numero', '000100020003'))
+        self.assertEqual((self.servidor.consultas, self.servidor.conexiones),
+                         (3, 2))
+        self.servidor.descartar = 1
+        self.servidor.demora = self.TIMEOUT * 0.75
+        inicio = timezone.now()
+        self.assertIsNone(self.cliente.buscar('numero', '000100020003'))
+        demora = (timezone.now() - inicio).total_seconds()
+        # sin plazo el reintento esperaria otro timeout completo
+        self.assertLess(demora, self.TIMEOUT + 0.1)
+        self.assertEqual(self.cliente.errores, 1)
+
+    #===========================================================================
+    # test_concurrencia
+    #===========================================================================
+    def test_concurrencia(self):
+        '''
+        Verifica que como mucho 2 consultas esperen al directorio a la vez y
+        que el resto se rechace enseguida.
+        '''
+        self.servidor.demora = 0.1
+        resultados = []
+        def buscar():
+            resultados.append(self.cliente.buscar('numero', '000100020003'))
+        hilos = [threading.Thread(target=buscar) for _ in range(6)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        self.assertEqual(len([data for data in resultados if data]), 2)
+        self.assertEqual(self.cliente.rechazadas, 4)
+        self.assertEqual(self.servidor.consultas, 2)
+
+    #===========================================================================
+    # test_crear
+    #===========================================================================
+    def test_crear(self):
+        '''
+        Verifica la creacion del cliente a partir de la configuracion.
+        '''
+        self.assertIsNone(directorio.crear({}).buscar('numero', '1'))
+        cliente = directorio.crear({'URL': self.servidor.url, 'TIMEOUT': 1})
+        self.assertIsInstance(cliente, ClienteHTTP)
+        self.assertEqual(cliente.timeout, 1)
+        cliente = directorio.crear({
+                    'CLIENTE': 'turnos.negocio.directorio.DirectorioAfiliados'})
+        self.assertEqual(type(cliente), DirectorioAfiliados)
+
+#===============================================================================
+# CacheAfiliadosTestSuite
+#===============================================================================
+class CacheAfiliadosTestSuite(TestCase):
+    '''
+    Prueba la cache de busquedas de afiliados y el guardado en la base
+    local de los afiliados del directorio externo
+    '''
+    fixtures = ['test.json']
+    #===========================================================================
+    # setUp
+    #===========================================================================
+    def setUp(self):
+        cache_afiliados.limpiar()
+        self.llamadas = []
+
+    #===========================================================================
+    # buscar
+    #===========================================================================
+    def buscar(self, parametro, valor):
+        'Busqueda de origen que registra sus llamadas'
+        self.llamadas.append((parametro, valor))
+        return [{'numero': valor}] if valor != 'inexistente' else []
+
+    #===========================================================================
+    # test_read_through
+    #===========================================================================
+    def test_read_through(self):
+        '''
+        Verifica que una busqueda repetida se resuelva desde la cache sin
+        consultas y que se informen el hit ratio y la latencia.
+        '''
+        anteriores = cache_afiliados.estadisticas()
+        b.getAfiliados('numero', '000100020003')
+        with self.assertNumQueries(0):
+            for _ in range(4):
+                data = b.getAfiliados('numero', '000100020003')
+        self.assertEqual([item['apellido'] for item in data], ['Romero'])
+        # las copias devueltas no modifican la cache
+        data[0]['apellido'] = 'Otro'
+        self.assertEqual(b.getAfiliados('numero', '000100020003')[0]['apellido'],
+                         'Romero')
+        estadisticas = cache_afiliados.estadisticas()
+        self.assertEqual((estadisticas['hits'] - anteriores['hits'],
+                          estadisticas['misses'] - anteriores['misses']), (5, 1))
+        self.assertEqual(estadisticas['hit_ratio'],
+                         float(estadisticas['hits']) /
+                         (estadisticas['hits'] + estadisticas['misses']))
+        self.assertIn('latencia_hits_ms', estadisticas)
+        self.assertIn('latencia_misses_ms', estadisticas)
+        logger.info("Cache de afiliados: %s" % estadisticas)
+
+    #===========================================================================
+    # test_vencimiento
+    #===========================================================================
+    def test_vencimiento(self):
+        '''
+        Verifica que las busquedas sin resultados se guarden y venzan antes
+        que las busquedas con resultados, y el desalojo LRU.
+        '''
+        cache = CacheAfiliados(presupuesto=2 * CacheAfiliados.TAMANO_AFILIADO,
+                               vigencia=0.4, vigencia_negativa=0.1)
+        for valor in ('1', 'inexistente', '1', 'inexistente'):
+            cache.buscar('numero', valor, self.buscar)
+        self.assertEqual(len(self.llamadas), 2)
+        self.assertEqual(cache.estadisticas()['negativos'], 1)
+        sleep(0.2)
+        for valor in ('1', 'inexistente'):
+            cache.buscar('numero', valor, self.buscar)
+        self.assertEqual(self.llamadas[2:], [('numero', 'inexistente')])
+        # '3' desaloja a '1', el menos usado, y '1' a '2'
+        for valor in ('2', '3', '1'):
+            cache.buscar('numero', valor, self.buscar)
+        self.assertEqual(self.llamadas[-1], ('numero', '1'))
+        self.assertEqual(cache.estadisticas()['desalojos'], 2)
+
+    #===========================================================================
+    # test_normalizar
+    #===========================================================================
+    def test_normalizar(self):
+        '''
+        Verifica que los valores con espacios compartan la busqueda guardada
+        y que se busquen sin los espacios.
+        '''
+        cache = CacheAfiliados()
+        for valor in (' 123', '123 ', 123):
+            self.assertEqual(cache.buscar('numero', valor, self.buscar),
+                             [{'numero': u'123'}])
+        self.assertEqual(self.llamadas, [('numero', u'123')])
+        self.assertEqual(b.getAfiliados('numero', ' 000100020003 ')[0]['apellido'],
+                         'Romero')
+
+    #===========================================================================
+    # test_invalidar
+    #===========================================================================
+    def test_invalidar(self):
+        '''
+        Verifica que guardar un afiliado descarte las busquedas guardadas,
+        incluidas las que no tenian resultados.
+        '''
+        self.assertEqual(b.getAfiliados('numero', '000100029999'), [])
+        Afiliado.objects.create(numero='000100029999', dni=1, nombre='Nuevo',
+                                apellido='Afiliado')
+        self.assertEqual([item['nombre'] for item
+                          in b.getAfiliados('numero', '000100029999')], ['Nuevo'])
+
+    #===========================================================================
+    # test_guardar_afiliados
+    #===========================================================================
+    def test_guardar_afiliados(self):
+        '''
+        Verifica que los afiliados del directorio se agreguen o actualicen
+        por numero en la base local y reciban su id.
+        '''
+        afiliados = [{'numero': u'000100020033', 'dni': 12345678,
+                      'nombre': u'Corregido', 'apellido': u'Perez'},
+                     {'numero': u'000100020004', 'dni': 12345678,
+                      'nombre': u'Otro duplicado', 'apellido': u'Lopez'}]
+        afiliados += [{'numero': u'00019%07d' % i, 'dni': 30000000 + i,
+                       'nombre': u'Nuevo', 'apellido': u'Afiliado'}
+                      for i in range(50)]
+        cantidad = Afiliado.objects.count()
+        self.assertEqual(AfiliadoManager().guardar_afiliados(afiliados), 51)
+        self.assertEqual(Afiliado.objects.count(), cantidad + 50)
+        self.assertEqual(Afiliado.objects.get(id=2).nombre, 'Corregido')
+        self.assertEqual(afiliados[1]['id'], 3)
+        self.assertEqual(dict((afiliado['numero'], afiliado['id'])
+                              for afiliado in afiliados),
+                         dict(Afiliado.objects.filter(nombre__in=('Corregido',
+                                                                  'Otro duplicado',
+                                                                  'Nuevo'))
+                              .values_list('numero', 'id')))
+        # guardarlos de nuevo no modifica nada
+        self.assertEqual(AfiliadoManager().guardar_afiliados(afiliados), 0)
+
+#===============================================================================
+# ImportarAfiliadosTestSuite
+#===============================================================================
+class ImportarAfiliadosTestSuite(TestCase):
+    '''
+    Prueba el comando que importa el padron de afiliados
+    '''
+    fixtures = ['test.json']
+    #===========================================================================
+    # importar
+    #===========================================================================
+    def importar(self, contenido, **opciones):
+        '''Importa un padron con el contenido indicado y devuelve lo que
+        escribio el comando (salida, errores)'''
+        with tempfile.NamedTemporaryFile(suffix='.txt') as archivo:
+            archivo.write(contenido)
+            archivo.flush()
+            salida, errores = StringIO(), StringIO()
+            call_command('importar_afiliados', archivo.name, stdout=salida,
+                         stderr=errores, **opciones)
+        return salida.getvalue(), errores.getvalue()
+
+    #===========================================================================
+    # test_csv
+    #===========================================================================
+    def test_csv(self):
+        '''
+        Verifica que se agreguen los numeros nuevos, se actualicen los
+        existentes y se omitan las filas invalidas, guardando por lotes.
+        '''
+        filas = ['apellido;nombre;numero;dni',
+                 # existente con el nombre cambiado y un duplicado de dni
+                 'Perez;Corregido;000100020033;12345678',
+                 'Nu\xc3\xb1ez;Otro DNI repetido;000200000000;12345678',
+                 'Sin;Dni;000200000001;',
+                 'Dni;Invalido;000200000002;12a']
+        filas += ['Apellido%s;Nombre;0003%08d;%s' % (i, i, 20000000 + i)
+                  for i in range(1200)]
+        with CaptureQueriesContext(connection) as consultas:
+            salida, errores = self.importar('\n'.join(filas), delimitador=';',
+                                            lote=500, progreso=1000)
+        self.assertEqual(Afiliado.objects.get(numero='000100020033').nombre,
+                         'Corregido')
+        self.assertEqual(Afiliado.objects.get(numero='000200000000').apellido,
+                         u'Nu\xf1ez')
+        self.assertEqual(Afiliado.objects.filter(numero__startswith='0003').count(),
+                         1200)
+        self.assertFalse(Afiliado.objects.filter(numero__in=('000200000001',
+                                                             '000200000002')))
+        self.assertIn("Afiliados nuevos: 1201", salida)
+        self.assertIn("Afiliados modificados: 1", salida)
+        self.assertIn("Filas invalidas: 2", salida)
+        self.assertIn("DNI compartidos por mas de un afiliado: 1", salida)
+        self.assertIn("1000 filas procesadas", salida)
+        self.assertRegexpMatches(salida, r"\(\d+ filas/s\)")
+        self.assertIn("Linea 4: falta dni", errores)
+        self.assertIn("Linea 5: dni invalido", errores)
+        # pocas consultas por lote, no por fila
+        self.assertLess(len(consultas), 40)
+        # importarlo de nuevo no modifica nada
+        salida, _ = self.importar('\n'.join(filas), delimitador=';')
+        self.assertIn("Afiliados nuevos: 0", salida)
+        self.assertIn("Afiliados modificados: 0", salida)
+
+    #===========================================================================
+    # test_fijo
+    #===========================================================================
+    def test_fijo(self):
+        '''
+        Verifica la importacion de un padron de ancho fijo en latin-1.
+        '''
+        filas = ['%-13s%-10s%-50s%-50s' % valores for valores in
+                 (('000200000010', '30000000', 'Mu\xf1oz', 'Ana'),
+                  ('000200000011', '30000001', 'Gomez', 'Luis'))]
+        salida, _ = self.importar('\r\n'.join(filas) + '\r\n', formato='fijo',
+                                  encoding='latin-1')
+        self.assertIn("Afiliados nuevos: 2", salida)
+        afiliado = Afiliado.objects.get(numero='000200000010')
+        self.assertEqual((afiliado.dni, afiliado.apellido, afiliado.nombre),
+                         (30000000, u'Mu\xf1oz', 'Ana'))
+        with self.assertRaises(CommandError):
+            self.importar('x', formato='fijo', columnas='numero:13,dni:10')
+        with self.assertRaises(CommandError):
+            self.importar('numero,dni\n1,2')
+
+#===============================================================================
+# SugerirAfiliadosTestSuite
+#===============================================================================
+class SugerirAfiliadosTestSuite(TestCase):
+    '''
+    Prueba la busqueda de afiliados para autocompletar
+    '''
+    fixtures = ['test.json']
+    #===========================================================================
+    # setUp
+    #===========================================================================
+    def setUp(self):
+        cache_afiliados.limpiar()
+        self.manager = AfiliadoManager()
+        Afiliado.objects.bulk_create([
+                Afiliado(numero='000300000001', dni=20000001,
+                         apellido='Rodriguez', nombre='Ana'),
+                Afiliado(numero='000300000002', dni=20000002,
+                         apellido='RODRIGUEZ', nombre='LUIS'),
+                Afiliado(numero='000300000003', dni=20000003,
+                         apellido='Rodriguez', nombre='Juan Carlos'),
+                Afiliado(numero='000300000004', dni=20000004,
+                         apellido='Rojas', nombre='Maria')])
+
+    #===========================================================================
+    # sugerir
+    #===========================================================================
+    def sugerir(self, texto, cantidad=10):
+        'Devuelve los numeros de los afiliados sugeridos'
+        return [afiliado['numero'] for afiliado
+                in self.manager.sugerir_afiliados(texto, cantidad)]
+
+    #===========================================================================
+    # test_apellido
+    #===========================================================================
+    def test_apellido(self):
+        '''
+        Verifica que se busque el prefijo del apellido sin distinguir como
+        se escribio, ordenado por apellido y nombre y hasta la cantidad
+        indicada.
+        '''
+        esperados = ['000300000002', '000300000001', '000300000003',
+                     '000300000004', '000100020003']
+        self.assertEqual(self.sugerir(u'ro'), esperados)
+        self.assertEqual(self.sugerir(u'RO'), esperados)
+        self.assertEqual(self.sugerir(u'ro', 2), esperados[:2])
+        self.assertEqual(self.sugerir(u'rodriguez, j'), ['000300000003'])
+        self.assertEqual(self.sugerir(u'Rojas,'), ['000300000004'])
+        self.assertEqual(self.sugerir(u'Rz'), [])
+        afiliado = self.manager.sugerir_afiliados(u'Rojas')[0]
+        self.assertEqual(afiliado, {'id': afiliado['id'], 'numero': '000300000004',
+                                    'dni': 20000004, 'apellido': 'Rojas',
+                                    'nombre': 'Maria'})
+
+    #===========================================================================
+    # test_numero_dni
+    #===========================================================================
+    def test_numero_dni(self):
+        '''
+        Verifica que un texto numerico busque el prefijo del numero de
+        afiliado y el dni exacto.
+        '''
+        self.assertEqual(self.sugerir(u'00030000000'),
+                         ['000300000001', '000300000002', '000300000003',
+                          '000300000004'])
+        self.assertEqual(self.sugerir(u'12345678'),
+                         ['000100020004', '000100020033'])
+        self.assertEqual(self.sugerir(u'2000000'), [])
+        self.assertEqual(self.sugerir(u'1' * 30), [])
+
+    #===========================================================================
+    # test_vista
+    #===========================================================================
+    def test_vista(self):
+        '''
+        Verifica la respuesta JSON y la validacion de los parametros.
+        '''
+        usuario = User.objects.create_superuser('admin', 'admin@test.com', 'admin')
+        def get(**parametros):
+            request = RequestFactory().get('/json/afiliados/sugerir/', parametros)
+            request.user = usuario
+            return views.sugerir_afiliados(request)
+        response = get(texto='rodriguez, a')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([afiliado['dni'] for afiliado in json.loads(response.content)],
+                         [20000001])
+        self.assertEqual(len(json.loads(get(texto='ro', cantidad=3).content)), 3)
+        form = SugerirAfiliadosForm({'texto': 'ro'})
+        self.assertTrue(form.is_valid())
+        self.assertEqual(form.cleaned_data['cantidad'], form.CANTIDAD)
+        self.assertEqual(get(texto='r').status_code, 400)
+        self.assertEqual(get(texto='ro', cantidad=500).status_code, 400)
+
+    #===========================================================================
+    # test_latencia
+    #===========================================================================
+    def test_latencia(self):
+        '''
+        Mide la latencia de las sugerencias con 500000 afiliados: cada
+        consulta recorre solo las filas devueltas, asi que un prefijo comun
+        tarda lo mismo que uno poco frecuente. Las latencias se registran en
+        el log.
+        '''
+        apellidos = ['Rodriguez', 'Romero', 'Gonzalez', 'Fernandez', 'Lopez',
+                     'Martinez', 'Garcia', 'Perez', 'Sanchez', 'Gomez']
+        cursor = connection.cursor()
+        cursor.executemany("INSERT INTO turnos_afiliado (numero, dni, nombre, "
+                           "apellido) VALUES (%s, %s, %s, %s)",
+                           (('0009%08d' % i, 30000000 + i, 'Nombre%s' % (i % 1000),
+                             '%s%s' % (apellidos[i % 10], i % 5000))
+                            for i in range(500000)))
+        textos = [u'ro', u'ROMERO1', u'gonzalez49, nombre9', u'perez, n',
+                  u'00090012', u'30123456', u'Zz']
+        repeticiones = 20
+        latencias = {}
+        for texto in textos:
+            inicio = timezone.now()
+            for _ in range(repeticiones):
+                sugeridos = self.manager.sugerir_afiliados(texto, 10)
+            latencias[texto] = ((timezone.now() - inicio).total_seconds() * 1000
+                                / repeticiones)
+            self.assertLessEqual(len(sugeridos), 10)
+        logger.info("Sugerencias entre 500000 afiliados (ms): %s" % latencias)
+        self.assertEqual(len(self.manager.sugerir_afiliados(u'ro', 10)), 10)
+
+#===============================================================================
+# SerializacionTestSuite
+#===============================================================================
+class SerializacionTestSuite(TestCase):
+    '''
+    Prueba la serializacion de las respuestas JSON
+    '''
+    fixtures = ['test.json']
+    #===========================================================================
+    # test_epoca
+    #===========================================================================
+    def test_epoca(self):
+        '''
+        Verifica la conversion a segundos desde 1970, tambien en la hora
+        que se repite al terminar el horario de verano.
+        '''
+        fecha = timezone.now()
+        self.assertEqual(epoca(fecha), calendar.timegm(fecha.utctimetuple()))
+        tz = timezone.get_default_timezone()
+        self.assertEqual(epoca(datetime(2014, 8, 1, 10, 30)),
+                         epoca(tz.localize(datetime(2014, 8, 1, 10, 30))))
+        # el 15/03/2009 las 23:30 de Buenos Aires se repitieron (UTC-2 y UTC-3)
+        antes = datetime(2009, 3, 15, 1, 30, tzinfo=timezone.utc)
+        despues = antes + timedelta(hours=1)
+        self.assertEqual(timezone.localtime(antes, tz).replace(tzinfo=None),
+                         timezone.localtime(despues, tz).replace(tzinfo=None))
+        self.assertEqual(epoca(despues) - epoca(antes), 3600)
+
+    #===========================================================================
+    # test_campos
+    #===========================================================================
+    def test_campos(self):
+        '''
+        Verifica que se devuelvan solo los campos declarados, de diccionarios
+        o de instancias, con las fechas convertidas.
+        '''
+        campos = Campos(('id', 'fecha', 'estado'), fechas=('fecha',))
+        turno = Turno.objects.exclude(fecha=None).first()
+        esperado = {'id': turno.id, 'fecha': epoca(turno.fecha),
+                    'estado': turno.estado}
+        self.assertEqual(campos([turno]), [esperado])
+        self.assertEqual(campos(Turno.objects.filter(id=turno.id).values()),
+                         [esperado])
+        self.assertEqual(campos([{'id': 1, 'fecha': None, 'estado': 'D'}]),
+                         [{'id': 1, 'fecha': None, 'estado': 'D'}])
+        self.assertEqual(json.loads(dumps({'fecha': turno.fecha})),
+                         {'fecha': epoca(turno.fecha)})
+        response = JSONResponse([turno], campos)
+        self.assertEqual(response['Content-Type'], "application/json; charset=utf-8")
+        self.assertEqual(json.loads(response.content), [esperado])
+
+    #===========================================================================
+    # test_especialistas
+    #===========================================================================
+    def test_especialistas(self):
+        '''
+        Verifica que la vista de especialistas devuelva solo los campos que
+        usa la pagina, con una sola consulta.
+        '''
+        request = RequestFactory().get('/json/especialistas/especialidad/1/')
+        request.user = User.objects.create_user('u')
+        with self.assertNumQueries(1):
+            response = views.getEspecialistas(request, 1)
+        data = json.loads(response.content)
+        self.assertTrue(data)
+        self.assertEqual(set(data[0]), set(['id', 'nombre', 'apellido']))
+
+    #===========================================================================
+    # test_benchmark
+    #===========================================================================
+    def test_benchmark(self):
+        '''
+        Mide la serializacion de 500 elementos de cada respuesta contra el
+        codificador anterior (values() completos y mktime() en default()).
+        Verifica que los resultados coincidan y que la respuesta sea mas
+        chica; los tiempos se registran en el log.
+        '''
+        class EncoderMktime(json.JSONEncoder):
+            def default(self, obj):
+                if isinstance(obj, datetime):
+                    fecha = obj.astimezone(timezone.get_default_timezone())
+                    return int(mktime(fecha.timetuple()))
+                return json.JSONEncoder.default(self, obj)
+        CANTIDAD = 500
+        REPETICIONES = 10
+        inicio = timezone.now()
+        tiempos = {}
+        for nombre in ('AFILIADO', 'ESPECIALISTA', 'DIA_TURNOS',
+                       'TURNO_DISPONIBLE', 'PROXIMO_TURNO', 'TURNO_RESERVADO',
+                       'RESERVA_ESPECIALISTA'):
+            campos = getattr(serializacion, nombre)
+            elementos = []
+            for i in range(CANTIDAD):
+                elemento = dict(('otro_%s' % j, u'valor %s' % i) for j in range(4))
+                elemento.update((campo, inicio + timedelta(minutes=i)
+                                 if campo in campos.fechas else u'%s %s' % (campo, i))
+                                for campo in campos.campos)
+                elementos.append(elemento)
+            medicion = timezone.now()
+            for _ in range(REPETICIONES):
+                anterior = json.dumps(elementos, cls=EncoderMktime)
+            medicion, duracion_anterior = timezone.now(), timezone.now() - medicion
+            for _ in range(REPETICIONES):
+                nuevo = dumps(campos(elementos))
+            duracion = timezone.now() - medicion
+            tiempos[nombre] = (duracion_anterior.total_seconds() * 1000 / REPETICIONES,
+                               duracion.total_seconds() * 1000 / REPETICIONES)
+            anteriores = json.loads(anterior)
+            for elemento, esperado in zip(json.loads(nuevo), anteriores):
+                self.assertEqual(elemento, dict((campo, esperado[campo])
+                                                for campo in campos.campos))
+            self.assertLess(len(nuevo), len(anterior))
+        logger.info("Serializacion de %s elementos, anterior/nueva (ms): %s" %
+                    (CANTIDAD, tiempos))
@@ -1,12 +1,10 @@
 # coding=utf-8
 import datetime
-import json
 import inspect
-from time import mktime
 
-from django.http import HttpResponseRedirect, HttpResponse
+from django.http import HttpResponseRedirect, \
+    HttpResponseBadRequest, StreamingHttpResponse
 from django.shortcuts import render_to_response
-from django.forms.models import model_to_dict
 from django.contrib import messages
 from django.contrib.auth.decorators import permission_required
 from django.template import RequestContext
@@ -17,27 +15,19 @@ from django.template.response import TemplateResponse
 
 from turnos.forms import *
 from turnos.models import *
+from turnos.negocio.managers import AfiliadoManager
 from turnos.negocio.service import ReservaTurnosService
 from bussiness import Bussiness
 from decorators import Paginar
+from exportar import reservas_csv, reservas_ndjson
+from serializacion import JSONResponse, AFILIADO, ESPECIALISTA, DIA_TURNOS, \
+    TURNO_DISPONIBLE, PROXIMO_TURNO, TURNO_RESERVADO, RESERVA_ESPECIALISTA
 import logging
 from models import LineaDeReserva
 from django.http.response import Http404
 
 logger = logging.getLogger(__name__)
 
-class MyEncoder(json.JSONEncoder):
-    """Uso este encoder para codficar la fecha a JSON """
-    def default(self, obj):
-        if isinstance(obj, datetime.datetime):
-            tz = timezone.get_default_timezone()
-            fecha = obj.astimezone(tz)
-            return int(mktime(fecha.timetuple()))
-        return json.JSONEncoder.default(self, obj)
-
-def JSONResponse(response):
-    return HttpResponse(json.dumps(response, cls=MyEncoder), content_type="application/json; charset=utf-8")
-
 @login_required
 @permission_required('turnos.reservar_turnos', raise_exception=True)
 def reservar(request):
@@ -77,26 +67,42 @@ def get(request, model, parametro, valor):
 def getAfiliado(request, parametro, valor):
     bussiness = Bussiness()
     data = bussiness.getAfiliados(parametro, valor)
-    return JSONResponse(data)
+    return JSONResponse(data, AFILIADO)
 
 @login_required
 def getDiaTurnos(request, especialista_id):
     bussiness = Bussiness()
     data = bussiness.getDiaTurnos(especialista_id)
-    return JSONResponse(data)    
+    return JSONResponse(data, DIA_TURNOS)
 
 @login_required
 def getEspecialistas(request, especialidad_id):
-    queryset = EspecialistaEspecialidad.objects.filter(especialidad__id=especialidad_id)
-    data = [model_to_dict(item.especialista) for item in queryset]
-    return JSONResponse(data)
+    queryset = (EspecialistaEspecialidad.objects.filter(especialidad__id=especialidad_id)
+                .select_related('especialista'))
+    data = [item.especialista for item in queryset]
+    return JSONResponse(data, ESPECIALISTA)
+
+@login_required
+def get_proximos_turnos(request, especialidad_id):
+    form = ProximosTurnosForm(request.GET)
+    if not form.is_valid():
+        response = JSONResponse(form.errors)
+        response.status_code = 400
+        return response
+    b = Bussiness()
+    data = b.get_proximos_turnos(especialidad_id,
+                                 cantidad=form.cleaned_data['cantidad'],
+                                 dias=form.cleaned_data['dias'],
+                                 hora_desde=form.cleaned_data['desde'],
+                                 hora_hasta=form.cleaned_data['hasta'])
+    return JSONResponse(data, PROXIMO_TURNO)
 
 @login_required
 def getTurnosDisponibles(request, especialista_id, year, month, day):
     bussiness = Bussiness()
     fecha = datetime.date(int(year), int(month), int(day))
     data = bussiness.getTurnosDisponibles(especialista_id, fecha)
-    return JSONResponse(data)
+    return JSONResponse(data, TURNO_DISPONIBLE)
 
 @login_required
 def verificarPresentismo(request, afiliado_id):
@@ -104,6 +110,30 @@ def verificarPresentismo(request, afiliado_id):
     data = {'presentismo_ok': bussiness.presentismoOK(afiliado_id)}
     return JSONResponse(data)
 
+@login_required
+def presentismo_afiliados(request):
+    form = PresentismoForm(request.GET)
+    if not form.is_valid():
+        response = JSONResponse(form.errors)
+        response.status_code = 400
+        return response
+    bussiness = Bussiness()
+    data = bussiness.presentismo_afiliados(form.cleaned_data['afiliados'])
+    # las claves de un objeto JSON son cadenas
+    return JSONResponse(dict((str(afiliado_id), presentismo_ok)
+                             for afiliado_id, presentismo_ok in data.items()))
+
+@login_required
+def sugerir_afiliados(request):
+    form = SugerirAfiliadosForm(request.GET)
+    if not form.is_valid():
+        response = JSONResponse(form.errors)
+        response.status_code = 400
+        return response
+    data = AfiliadoManager().sugerir_afiliados(form.cleaned_data['texto'],
+                                               form.cleaned_data['cantidad'])
+    return JSONResponse(data, AFILIADO)
+
 @login_required
 def getTelefono(request, afiliado_id):
     queryset = Reserva.objects.filter(afiliado__id=afiliado_id).order_by('-fecha')[:1]
@@ -171,7 +201,7 @@ def get_turnos_afiliado(request,afiliado_id,today=False):
     b = Bussiness()
     day = timezone.now() if today else None
     data = b.get_turnos_reservados(afiliado_id, day)
-    return JSONResponse(data)
+    return JSONResponse(data, TURNO_RESERVADO)
 
 @login_required
 @permission_required('turnos.reservar_turnos', raise_exception=True)
@@ -222,20 +252,37 @@ def cancelar_turnos(request):
         form = CancelarTurnoForm()
     return render(request, "turno/cancelar_turnos.html", locals())
 
+@login_required
+@permission_required('turnos.cancelar_turnos', raise_exception=True)
+def cancelar_turnos_rango(request):
+    if request.method == 'POST':
+        form = CancelarTurnosRangoForm(request.POST)
+        if form.is_valid():
+            service = ReservaTurnosService()
+            try:
+                afiliados = service.cancelar_turnos_rango(form.cleaned_data['ee'],
+                                                          form.cleaned_data['desde'],
+                                                          form.cleaned_data['hasta'],
+                                                          request.user.get_profile())
+            except Exception, e:
+                messages.error(request, __getExceptionMessage(e))
+            else:
+                # afiliados a notificar, con los turnos cancelados de cada uno
+                notificaciones = sorted(afiliados.items(),
+                                        key=lambda (afiliado, lineas): (afiliado.apellido, afiliado.nombre))
+                messages.success(request, u'Turnos cancelados, %s afiliados a notificar' % len(afiliados))
+    else:
+        form = CancelarTurnosRangoForm()
+    return render(request, "turno/cancelar_turnos_rango.html", locals())
+
 @login_required
 def get_reservas_especialista(request, especialidad, especialista, year, month, day):
     b = Bussiness()
     ee = EspecialistaEspecialidad.objects.filter(especialidad=especialidad,
                                                  especialista=especialista)
     fecha = datetime.date(int(year), int(month), int(day))
-    lineas = b.get_reserva_especialista(ee, fecha)
-    data = [{"fecha_reserva": lr.reserva.fecha,
-             "fecha_turno": lr.turno.fecha,
-             "afiliado":lr.reserva.afiliado.full_name(),
-             "numero": lr.reserva.afiliado.numero,
-             "telefono": lr.reserva.telefono,
-             } for lr in lineas]
-    return JSONResponse(data)
+    data = b.get_reserva_especialista(ee, fecha)
+    return JSONResponse(data, RESERVA_ESPECIALISTA)
 
 @login_required
 # @permission_required('turnos.registrar_especialista', raise_exception=True)
@@ -252,7 +299,7 @@ def registrar_especialista(request):
     return render(request, "especialista/registrar.html", locals())
 
 @permission_required('turnos.consultar_reservas', raise_exception=True)
-@Paginar
+@Paginar.por_cursor('-turno__fecha', '-reserva__fecha', '-id')
 def consultar_reservas(request):
     if len(request.GET) > 0:
         form = ConsultarReservaForm(request.GET)
@@ -267,6 +314,28 @@ def consultar_reservas(request):
     else:
         form = ConsultarReservaForm(initial=request.GET)
     return TemplateResponse(request, "turno/buscar.html", locals())
+@permission_required('turnos.consultar_reservas', raise_exception=True)
+def exportar_reservas(request, formato):
+    """Exporta las reservas que cumplen con los parametros de consultar_reservas
+    en CSV o JSON delimitado por lineas. La respuesta se genera de a lotes"""
+    form = ConsultarReservaForm(request.GET)
+    if not form.is_valid():
+        return HttpResponseBadRequest(form.errors.as_text())
+    b=Bussiness()
+    lineas = b.consultar_reservas(especialidad=form.cleaned_data['especialidad'], 
+                                  especialista=form.cleaned_data['especialista'], 
+                                  afiliado=form.cleaned_data['afiliado'], 
+                                  fecha_turno=form.cleaned_data['fecha_turno'],
+                                  fecha_reserva=form.cleaned_data['fecha_reserva'],
+                                  estado=form.cleaned_data['estado'],)
+    if formato == 'csv':
+        response = StreamingHttpResponse(reservas_csv(lineas),
+                                         content_type="text/csv; charset=utf-8")
+    else:
+        response = StreamingHttpResponse(reservas_ndjson(lineas),
+                                         content_type="application/x-ndjson; charset=utf-8")
+    response['Content-Disposition'] = 'attachment; filename="reservas.%s"' % formato
+    return response
 @permission_required('turnos.change_reservas', raise_exception=True)
 def modificar_reserva(request, lr_id):
     try: